@@ -0,0 +1,461 @@
+"""
+ROSTOVA benchmark suite
+
+Measures the backend hot paths against the local Deriv simulator
+(deriv_simulator.py), which runs in its own process:
+
+- ingest: ticks/s through MarketDataHub.on_tick from a seeded in-memory
+  feed, with the per-tick analytics and pattern detection cost
+- stream: ticks/s received end to end from the simulator over WebSocket
+- fanout: tick arrival to socket write latency for N browser clients,
+  simulated in process by ClientConnections on recording sockets
+- bots: paper bot strategy evaluations and event loop lag for N bots
+
+Runs are reproducible: ticks come from fixed seeds, sizes and durations
+are fixed by the arguments, and the tick and trade stores live in a fresh
+temporary directory. Results are JSON tagged with the code version and
+environment so runs can be compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --baseline before.json
+"""
+
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import orjson
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+START_EPOCH = 1700000000  # simulator clock, fixed so tick epochs repeat across runs
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def percentiles(values: List[float], digits: int = 3) -> Dict:
+    if not values:
+        return {'count': 0, 'p50': None, 'p90': None, 'p99': None, 'max': None}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        'count': len(values),
+        'p50': round(float(p50), digits),
+        'p90': round(float(p90), digits),
+        'p99': round(float(p99), digits),
+        'max': round(float(max(values)), digits)
+    }
+
+def code_version() -> Dict:
+    """Git revision of the tree being measured, if it is a checkout"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=HERE,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {'revision': revision, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'revision': None, 'dirty': None}
+
+class Simulator:
+    """deriv_simulator.py in a child process, so it never shares our event loop"""
+    
+    def __init__(self, port: int, tick_rate: float, seed: int):
+        self.port = port
+        self.tick_rate = tick_rate
+        self.seed = seed
+        self.process: Optional[subprocess.Popen] = None
+    
+    async def __aenter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, 'deriv_simulator.py'), '--port', str(self.port),
+             '--tick-rate', str(self.tick_rate), '--seed', str(self.seed), '--start-epoch', str(START_EPOCH)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                _, writer = await asyncio.open_connection('127.0.0.1', self.port)
+                writer.close()
+                return self
+            except OSError:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    raise RuntimeError('Deriv simulator did not start')
+                await asyncio.sleep(0.05)
+    
+    async def __aexit__(self, *exc):
+        self.process.terminate()
+        self.process.wait()
+
+class RecordingSocket:
+    """Stands in for a browser WebSocket: keeps every frame with its send time"""
+    
+    def __init__(self):
+        self.frames: List[tuple] = []
+    
+    async def send_text(self, data: str):
+        self.frames.append((time.perf_counter(), data))
+    
+    async def send_bytes(self, data: bytes):
+        self.frames.append((time.perf_counter(), data))
+    
+    async def close(self, code: int = 1000):
+        pass
+
+def frame_ticks(frame, encoding: str) -> List[tuple]:
+    """(symbol, epoch) of every tick carried by a client frame"""
+    if isinstance(frame, bytes) and encoding == 'binary':
+        if frame[0] != 0x01:
+            return []
+        count, = struct.unpack_from('<H', frame, 1)
+        ticks, offset = [], 3
+        for _ in range(count):
+            length = frame[offset]
+            symbol = frame[offset + 1:offset + 1 + length].decode()
+            offset += 1 + length
+            epoch, _, _ = struct.unpack_from('<qdB', frame, offset)
+            offset += struct.calcsize('<qdB')
+            ticks.append((symbol, epoch))
+        return ticks
+    
+    if isinstance(frame, bytes):
+        import msgpack
+        message = msgpack.unpackb(frame, raw=False)
+    else:
+        message = orjson.loads(frame)
+    messages = message['messages'] if message.get('type') == 'batch' else [message]
+    return [(m['data']['symbol'], m['data']['epoch']) for m in messages if m.get('type') == 'tick']
+
+class Benchmark:
+    def __init__(self, main, args):
+        self.main = main
+        self.args = args
+        self.port = int(os.environ['DERIV_WS_URL'].split(':')[2].split('/')[0])
+    
+    def reset_metrics(self):
+        """Fresh hot-path histograms; the instrumented code looks them up per call"""
+        main = self.main
+        main.analytics_update_us = main.Histogram(main.HOT_PATH_BUCKETS_US)
+        main.detect_patterns_us = main.Histogram(main.HOT_PATH_BUCKETS_US)
+        main.bot_evaluation_us = main.Histogram(main.HOT_PATH_BUCKETS_US)
+        main.event_loop_lag_ms = main.Histogram(main.LOOP_LAG_BUCKETS_MS)
+    
+    def ingested(self) -> int:
+        return sum(self.main.ticks_ingested[s] for s in self.args.symbols)
+    
+    async def ingest(self) -> Dict:
+        """Seeded ticks pushed straight into the market hub"""
+        main, args = self.main, self.args
+        rng = random.Random(args.seed)
+        quotes = {symbol: 1000.0 for symbol in args.symbols}
+        ticks = []
+        for i in range(args.ticks):
+            symbol = args.symbols[i % len(args.symbols)]
+            quotes[symbol] = round(quotes[symbol] * (1 + rng.gauss(0, 0.0005)), 2)
+            ticks.append({'symbol': symbol, 'quote': quotes[symbol], 'epoch': START_EPOCH + i, 'pip_size': 2})
+        
+        for symbol in args.symbols:
+            main.symbol_registry.acquire(symbol)
+        self.reset_metrics()
+        
+        started = time.perf_counter()
+        for i, tick in enumerate(ticks):
+            await main.market_hub.on_tick(tick)
+            if i % 1000 == 999:
+                await asyncio.sleep(0)  # let the store flush and the loop probe run
+        elapsed = time.perf_counter() - started
+        
+        for symbol in args.symbols:
+            main.symbol_registry.release(symbol)
+        
+        return {
+            'ticks': args.ticks,
+            'seconds': round(elapsed, 3),
+            'ticks_per_sec': round(args.ticks / elapsed),
+            'tick_us': round(elapsed / args.ticks * 1e6, 2),
+            'analytics_update_us': main.analytics_update_us.snapshot(),
+            'detect_patterns_us': main.detect_patterns_us.snapshot()
+        }
+    
+    async def stream(self) -> Dict:
+        """Unthrottled simulator feed through the real Deriv connections"""
+        main, args = self.main, self.args
+        async with Simulator(self.port, 0, args.seed):
+            for symbol in args.symbols:
+                await main.market_hub.retain(symbol)
+            await asyncio.sleep(args.warmup)
+            self.reset_metrics()
+            
+            before = self.ingested()
+            started = time.perf_counter()
+            await asyncio.sleep(args.duration)
+            ticks = self.ingested() - before
+            elapsed = time.perf_counter() - started
+            
+            for symbol in args.symbols:
+                main.market_hub.release(symbol)
+        
+        return {
+            'seconds': round(elapsed, 3),
+            'ticks': ticks,
+            'ticks_per_sec': round(ticks / elapsed),
+            'event_loop_lag_ms': main.event_loop_lag_ms.snapshot()
+        }
+    
+    async def fanout(self, count: int) -> Dict:
+        """Tick arrival to socket write latency for `count` clients"""
+        main, args = self.main, self.args
+        arrivals: Dict[tuple, float] = {}
+        hub_on_tick = main.market_hub.on_tick
+        
+        async def on_tick(tick: dict):
+            arrivals[(tick.get('symbol'), tick.get('epoch'))] = time.perf_counter()
+            await hub_on_tick(tick)
+        
+        clients = []
+        async with Simulator(self.port, args.tick_rate, args.seed):
+            main.market_hub.on_tick = on_tick
+            try:
+                for i in range(count):
+                    client = main.ClientConnection(RecordingSocket(), f'bench_client_{i}', args.encoding)
+                    main.client_connections.setdefault(client.user_id, set()).add(client)
+                    client.start()
+                    clients.append(client)
+                    await main.market_hub.subscribe(args.symbols[i % len(args.symbols)], client)
+                
+                await asyncio.sleep(args.warmup)
+                for client in clients:
+                    client.websocket.frames.clear()
+                    client.dropped = 0
+                self.reset_metrics()
+                
+                before = self.ingested()
+                await asyncio.sleep(args.duration)
+                ticks = self.ingested() - before
+            finally:
+                del main.market_hub.on_tick  # back to the class method
+                for client in clients:
+                    client.close()
+                    main.disconnect_client(client)
+                await asyncio.gather(*(c.task for c in clients), return_exceptions=True)
+        
+        latencies, frames, delivered = [], 0, 0
+        for client in clients:
+            for sent_at, frame in client.websocket.frames:
+                frames += 1
+                for key in frame_ticks(frame, args.encoding):
+                    arrived = arrivals.get(key)
+                    if arrived is not None:
+                        delivered += 1
+                        latencies.append((sent_at - arrived) * 1000)
+        
+        return {
+            'clients': count,
+            'ticks_in': ticks,
+            'frames_sent': frames,
+            'ticks_delivered': delivered,
+            'ticks_coalesced': sum(c.dropped for c in clients),
+            'latency_ms': percentiles(latencies),
+            'event_loop_lag_ms': main.event_loop_lag_ms.snapshot()
+        }
+    
+    async def bots(self, count: int) -> Dict:
+        """Paper bots on the simulator feed"""
+        main, args = self.main, self.args
+        strategy = {
+            'type': 'rules',
+            'min_ticks': 20,
+            'rules': [{
+                'when': [{'stat': 'even_pct', 'window': 20, 'op': '>=', 'value': 70}],
+                'then': {'contract_type': 'DIGITODD', 'duration': 1}
+            }]
+        }
+        # Never stop on results, so every bot runs for the whole measurement
+        config = {**main.DEFAULT_BOT_CONFIG, 'max_trades': 10 ** 9, 'stop_loss': -1e12, 'take_profit': 1e12}
+        
+        bots = []
+        async with Simulator(self.port, args.tick_rate, args.seed):
+            try:
+                for i in range(count):
+                    bot = main.TradingBot(
+                        bot_id=f'bench_bot_{i}',
+                        user_id='bench_user',
+                        name=f'Benchmark {i}',
+                        strategy={**strategy, 'symbol': args.symbols[i % len(args.symbols)]},
+                        status='STOPPED',
+                        stats=main.new_bot_stats(),
+                        config=dict(config)
+                    )
+                    main.active_bots[bot.bot_id] = bot
+                    main.bot_logs[bot.bot_id] = []
+                    await main.bot_scheduler.start(bot)
+                    bots.append(bot)
+                
+                await asyncio.sleep(args.warmup)
+                self.reset_metrics()
+                trades = sum(bot.stats['trades'] for bot in bots)
+                
+                before = self.ingested()
+                started = time.perf_counter()
+                await asyncio.sleep(args.duration)
+                elapsed = time.perf_counter() - started
+                ticks = self.ingested() - before
+                evaluations = main.bot_evaluation_us.count
+                trades = sum(bot.stats['trades'] for bot in bots) - trades
+            finally:
+                tasks = [main.bot_scheduler.tasks.get(bot.bot_id) for bot in bots]
+                for bot in bots:
+                    main.bot_scheduler.stop(bot.bot_id)
+                await asyncio.gather(*(t for t in tasks if t), return_exceptions=True)
+                for bot in bots:
+                    main.active_bots.pop(bot.bot_id, None)
+                    main.bot_logs.pop(bot.bot_id, None)
+        
+        # Every bot can be woken once per tick of its symbol
+        per_symbol = count / len(args.symbols)
+        lag = main.event_loop_lag_ms
+        return {
+            'bots': count,
+            'ticks_in': ticks,
+            'evaluations': evaluations,
+            'evaluations_per_sec': round(evaluations / elapsed),
+            'wakeups_possible': round(ticks * per_symbol),
+            'paper_trades': trades,
+            'evaluation_us': main.bot_evaluation_us.snapshot(),
+            'event_loop_lag_ms': lag.snapshot(),
+            'keeps_up': lag.count > 0 and lag.quantile(0.99) < 1000 / args.tick_rate
+        }
+    
+    async def run(self) -> Dict:
+        main, args = self.main, self.args
+        main.tick_store.start()
+        await main.trade_store.start()
+        main.loop_monitor.start()
+        
+        results = {}
+        try:
+            if 'ingest' in args.phases:
+                results['ingest'] = await self.ingest()
+            if 'stream' in args.phases:
+                results['stream'] = await self.stream()
+            if 'fanout' in args.phases:
+                results['fanout'] = [await self.fanout(n) for n in args.clients]
+            if 'bots' in args.phases:
+                results['bots'] = [await self.bots(n) for n in args.bots]
+        finally:
+            await main.deriv_manager.shutdown()
+            await main.tick_store.close()
+            await main.trade_store.close()
+            await main.loop_monitor.close()
+        return results
+
+def flatten(value, prefix: str = '') -> Dict[str, float]:
+    """Numeric leaves keyed by path; list entries are keyed by their first field"""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = ((f'{next(iter(v))}={next(iter(v.values()))}' if isinstance(v, dict) and v else str(i), v)
+                 for i, v in enumerate(value))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    else:
+        return {}
+    
+    flat = {}
+    for key, item in items:
+        if key == 'buckets':
+            continue
+        flat.update(flatten(item, f'{prefix}.{key}' if prefix else str(key)))
+    return flat
+
+def compare(baseline: Dict, current: Dict) -> List[str]:
+    """Side-by-side table of every metric present in both runs"""
+    lines = []
+    if baseline.get('parameters') != current.get('parameters'):
+        lines.append('⚠️  parameters differ from the baseline; numbers are not directly comparable')
+    
+    old, new = flatten(baseline['results']), flatten(current['results'])
+    width = max((len(k) for k in new), default=10)
+    lines.append(f"{'metric':<{width}}  {'baseline':>12}  {'current':>12}  {'change':>8}")
+    for key, value in new.items():
+        if key not in old:
+            continue
+        change = f'{(value - old[key]) / old[key] * 100:+.1f}%' if old[key] else ''
+        lines.append(f'{key:<{width}}  {old[key]:>12}  {value:>12}  {change:>8}')
+    return lines
+
+def int_list(text: str) -> List[int]:
+    return [int(n) for n in text.split(',')]
+
+def main():
+    parser = argparse.ArgumentParser(description="ROSTOVA 3.0 benchmark suite")
+    parser.add_argument('--phases', type=lambda s: s.split(','), default=['ingest', 'stream', 'fanout', 'bots'],
+                        help='Comma-separated subset of ingest,stream,fanout,bots')
+    parser.add_argument('--symbols', type=lambda s: s.split(','), default=['R_10', 'R_25', 'R_50', 'R_75', 'R_100'])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--ticks', type=int, default=100000, help='Ticks fed to the ingest phase')
+    parser.add_argument('--tick-rate', type=float, default=10.0, help='Simulator ticks/s per symbol for fanout and bots')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds measured per step')
+    parser.add_argument('--warmup', type=float, default=1.0, help='Seconds before each measurement')
+    parser.add_argument('--clients', type=int_list, default=[10, 100, 1000], help='Fanout client counts')
+    parser.add_argument('--encoding', default='json', help='Client wire encoding for fanout')
+    parser.add_argument('--bots', type=int_list, default=[10, 100, 1000], help='Bot counts')
+    parser.add_argument('--output', help='Write the results JSON here as well as to stdout')
+    parser.add_argument('--baseline', help='Results JSON of an earlier run to compare with')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    
+    # The backend reads these at import: fresh stores and the simulator instead of Deriv;
+    # the directory is removed with everything the run wrote to it
+    with tempfile.TemporaryDirectory(prefix='rostova-bench-', ignore_cleanup_errors=True) as data_dir:
+        os.environ['TICK_STORE_DIR'] = os.path.join(data_dir, 'ticks')
+        os.environ['TRADE_DB_PATH'] = os.path.join(data_dir, 'trades.db')
+        os.environ['DERIV_WS_URL'] = f'ws://127.0.0.1:{free_port()}/websockets/v3'
+        sys.path.insert(0, HERE)
+        import main as backend
+        logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+        
+        if args.encoding not in backend.WS_ENCODINGS:
+            parser.error(f'--encoding must be one of {list(backend.WS_ENCODINGS)}')
+        
+        report = {
+            'version': {'app': backend.app.version, **code_version()},
+            'environment': {
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'numpy': np.__version__,
+                'ws_flush_interval_ms': backend.WS_FLUSH_INTERVAL * 1000,
+                'analytics_windows': list(backend.ANALYTICS_WINDOWS)
+            },
+            'parameters': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'verbose')},
+            'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'results': asyncio.run(Benchmark(backend, args).run())
+        }
+    
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print('\n'.join(compare(baseline, report)), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
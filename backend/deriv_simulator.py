@@ -0,0 +1,657 @@
+"""
+Local Deriv WebSocket simulator
+
+Speaks the subset of the Deriv API the platform uses (authorize, balance,
+ticks, proposal, buy, sell, proposal_open_contract, forget, ping) so the
+backend can be developed and benchmarked without touching Deriv.
+
+- Every symbol is a seeded random walk: the same --seed always produces
+  the same quotes, whatever the tick rate or number of clients
+- Tick epochs advance by one per tick, so they are unique per symbol
+- Any non-empty token authorizes a virtual account; tokens starting with
+  "invalid" are rejected
+- Digit contracts settle against the `duration`-th tick after purchase
+
+Run it and point the backend at it:
+
+    python deriv_simulator.py --port 8765 --tick-rate 10
+    DERIV_WS_URL=ws://127.0.0.1:8765/websockets/v3 python main.py
+"""
+
+from typing import Dict, List, Optional, Set
+from collections import OrderedDict
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+
+from aiohttp import web, WSMsgType
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("deriv_simulator")
+
+PIP_SIZES = {'R_10': 3, 'R_25': 3, 'R_50': 4, 'R_75': 4, 'R_100': 2}
+DEFAULT_PIP_SIZE = 2
+START_QUOTE = 1000.0
+VOLATILITY = 0.0005  # per-tick standard deviation of the random walk, relative
+
+START_BALANCE = 10000.0
+PAYOUT_FACTOR = 0.975  # same 95%-on-50/50 pricing the backend models
+MAX_PROPOSALS = 10000  # unsubscribed proposals kept for buy-by-id, oldest dropped first
+
+DIGIT_CONTRACT_TYPES = ('DIGITEVEN', 'DIGITODD', 'DIGITOVER', 'DIGITUNDER', 'DIGITMATCH', 'DIGITDIFF')
+BARRIER_CONTRACT_TYPES = ('DIGITOVER', 'DIGITUNDER', 'DIGITMATCH', 'DIGITDIFF')
+
+class SimulatorError(Exception):
+    """Rejected request, reported to the client as a Deriv error object"""
+    
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+def win_probability(contract_type: str, barrier: int) -> float:
+    if contract_type in ('DIGITEVEN', 'DIGITODD'):
+        return 0.5
+    if contract_type == 'DIGITOVER':
+        return (9 - barrier) / 10
+    if contract_type == 'DIGITUNDER':
+        return barrier / 10
+    if contract_type == 'DIGITMATCH':
+        return 0.1
+    return 0.9  # DIGITDIFF
+
+def contract_wins(contract_type: str, barrier: int, digit: int) -> bool:
+    if contract_type == 'DIGITEVEN':
+        return digit % 2 == 0
+    if contract_type == 'DIGITODD':
+        return digit % 2 == 1
+    if contract_type == 'DIGITOVER':
+        return digit > barrier
+    if contract_type == 'DIGITUNDER':
+        return digit < barrier
+    if contract_type == 'DIGITMATCH':
+        return digit == barrier
+    return digit != barrier  # DIGITDIFF
+
+def contract_params(request: dict) -> Dict:
+    """Validated digit contract parameters of a proposal or buy request"""
+    contract_type = request.get('contract_type')
+    if contract_type not in DIGIT_CONTRACT_TYPES:
+        raise SimulatorError('InputValidationFailed', f'Unsupported contract type: {contract_type}')
+    if request.get('duration_unit', 't') != 't':
+        raise SimulatorError('InputValidationFailed', 'Only tick durations are supported')
+    if request.get('basis', 'stake') != 'stake':
+        raise SimulatorError('InputValidationFailed', 'Only stake basis is supported')
+    
+    try:
+        duration = int(request.get('duration', 5))
+        stake = round(float(request['amount']), 2)
+        barrier = int(request['barrier']) if contract_type in BARRIER_CONTRACT_TYPES else None
+    except (KeyError, TypeError, ValueError) as e:
+        raise SimulatorError('InputValidationFailed', f'Invalid contract parameters: {e}')
+    
+    if not 1 <= duration <= 10:
+        raise SimulatorError('InputValidationFailed', 'Duration must be between 1 and 10 ticks')
+    if stake <= 0:
+        raise SimulatorError('InputValidationFailed', 'Stake must be positive')
+    if barrier is not None and not 0 <= barrier <= 9:
+        raise SimulatorError('InputValidationFailed', 'Barrier must be a digit')
+    
+    probability = win_probability(contract_type, barrier or 0)
+    if probability <= 0 or probability >= 1:
+        raise SimulatorError('ContractBuyValidationError', 'Contract cannot win or cannot lose')
+    
+    return {
+        'symbol': request.get('symbol'),
+        'contract_type': contract_type,
+        'duration': duration,
+        'amount': stake,
+        'barrier': barrier,
+        'currency': request.get('currency', 'USD'),
+        'payout': round(stake * PAYOUT_FACTOR / probability, 2)
+    }
+
+class Market:
+    """Seeded random-walk tick feed of one symbol"""
+    
+    def __init__(self, symbol: str, seed: int, start_epoch: int):
+        self.symbol = symbol
+        self.pip_size = PIP_SIZES.get(symbol, DEFAULT_PIP_SIZE)
+        self.rng = random.Random(f"{seed}:{symbol}")  # str seeds hash identically on every run
+        self.quote = START_QUOTE
+        self.epoch = start_epoch
+        self.count = 0
+        self.listeners: Set['Session'] = set()
+        self.contracts: List[Dict] = []  # open contracts settling on this feed
+        self.task: Optional[asyncio.Task] = None
+    
+    def next_tick(self) -> Dict:
+        self.quote = round(self.quote * (1 + self.rng.gauss(0, VOLATILITY)), self.pip_size)
+        self.epoch += 1
+        self.count += 1
+        return self.current()
+    
+    def current(self) -> Dict:
+        return {
+            'symbol': self.symbol,
+            'quote': self.quote,
+            'epoch': self.epoch,
+            'pip_size': self.pip_size,
+            'id': f'{self.symbol}-{self.count}'
+        }
+    
+    def digit(self) -> int:
+        return int(f'{self.quote:.{self.pip_size}f}'[-1])
+
+class Account:
+    def __init__(self, loginid: str):
+        self.loginid = loginid
+        self.balance = START_BALANCE
+        self.currency = 'USD'
+        self.contracts: Dict[int, Dict] = {}
+        self.sessions: Set['Session'] = set()
+
+class Session:
+    """State of one client WebSocket"""
+    
+    def __init__(self, server: 'DerivSimulator', ws: web.WebSocketResponse):
+        self.server = server
+        self.ws = ws
+        self.account: Optional[Account] = None
+        self.subscriptions: Dict[str, Dict] = {}  # subscription id -> {kind, request, ...}
+    
+    async def send(self, msg_type: str, request: dict, body=None, subscription: Optional[str] = None,
+                   error: Optional[SimulatorError] = None):
+        message = {'echo_req': request, 'msg_type': msg_type}
+        if error is not None:
+            message['error'] = {'code': error.code, 'message': error.message}
+        else:
+            message[msg_type] = body
+        if 'req_id' in request:
+            message['req_id'] = request['req_id']
+        if subscription is not None:
+            message['subscription'] = {'id': subscription}
+        if not self.ws.closed:
+            await self.ws.send_str(json.dumps(message))
+    
+    def subscribed(self, kind: str, **match) -> List[str]:
+        return [
+            sub_id for sub_id, sub in self.subscriptions.items()
+            if sub['kind'] == kind and all(sub.get(k) == v for k, v in match.items())
+        ]
+
+class DerivSimulator:
+    """aiohttp server speaking the Deriv WebSocket protocol.
+    
+    Ticks are generated per symbol only while someone listens to the
+    symbol or holds a contract on it. `tick_rate` is ticks per second
+    per symbol; 0 streams as fast as clients read.
+    """
+    
+    def __init__(self, tick_rate: float = 1.0, seed: int = 0, start_epoch: Optional[int] = None):
+        self.tick_rate = tick_rate
+        self.seed = seed
+        self.start_epoch = int(time.time()) if start_epoch is None else start_epoch
+        self.markets: Dict[str, Market] = {}
+        self.accounts: Dict[str, Account] = {}
+        self.sessions: Set[Session] = set()
+        self.proposals: OrderedDict = OrderedDict()  # proposal id -> contract params
+        self.ids = itertools.count(1)
+        self.runner: Optional[web.AppRunner] = None
+        self.ticks_sent = 0
+        
+        self.handlers = {
+            'authorize': self.authorize,
+            'balance': self.balance,
+            'ticks': self.ticks,
+            'proposal': self.proposal,
+            'buy': self.buy,
+            'sell': self.sell,
+            'proposal_open_contract': self.proposal_open_contract,
+            'forget': self.forget,
+            'forget_all': self.forget_all,
+            'ping': self.ping,
+            'time': self.server_time,
+        }
+    
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/websockets/v3', self.handle)
+        app.router.add_get('/', self.handle)
+        return app
+    
+    async def start(self, host: str = '127.0.0.1', port: int = 8765):
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        logger.info(f"🧪 Deriv simulator on ws://{host}:{port}/websockets/v3 "
+                    f"({self.tick_rate or 'unthrottled'} ticks/s, seed {self.seed})")
+    
+    async def stop(self):
+        for market in self.markets.values():
+            if market.task:
+                market.task.cancel()
+        for session in list(self.sessions):
+            await session.ws.close()
+        if self.runner:
+            await self.runner.cleanup()
+    
+    def new_id(self) -> str:
+        return f'{next(self.ids):08x}-sim'
+    
+    # ----- connection handling -----
+    
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        session = Session(self, ws)
+        self.sessions.add(session)
+        
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    payload = json.loads(msg.data)
+                except ValueError:
+                    await session.send('error', {}, error=SimulatorError('InputValidationFailed', 'Invalid JSON'))
+                    continue
+                await self.dispatch(session, payload)
+        finally:
+            self.sessions.discard(session)
+            for market in self.markets.values():
+                market.listeners.discard(session)
+            if session.account:
+                session.account.sessions.discard(session)
+        return ws
+    
+    async def dispatch(self, session: Session, request: dict):
+        # Deriv names a call by the first key it recognises
+        name = next((key for key in request if key in self.handlers), None)
+        if name is None:
+            await session.send('error', request, error=SimulatorError('UnrecognisedRequest', 'Unrecognised request'))
+            return
+        
+        try:
+            await self.handlers[name](session, request)
+        except SimulatorError as e:
+            await session.send(name, request, error=e)
+    
+    def require_account(self, session: Session) -> Account:
+        if session.account is None:
+            raise SimulatorError('AuthorizationRequired', 'Please log in.')
+        return session.account
+    
+    # ----- markets -----
+    
+    def market(self, symbol) -> Market:
+        if not isinstance(symbol, str) or not symbol:
+            raise SimulatorError('InputValidationFailed', 'Invalid symbol')
+        market = self.markets.get(symbol)
+        if market is None:
+            market = self.markets[symbol] = Market(symbol, self.seed, self.start_epoch)
+        if market.task is None or market.task.done():
+            market.task = asyncio.create_task(self.run_market(market))
+        return market
+    
+    async def run_market(self, market: Market):
+        interval = 1 / self.tick_rate if self.tick_rate > 0 else 0
+        next_at = time.monotonic()
+        
+        while market.listeners or market.contracts:
+            if interval:
+                next_at += interval
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+            else:
+                await asyncio.sleep(0)
+            
+            tick = market.next_tick()
+            for session in list(market.listeners):
+                for sub_id in session.subscribed('ticks', symbol=market.symbol):
+                    self.ticks_sent += 1
+                    await session.send('tick', session.subscriptions[sub_id]['request'], tick, sub_id)
+                for sub_id in session.subscribed('proposal', symbol=market.symbol):
+                    await self.push_proposal(session, sub_id, tick)
+            
+            if market.contracts:
+                await self.advance_contracts(market, tick)
+        
+        market.task = None
+    
+    def listen(self, session: Session, symbol: str):
+        self.market(symbol).listeners.add(session)
+    
+    def unlisten(self, session: Session, symbol: str):
+        if not session.subscribed('ticks', symbol=symbol) and not session.subscribed('proposal', symbol=symbol):
+            market = self.markets.get(symbol)
+            if market:
+                market.listeners.discard(session)
+    
+    # ----- calls -----
+    
+    async def authorize(self, session: Session, request: dict):
+        token = request.get('authorize')
+        if not isinstance(token, str) or not token or token.startswith('invalid'):
+            raise SimulatorError('InvalidToken', 'The token is invalid.')
+        
+        account = self.accounts.get(token)
+        if account is None:
+            account = self.accounts[token] = Account(f'VRTC{len(self.accounts) + 1000000}')
+        session.account = account
+        account.sessions.add(session)
+        
+        await session.send('authorize', request, {
+            'loginid': account.loginid,
+            'balance': account.balance,
+            'currency': account.currency,
+            'is_virtual': 1,
+            'email': f'{account.loginid.lower()}@simulator.local',
+            'fullname': 'Simulator Account',
+            'landing_company_name': 'virtual',
+            'scopes': ['read', 'trade']
+        })
+    
+    def balance_body(self, account: Account) -> Dict:
+        return {'balance': round(account.balance, 2), 'currency': account.currency, 'loginid': account.loginid}
+    
+    async def balance(self, session: Session, request: dict):
+        account = self.require_account(session)
+        sub_id = None
+        if request.get('subscribe'):
+            sub_id = self.new_id()
+            session.subscriptions[sub_id] = {'kind': 'balance', 'request': request}
+        await session.send('balance', request, self.balance_body(account), sub_id)
+    
+    async def push_balance(self, account: Account):
+        for session in list(account.sessions):
+            for sub_id in session.subscribed('balance'):
+                await session.send('balance', session.subscriptions[sub_id]['request'], self.balance_body(account), sub_id)
+    
+    async def ticks(self, session: Session, request: dict):
+        symbol = request.get('ticks')
+        market = self.market(symbol)
+        if not request.get('subscribe'):
+            # One-off request: the latest tick
+            await session.send('tick', request, market.current())
+            return
+        if session.subscribed('ticks', symbol=symbol):
+            raise SimulatorError('AlreadySubscribed', f'You are already subscribed to {symbol}.')
+        
+        sub_id = self.new_id()
+        session.subscriptions[sub_id] = {'kind': 'ticks', 'symbol': symbol, 'request': request}
+        self.listen(session, symbol)
+    
+    def quote_proposal(self, params: Dict, market: Market) -> Dict:
+        proposal_id = self.new_id()
+        self.proposals[proposal_id] = params
+        while len(self.proposals) > MAX_PROPOSALS:
+            self.proposals.popitem(last=False)
+        
+        barrier = '' if params['barrier'] is None else f" {params['barrier']}"
+        return {
+            'id': proposal_id,
+            'ask_price': params['amount'],
+            'payout': params['payout'],
+            'spot': market.quote,
+            'spot_time': market.epoch,
+            'date_start': market.epoch,
+            'longcode': f"Win payout if the last digit of {params['symbol']} after {params['duration']} ticks "
+                        f"is {params['contract_type'][5:].lower()}{barrier}.",
+            'display_value': f"{params['amount']:.2f}"
+        }
+    
+    async def proposal(self, session: Session, request: dict):
+        params = contract_params(request)
+        market = self.market(params['symbol'])
+        body = self.quote_proposal(params, market)
+        
+        sub_id = None
+        if request.get('subscribe'):
+            sub_id = self.new_id()
+            session.subscriptions[sub_id] = {
+                'kind': 'proposal', 'symbol': params['symbol'], 'request': request,
+                'params': params, 'proposal_id': body['id']
+            }
+            self.listen(session, params['symbol'])
+        await session.send('proposal', request, body, sub_id)
+    
+    async def push_proposal(self, session: Session, sub_id: str, tick: Dict):
+        subscription = session.subscriptions[sub_id]
+        self.proposals.pop(subscription['proposal_id'], None)
+        body = self.quote_proposal(subscription['params'], self.markets[tick['symbol']])
+        subscription['proposal_id'] = body['id']
+        await session.send('proposal', subscription['request'], body, sub_id)
+    
+    async def buy(self, session: Session, request: dict):
+        account = self.require_account(session)
+        target = request.get('buy')
+        
+        if target == 1 or target == '1':
+            params = contract_params(request.get('parameters') or {})
+        else:
+            params = self.proposals.pop(str(target), None)
+            if params is None:
+                raise SimulatorError('InvalidContractProposal', 'Proposal has expired or does not exist.')
+            # Buying a streamed proposal ends its stream
+            for sub_id in session.subscribed('proposal', proposal_id=str(target)):
+                del session.subscriptions[sub_id]
+                self.unlisten(session, params['symbol'])
+        
+        try:
+            price = float(request.get('price', params['amount']))
+        except (TypeError, ValueError):
+            raise SimulatorError('InputValidationFailed', 'Invalid price')
+        if price < params['amount']:
+            raise SimulatorError('PriceMoved', 'The underlying market has moved too much since you priced the contract.')
+        if params['amount'] > account.balance:
+            raise SimulatorError('InsufficientBalance', 'Your account balance is insufficient for this transaction.')
+        
+        market = self.market(params['symbol'])
+        account.balance -= params['amount']
+        contract_id = next(self.ids)
+        contract = {
+            **params,
+            'contract_id': contract_id,
+            'transaction_id': next(self.ids),
+            'account': account,
+            'purchase_time': market.epoch,
+            'entry_count': market.count,
+            'exit_count': market.count + params['duration'],
+            'entry_spot': market.quote,
+            'current_spot': market.quote,
+            'status': 'open',
+            'sell_price': None,
+            'sell_time': None,
+            'exit_spot': None,
+            'watchers': []  # (session, subscription id) following this contract
+        }
+        account.contracts[contract_id] = contract
+        market.contracts.append(contract)
+        
+        await session.send('buy', request, {
+            'contract_id': contract_id,
+            'transaction_id': contract['transaction_id'],
+            'buy_price': params['amount'],
+            'payout': params['payout'],
+            'balance_after': round(account.balance, 2),
+            'start_time': market.epoch,
+            'purchase_time': market.epoch,
+            'longcode': f"Digit contract on {params['symbol']}",
+            'shortcode': f"{params['contract_type']}_{params['symbol']}_{params['payout']}_{market.epoch}_{params['duration']}T"
+                         + (f"_{params['barrier']}" if params['barrier'] is not None else '')
+        })
+        await self.push_balance(account)
+    
+    async def sell(self, session: Session, request: dict):
+        account = self.require_account(session)
+        try:
+            contract = account.contracts.get(int(request.get('sell')))
+        except (TypeError, ValueError):
+            contract = None
+        if contract is None:
+            raise SimulatorError('InvalidSellContractProposal', 'This contract was not found among your open positions.')
+        if contract['status'] != 'open':
+            raise SimulatorError('InvalidSellContractProposal', 'This contract has already been sold.')
+        
+        market = self.markets[contract['symbol']]
+        bid = self.bid_price(contract, market)
+        self.close_contract(contract, market, 'sold', bid)
+        await session.send('sell', request, {
+            'contract_id': contract['contract_id'],
+            'sold_for': bid,
+            'balance_after': round(account.balance, 2),
+            'transaction_id': next(self.ids)
+        })
+        await self.push_contract(contract)
+        await self.push_balance(account)
+    
+    async def proposal_open_contract(self, session: Session, request: dict):
+        account = self.require_account(session)
+        contract_id = request.get('contract_id')
+        
+        if contract_id is not None:
+            try:
+                contracts = [account.contracts[int(contract_id)]]
+            except (KeyError, TypeError, ValueError):
+                raise SimulatorError('InvalidContractId', 'Contract not found.')
+        else:
+            # Like Deriv, covers the contracts open right now only
+            contracts = [c for c in account.contracts.values() if c['status'] == 'open']
+        
+        if not contracts:
+            await session.send('proposal_open_contract', request, {})
+            return
+        
+        for contract in contracts:
+            sub_id = None
+            if request.get('subscribe') and contract['status'] == 'open':
+                sub_id = self.new_id()
+                session.subscriptions[sub_id] = {'kind': 'proposal_open_contract', 'request': request,
+                                                 'contract_id': contract['contract_id']}
+                contract['watchers'].append((session, sub_id))
+            await session.send('proposal_open_contract', request, self.contract_body(contract), sub_id)
+    
+    async def forget(self, session: Session, request: dict):
+        sub_id = request.get('forget')
+        subscription = session.subscriptions.pop(sub_id, None)
+        if subscription and subscription.get('symbol'):
+            self.unlisten(session, subscription['symbol'])
+        await session.send('forget', request, 1 if subscription else 0)
+    
+    async def forget_all(self, session: Session, request: dict):
+        kinds = request.get('forget_all')
+        kinds = [kinds] if isinstance(kinds, str) else list(kinds or [])
+        forgotten = []
+        for sub_id, subscription in list(session.subscriptions.items()):
+            if subscription['kind'] in kinds:
+                del session.subscriptions[sub_id]
+                forgotten.append(sub_id)
+                if subscription.get('symbol'):
+                    self.unlisten(session, subscription['symbol'])
+        await session.send('forget_all', request, forgotten)
+    
+    async def ping(self, session: Session, request: dict):
+        await session.send('ping', request, 'pong')
+    
+    async def server_time(self, session: Session, request: dict):
+        await session.send('time', request, int(time.time()))
+    
+    # ----- contracts -----
+    
+    @staticmethod
+    def bid_price(contract: Dict, market: Market) -> float:
+        """Early-exit value: the payout weighted by whether it wins right now"""
+        winning = contract_wins(contract['contract_type'], contract['barrier'] or 0, market.digit())
+        return round(contract['payout'] * 0.5 if winning else contract['amount'] * 0.1, 2)
+    
+    def close_contract(self, contract: Dict, market: Market, status: str, sell_price: float):
+        contract['status'] = status
+        contract['sell_price'] = sell_price
+        contract['sell_time'] = market.epoch
+        contract['exit_spot'] = market.quote
+        contract['account'].balance += sell_price
+        market.contracts.remove(contract)
+    
+    async def advance_contracts(self, market: Market, tick: Dict):
+        for contract in list(market.contracts):
+            contract['current_spot'] = tick['quote']
+            settled = market.count >= contract['exit_count']
+            if settled:
+                won = contract_wins(contract['contract_type'], contract['barrier'] or 0, market.digit())
+                self.close_contract(contract, market, 'won' if won else 'lost', contract['payout'] if won else 0.0)
+            await self.push_contract(contract)
+            if settled:
+                await self.push_balance(contract['account'])
+    
+    def contract_body(self, contract: Dict) -> Dict:
+        is_sold = contract['status'] != 'open'
+        market = self.markets[contract['symbol']]
+        bid = contract['sell_price'] if is_sold else self.bid_price(contract, market)
+        body = {
+            'contract_id': contract['contract_id'],
+            'transaction_ids': {'buy': contract['transaction_id']},
+            'underlying': contract['symbol'],
+            'contract_type': contract['contract_type'],
+            'currency': contract['currency'],
+            'buy_price': contract['amount'],
+            'payout': contract['payout'],
+            'bid_price': bid,
+            'profit': round(bid - contract['amount'], 2),
+            'purchase_time': contract['purchase_time'],
+            'date_start': contract['purchase_time'],
+            'date_expiry': contract['purchase_time'] + contract['duration'],
+            'tick_count': contract['duration'],
+            'entry_spot': contract['entry_spot'],
+            'current_spot': contract['current_spot'],
+            'status': contract['status'],
+            'is_sold': 1 if is_sold else 0,
+            'is_expired': 1 if contract['status'] in ('won', 'lost') else 0
+        }
+        if contract['barrier'] is not None:
+            body['barrier'] = str(contract['barrier'])
+        if is_sold:
+            body.update({
+                'sell_price': contract['sell_price'],
+                'sell_time': contract['sell_time'],
+                'exit_tick': contract['exit_spot'],
+                'exit_tick_time': contract['sell_time']
+            })
+        return body
+    
+    async def push_contract(self, contract: Dict):
+        body = self.contract_body(contract)
+        for session, sub_id in list(contract['watchers']):
+            subscription = session.subscriptions.get(sub_id)
+            if subscription is None or session.ws.closed:
+                contract['watchers'].remove((session, sub_id))
+                continue
+            await session.send('proposal_open_contract', subscription['request'], body, sub_id)
+            if body['is_sold']:
+                del session.subscriptions[sub_id]  # Deriv ends the stream with the final update
+        if body['is_sold']:
+            contract['watchers'].clear()
+
+async def serve(args):
+    simulator = DerivSimulator(tick_rate=args.tick_rate, seed=args.seed, start_epoch=args.start_epoch)
+    await simulator.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await simulator.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Deriv WebSocket simulator")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tick-rate', type=float, default=1.0, help='Ticks per second per symbol; 0 = unthrottled')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start-epoch', type=int, help='Epoch of the first tick (default: now)')
+    
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
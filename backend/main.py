@@ -16,26 +16,71 @@ COMPLETE FEATURE SET:
 - Bot logs and monitoring
 """
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, BackgroundTasks, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List, Optional
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from typing import Dict, List, Optional, Set, Tuple
 import asyncio
+import bisect
+import calendar
+import heapq
+import itertools
+import operator
 import json
 import random
+import re
 import logging
+import math
 import os
+import sqlite3
+import struct
+import time
 from datetime import datetime, timedelta
 from collections import deque, Counter
 import aiohttp
+import numpy as np
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory, util
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass, asdict
+from array import array
+from contextlib import asynccontextmanager
+import orjson
+
+try:
+    import msgpack
+except ImportError:  # msgpack encoding is unavailable without it
+    msgpack = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DERIV_APP_ID = os.getenv("DERIV_APP_ID", "1089")
-DERIV_WS_URL = f"wss://ws.derivws.com/websockets/v3?app_id={DERIV_APP_ID}"
+DERIV_WS_URL = os.getenv("DERIV_WS_URL", f"wss://ws.derivws.com/websockets/v3?app_id={DERIV_APP_ID}")  # or deriv_simulator.py
+DERIV_PING_INTERVAL = float(os.getenv("DERIV_PING_INTERVAL", "30"))
+DERIV_RECONNECT_MIN_DELAY = 1.0
+DERIV_RECONNECT_MAX_DELAY = float(os.getenv("DERIV_RECONNECT_MAX_DELAY", "60"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tick_store.start()
+    await trade_store.start()
+    loop_monitor.start()
+    
+    yield
+    
+    # Close every Deriv socket and the shared HTTP session
+    await deriv_manager.shutdown()
+    await tick_store.close()
+    await trade_store.close()
+    await loop_monitor.close()
 
-app = FastAPI(title="ROSTOVA 3.0 - THE ULTIMATE", version="3.0.0")
+app = FastAPI(
+    title="ROSTOVA 3.0 - THE ULTIMATE",
+    version="3.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -53,19 +98,9 @@ class UserSession:
     deriv_token: str
     balance: float
     currency: str
-    active_contracts: List[Dict]
-    websocket: Optional[WebSocket]
+    active_contracts: 'ContractBook'
     last_activity: datetime
 
-@dataclass
-class DigitAnalytics:
-    symbol: str
-    digit_frequency: Dict[int, int]  # 0-9 frequency
-    even_odd_ratio: Dict[str, int]
-    over_under_5: Dict[str, int]
-    patterns: List[Dict]
-    last_100_ticks: List[int]
-
 @dataclass
 class TradingBot:
     bot_id: str
@@ -76,773 +111,3904 @@ class TradingBot:
     stats: Dict
     config: Dict
 
-# ===== STORAGE =====
-user_sessions: Dict[str, UserSession] = {}
-deriv_connections: Dict[str, aiohttp.ClientWebSocketResponse] = {}
-digit_analytics: Dict[str, DigitAnalytics] = {}
-active_bots: Dict[str, TradingBot] = {}
-trade_history: Dict[str, List[Dict]] = {}
-signal_cache: Dict[str, Dict] = {}
-bot_logs: Dict[str, List[Dict]] = {}
+# ===== DIGIT ANALYTICS ENGINE =====
 
-# Initialize digit analytics for markets
-for symbol in ['R_10', 'R_25', 'R_50', 'R_75', 'R_100', 'BOOM500', 'CRASH500']:
-    digit_analytics[symbol] = DigitAnalytics(
-        symbol=symbol,
-        digit_frequency={i: 0 for i in range(10)},
-        even_odd_ratio={'even': 0, 'odd': 0},
-        over_under_5={'over': 0, 'under': 0},
-        patterns=[],
-        last_100_ticks=[]
-    )
+ANALYTICS_WINDOWS = tuple(sorted(
+    int(w) for w in os.getenv("ANALYTICS_WINDOWS", "20,100,1000,10000").split(',')
+))
+ANALYTICS_HALF_LIFE = float(os.getenv("ANALYTICS_HALF_LIFE", "500"))  # ticks
+MARKOV_MAX_ORDER = int(os.getenv("MARKOV_MAX_ORDER", "3"))
+MARKOV_MIN_CONTEXT = int(os.getenv("MARKOV_MIN_CONTEXT", "30"))  # observations before an order is trusted
 
-# ===== DERIV API INTEGRATION =====
+def last_digit(quote: float, pip_size: Optional[int] = None) -> int:
+    """Last decimal digit of a quote, honouring Deriv's pip size"""
+    if pip_size is not None:
+        return int(round(quote * 10 ** pip_size)) % 10
+    return int(str(quote).replace('.', '')[-1])
 
-class DerivAPI:
-    """Complete Deriv API integration"""
+class RollingWindow:
+    """Digit counts over the last `size` ticks, updated incrementally"""
     
-    def __init__(self):
-        self.connections: Dict[str, aiohttp.ClientWebSocketResponse] = {}
-        
-    async def connect(self, user_id: str, api_token: str) -> bool:
-        """Connect to Deriv WebSocket with user token"""
-        try:
-            session = aiohttp.ClientSession()
-            ws = await session.ws_connect(DERIV_WS_URL)
-            
-            # Authorize with token
-            await ws.send_json({
-                "authorize": api_token
-            })
-            
-            auth_response = await ws.receive_json()
-            
-            if auth_response.get('error'):
-                logger.error(f"Deriv auth failed: {auth_response['error']}")
-                return False
-            
-            self.connections[user_id] = ws
-            
-            # Get account info
-            await ws.send_json({"balance": 1, "subscribe": 1})
-            
-            # Start listening
-            asyncio.create_task(self.listen(user_id, ws))
-            
-            logger.info(f"✅ User {user_id} connected to Deriv")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Deriv connection error: {e}")
-            return False
+    __slots__ = ('size', 'count', 'digits', 'even', 'over')
     
-    async def listen(self, user_id: str, ws: aiohttp.ClientWebSocketResponse):
-        """Listen for Deriv messages"""
-        try:
-            async for msg in ws:
-                if msg.type == aiohttp.WSMsgType.TEXT:
-                    data = json.loads(msg.data)
-                    await self.handle_message(user_id, data)
-        except Exception as e:
-            logger.error(f"Listen error: {e}")
-            if user_id in self.connections:
-                del self.connections[user_id]
+    def __init__(self, size: int):
+        self.size = size
+        self.count = 0
+        self.digits = [0] * 10
+        self.even = 0
+        self.over = 0
     
-    async def handle_message(self, user_id: str, data: dict):
-        """Handle Deriv WebSocket messages"""
-        msg_type = data.get('msg_type')
-        
-        if msg_type == 'balance':
-            # Update user balance
-            if user_id in user_sessions:
-                balance_data = data.get('balance', {})
-                user_sessions[user_id].balance = balance_data.get('balance', 0)
-                user_sessions[user_id].currency = balance_data.get('currency', 'USD')
+    def stats(self) -> Dict:
+        count = self.count
+        return {
+            'sample_size': count,
+            'digit_frequency': {d: c for d, c in enumerate(self.digits)},
+            'even_odd_ratio': {'even': self.even, 'odd': count - self.even},
+            'over_under_5': {'over': self.over, 'under': count - self.over},
+        }
+
+class DecayedWindow:
+    """Exponentially-decayed digit counts.
+    
+    Counts are stored pre-multiplied by a growing scale factor so a tick
+    only touches one digit; values are divided back out when read.
+    """
+    
+    __slots__ = ('half_life', 'decay', 'scale', 'raw')
+    
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self.decay = 0.5 ** (1.0 / half_life)
+        self.scale = 1.0
+        self.raw = [0.0] * 10
+    
+    def add(self, digit: int):
+        self.scale /= self.decay
+        self.raw[digit] += self.scale
+        if self.scale > 1e100:
+            self.raw = [r / self.scale for r in self.raw]
+            self.scale = 1.0
+    
+    def stats(self) -> Dict:
+        digits = [r / self.scale for r in self.raw]
+        count = sum(digits)
+        even = sum(digits[0::2])
+        over = sum(digits[6:])
+        return {
+            'sample_size': round(count, 3),
+            'half_life': self.half_life,
+            'digit_frequency': {d: round(c, 3) for d, c in enumerate(digits)},
+            'even_odd_ratio': {'even': round(even, 3), 'odd': round(count - even, 3)},
+            'over_under_5': {'over': round(over, 3), 'under': round(count - over, 3)},
+        }
+
+class TransitionModel:
+    """Order-1..k digit transition counts over the analytics ring.
+    
+    counts[k] is a dense 10**(k+1) array indexed by the k previous digits
+    followed by the next one, read as a base-10 number. Only transitions
+    lying entirely inside the ring are counted, so the model follows the
+    largest rolling window. A tick is O(k), a query reads one row of 10.
+    """
+    
+    __slots__ = ('order', 'counts', 'context')
+    
+    def __init__(self, order: int = MARKOV_MAX_ORDER):
+        self.order = order
+        self.counts = [array('I')] + [array('I', bytes(4 * 10 ** (k + 1))) for k in range(1, order + 1)]
+        self.context = 0  # last `order` digits as a base-10 number
+    
+    def add(self, digit: int, seen: int):
+        """Count the transitions ending at digit; `seen` digits precede it in the ring"""
+        context = self.context
+        counts = self.counts
+        scale = 10
+        for k in range(1, min(seen, self.order) + 1):
+            counts[k][(context % scale) * 10 + digit] += 1
+            scale *= 10
+        self.context = (context * 10 + digit) % (10 ** self.order)
+    
+    def remove(self, ring: array, start: int):
+        """Uncount the transitions starting at ring[start], about to be overwritten"""
+        size = len(ring)
+        index = ring[start]
+        for k in range(1, self.order + 1):
+            index = index * 10 + ring[(start + k) % size]
+            self.counts[k][index] -= 1
+    
+    def warm(self, tail: np.ndarray):
+        """Recount from the ring contents (oldest first), vectorized"""
+        tail = tail.astype(np.int64)
+        n = len(tail)
+        for k in range(1, self.order + 1):
+            if n <= k:
+                break
+            index = np.zeros(n - k, dtype=np.int64)
+            for j in range(k + 1):
+                index = index * 10 + tail[j:n - k + j]
+            self.counts[k] = array('I', np.bincount(index, minlength=10 ** (k + 1)).astype(np.uint32).tobytes())
+        context = 0
+        for digit in tail[-self.order:].tolist():
+            context = context * 10 + digit
+        self.context = context % (10 ** self.order)
+    
+    def next_digit(self, seen: int, order: Optional[int] = None) -> Tuple[int, int, List[float]]:
+        """(order used, observations, probability of each next digit).
         
-        elif msg_type == 'tick':
-            # Process tick data for analytics
-            tick_data = data.get('tick', {})
-            symbol = tick_data.get('symbol')
-            quote = tick_data.get('quote')
-            
-            if symbol and quote:
-                await self.update_analytics(symbol, quote)
-                
-                # Broadcast to user
-                if user_id in user_sessions and user_sessions[user_id].websocket:
-                    try:
-                        await user_sessions[user_id].websocket.send_json({
-                            'type': 'tick',
-                            'data': tick_data
-                        })
-                    except:
-                        pass
+        Backs off from `order` (default the highest) to the highest order
+        whose current context has MARKOV_MIN_CONTEXT observations; order 0
+        (uniform) if none has.
+        """
+        order = min(self.order if order is None else order, self.order, seen)
+        for k in range(order, 0, -1):
+            row = (self.context % 10 ** k) * 10
+            counts = self.counts[k][row:row + 10]
+            total = sum(counts)
+            if total >= MARKOV_MIN_CONTEXT:
+                return k, total, [c / total for c in counts]
+        return 0, 0, [0.1] * 10
+
+class DigitAnalytics:
+    """Digit statistics for one symbol over a fixed-size ring buffer.
+    
+    The ring is as long as the largest rolling window; every window, the
+    decayed counts and the all-time counters are maintained incrementally,
+    so a tick costs O(windows) and the endpoints only read precomputed
+    values.
+    """
+    
+    __slots__ = (
+        'symbol', 'size', 'ring', 'head', 'count',
+        'digit_frequency', 'even_odd_ratio', 'over_under_5',
+        'windows', 'decayed', 'transitions',
+        'last', 'streak', 'alternation', 'patterns',
+    )
+    
+    def __init__(self, symbol: str, windows: tuple = ANALYTICS_WINDOWS):
+        self.symbol = symbol
+        self.size = max(windows)
+        self.ring = array('b', bytes(self.size))
+        self.head = 0   # next write position
+        self.count = 0  # digits currently held in the ring
         
-        elif msg_type == 'proposal':
-            # Payout estimate
-            pass
+        # All-time counters
+        self.digit_frequency: Dict[int, int] = {i: 0 for i in range(10)}
+        self.even_odd_ratio: Dict[str, int] = {'even': 0, 'odd': 0}
+        self.over_under_5: Dict[str, int] = {'over': 0, 'under': 0}
         
-        elif msg_type == 'buy':
-            # Contract purchased
-            contract = data.get('buy', {})
-            if user_id in user_sessions:
-                user_sessions[user_id].active_contracts.append(contract)
+        # Rolling counters, smallest window first
+        self.windows: Dict[int, RollingWindow] = {w: RollingWindow(w) for w in sorted(windows)}
+        self.decayed = DecayedWindow(ANALYTICS_HALF_LIFE)
+        self.transitions = TransitionModel()
         
-        elif msg_type == 'proposal_open_contract':
-            # Contract update
-            contract = data.get('proposal_open_contract', {})
-            await self.update_contract(user_id, contract)
+        self.last = -1
+        self.streak = 0       # repeats of the current digit
+        self.alternation = 0  # consecutive parity flips ending at the last digit
+        self.patterns: List[Dict] = []
     
-    async def update_analytics(self, symbol: str, price: float):
-        """Update digit analytics"""
-        if symbol in digit_analytics:
-            analytics = digit_analytics[symbol]
-            
-            # Extract last digit
-            last_digit = int(str(price).replace('.', '')[-1])
-            
-            # Update frequency
-            analytics.digit_frequency[last_digit] += 1
-            
-            # Update even/odd
-            if last_digit % 2 == 0:
-                analytics.even_odd_ratio['even'] += 1
-            else:
-                analytics.even_odd_ratio['odd'] += 1
-            
-            # Update over/under 5
-            if last_digit > 5:
-                analytics.over_under_5['over'] += 1
-            else:
-                analytics.over_under_5['under'] += 1
-            
-            # Store last 100 ticks
-            analytics.last_100_ticks.append(last_digit)
-            if len(analytics.last_100_ticks) > 100:
-                analytics.last_100_ticks.pop(0)
-            
-            # Detect patterns
-            await self.detect_patterns(symbol)
+    @property
+    def total(self) -> int:
+        return self.even_odd_ratio['even'] + self.even_odd_ratio['odd']
     
-    async def detect_patterns(self, symbol: str):
-        """Detect digit patterns"""
-        analytics = digit_analytics[symbol]
-        ticks = analytics.last_100_ticks
+    def window(self, size: int) -> Optional[RollingWindow]:
+        return self.windows.get(size)
+    
+    def add(self, digit: int, detect: bool = True):
+        """Push one digit and update every statistic (patterns too unless
+        `detect` is False, for callers timing detect_patterns separately)"""
+        ring = self.ring
+        head = self.head
+        ring_size = self.size
+        
+        for w in self.windows.values():
+            if w.count == w.size:
+                old = ring[head - w.size]  # negative index wraps around the ring
+                w.digits[old] -= 1
+                if old % 2 == 0:
+                    w.even -= 1
+                if old > 5:
+                    w.over -= 1
+            else:
+                w.count += 1
+            w.digits[digit] += 1
+            if digit % 2 == 0:
+                w.even += 1
+            if digit > 5:
+                w.over += 1
+        
+        if self.count < ring_size:
+            self.transitions.add(digit, self.count)
+            self.count += 1
+        else:
+            self.transitions.remove(ring, head)  # ring[head] is the oldest digit
+            self.transitions.add(digit, self.count)
+        ring[head] = digit
+        self.head = head + 1 if head + 1 < ring_size else 0
+        
+        self.decayed.add(digit)
+        
+        self.digit_frequency[digit] += 1
+        if digit % 2 == 0:
+            self.even_odd_ratio['even'] += 1
+        else:
+            self.even_odd_ratio['odd'] += 1
+        if digit > 5:
+            self.over_under_5['over'] += 1
+        else:
+            self.over_under_5['under'] += 1
+        
+        previous = self.last
+        self.streak = self.streak + 1 if digit == previous else 1
+        if previous >= 0 and (digit ^ previous) & 1:
+            self.alternation += 1
+        else:
+            self.alternation = 0
+        self.last = digit
         
-        if len(ticks) < 10:
+        if detect:
+            self.detect_patterns()
+    
+    def detect_patterns(self):
+        """Derive patterns from the running streak/alternation counters"""
+        if self.count < 10:
             return
         
         patterns = []
         
-        # Check for streaks
-        current_streak = 1
-        for i in range(len(ticks) - 1, 0, -1):
-            if ticks[i] == ticks[i-1]:
-                current_streak += 1
-            else:
-                break
-        
-        if current_streak >= 3:
+        if self.streak >= 3:
             patterns.append({
                 'type': 'streak',
-                'digit': ticks[-1],
-                'length': current_streak,
-                'confidence': min(0.95, 0.7 + (current_streak * 0.05))
+                'digit': self.last,
+                'length': self.streak,
+                'confidence': min(0.95, 0.7 + (self.streak * 0.05))
             })
         
-        # Check for alternating pattern
-        if len(ticks) >= 6:
-            last_6 = ticks[-6:]
-            is_alternating = all(
-                (last_6[i] % 2) != (last_6[i+1] % 2)
-                for i in range(len(last_6) - 1)
-            )
-            if is_alternating:
-                patterns.append({
-                    'type': 'alternating',
-                    'pattern': 'even_odd',
-                    'confidence': 0.75
-                })
+        # Six digits alternating parity means five flips in a row
+        if self.alternation >= 5:
+            patterns.append({
+                'type': 'alternating',
+                'pattern': 'even_odd',
+                'confidence': 0.75
+            })
         
-        analytics.patterns = patterns[-5:]  # Keep last 5 patterns
+        self.patterns = patterns
     
-    async def buy_contract(self, user_id: str, params: dict) -> dict:
-        """Buy contract on Deriv"""
-        if user_id not in self.connections:
-            return {'error': 'Not connected to Deriv'}
+    def warm(self, digits: np.ndarray):
+        """Bulk-load history into empty analytics, vectorized.
         
-        ws = self.connections[user_id]
+        Equivalent to calling add() for each digit, but only the ring tail
+        is touched, so tens of thousands of ticks load in milliseconds.
+        """
+        if self.count or not len(digits):
+            for digit in np.asarray(digits).tolist():
+                self.add(digit)
+            return
         
-        try:
-            # Send buy request
-            await ws.send_json({
-                "buy": 1,
-                "price": params['stake'],
-                "parameters": {
-                    "contract_type": params['contract_type'],
-                    "symbol": params['symbol'],
-                    "duration": params.get('duration', 5),
-                    "duration_unit": params.get('duration_unit', 't'),
-                    "basis": "stake",
-                    "amount": params['stake']
-                }
-            })
-            
-            # Wait for response
-            response = await asyncio.wait_for(ws.receive_json(), timeout=5.0)
-            
-            if response.get('error'):
-                return {'success': False, 'error': response['error']}
-            
-            return {'success': True, 'contract': response.get('buy')}
-            
-        except Exception as e:
-            logger.error(f"Buy error: {e}")
-            return {'success': False, 'error': str(e)}
-    
-    async def sell_contract(self, user_id: str, contract_id: str) -> dict:
-        """Sell (close) contract early"""
-        if user_id not in self.connections:
-            return {'error': 'Not connected'}
+        digits = np.asarray(digits, dtype=np.int8)
+        counts = np.bincount(digits, minlength=10)
+        tail = digits[-self.size:]
+        n = len(tail)
         
-        ws = self.connections[user_id]
+        self.ring[:n] = array('b', tail.tobytes())
+        self.head = n % self.size
+        self.count = n
         
-        try:
-            await ws.send_json({
-                "sell": contract_id,
-                "price": 0  # Sell at current price
-            })
-            
-            response = await asyncio.wait_for(ws.receive_json(), timeout=5.0)
-            return {'success': True, 'result': response}
-            
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
-    
-    async def update_contract(self, user_id: str, contract: dict):
-        """Update contract status"""
-        if user_id not in user_sessions:
-            return
+        for d, c in enumerate(counts.tolist()):
+            self.digit_frequency[d] += c
+        even = int(counts[0::2].sum())
+        over = int(counts[6:].sum())
+        self.even_odd_ratio['even'] += even
+        self.even_odd_ratio['odd'] += len(digits) - even
+        self.over_under_5['over'] += over
+        self.over_under_5['under'] += len(digits) - over
         
-        contract_id = contract.get('contract_id')
+        for w in self.windows.values():
+            window_counts = np.bincount(tail[-w.size:], minlength=10).tolist()
+            w.count = min(w.size, n)
+            w.digits = window_counts
+            w.even = sum(window_counts[0::2])
+            w.over = sum(window_counts[6:])
         
-        # Update in active contracts
-        active = user_sessions[user_id].active_contracts
-        for i, c in enumerate(active):
-            if c.get('contract_id') == contract_id:
-                active[i] = contract
-                
-                # If contract closed, move to history
-                if contract.get('is_sold') or contract.get('status') == 'won' or contract.get('status') == 'lost':
-                    active.pop(i)
-                    
-                    if user_id not in trade_history:
-                        trade_history[user_id] = []
-                    trade_history[user_id].append(contract)
-                    
-                    # Notify user
-                    if user_sessions[user_id].websocket:
-                        try:
-                            await user_sessions[user_id].websocket.send_json({
-                                'type': 'contract_closed',
-                                'contract': contract
-                            })
-                        except:
-                            pass
-                break
+        ages = np.arange(n - 1, -1, -1, dtype=np.float64)
+        self.decayed.raw = np.bincount(tail, weights=self.decayed.decay ** ages, minlength=10).tolist()
+        self.decayed.scale = 1.0
+        
+        self.transitions.warm(tail)
+        
+        # Run lengths at the end of the series
+        changed = np.flatnonzero(tail[1:] != tail[:-1])
+        self.streak = int(n - 1 - changed[-1]) if len(changed) else n
+        same_parity = np.flatnonzero((tail[1:] - tail[:-1]) % 2 == 0)
+        self.alternation = int(n - 2 - same_parity[-1]) if len(same_parity) else n - 1
+        self.last = int(tail[-1])
+        
+        self.detect_patterns()
+    
+    def digit_at(self, seq: int) -> Optional[int]:
+        """Digit of the seq-th tick ever seen (1-based), if still in the ring"""
+        age = self.total - seq
+        if age < 0 or age >= self.count:
+            return None
+        return self.ring[self.head - 1 - age]
+    
+    def recent(self, n: Optional[int] = None) -> List[int]:
+        """Last n digits in arrival order (oldest first)"""
+        n = self.count if n is None else min(n, self.count)
+        start = (self.head - n) % self.size
+        if start + n <= self.size:
+            return self.ring[start:start + n].tolist()
+        return (self.ring[start:] + self.ring[:start + n - self.size]).tolist()
 
-deriv_api = DerivAPI()
+# ===== STORAGE =====
+user_sessions: Dict[str, UserSession] = {}
+client_connections: Dict[str, Set['ClientConnection']] = {}
+deriv_connections: Dict[str, aiohttp.ClientWebSocketResponse] = {}
+digit_analytics: Dict[str, DigitAnalytics] = {}
+active_bots: Dict[str, TradingBot] = {}
+signal_cache: Dict[str, Dict] = {}  # symbol -> {'seq': tick sequence, 'results': {key: result}}
+bot_logs: Dict[str, List[Dict]] = {}
 
-# ===== MAIN ENDPOINTS =====
+# ===== SIGNAL CACHE =====
 
-@app.get("/")
-async def root():
-    return {
-        "name": "ROSTOVA 3.0 - THE ULTIMATE",
-        "version": "3.0.0",
-        "status": "operational",
-        "features": [
-            "Real Deriv API Integration",
-            "Live Balance & Contracts",
-            "Full Trade Panel",
-            "Analytics Engine (Digit Frequency, Heatmaps)",
-            "DBot-Level Automation",
-            "Strategy Builder",
-            "Smart Signals",
-            "Risk Management",
-            "Capital Protector",
-            "Multi-Timeframe Analysis",
-            "Pattern Detection",
-            "Bot Performance Tracking",
-            "Session Analytics",
-            "Early Sell",
-            "Probability Engine"
-        ]
-    }
+SIGNAL_CACHE_MAX_KEYS = int(os.getenv("SIGNAL_CACHE_MAX_KEYS", "256"))
 
-# ===== AUTHENTICATION =====
+signal_cache_stats: Counter = Counter()
 
-@app.post("/api/v3/auth/deriv")
-async def authenticate_deriv(auth_data: dict):
-    """Authenticate user with Deriv API token"""
-    api_token = auth_data.get('token')
-    user_id = auth_data.get('user_id', 'demo_user')
+def cached_signal(analytics: DigitAnalytics, key: Tuple, compute):
+    """Result of compute(), computed at most once per tick of the symbol.
     
-    if not api_token:
-        return {'success': False, 'error': 'API token required'}
+    Entries are tagged with the analytics tick sequence and dropped as a
+    whole when it moves on, so polling between ticks is a dict lookup.
+    """
+    entry = signal_cache.get(analytics.symbol)
+    if entry is None or entry['seq'] != analytics.total or len(entry['results']) >= SIGNAL_CACHE_MAX_KEYS:
+        entry = signal_cache[analytics.symbol] = {'seq': analytics.total, 'results': {}}
     
-    # Connect to Deriv
-    success = await deriv_api.connect(user_id, api_token)
+    results = entry['results']
+    if key in results:
+        signal_cache_stats['hits'] += 1
+        return results[key]
     
-    if success:
-        # Create session
-        user_sessions[user_id] = UserSession(
-            user_id=user_id,
-            deriv_token=api_token,
-            balance=0,
-            currency='USD',
-            active_contracts=[],
-            websocket=None,
-            last_activity=datetime.now()
-        )
-        
+    signal_cache_stats['misses'] += 1
+    result = results[key] = compute()
+    return result
+
+# ===== TICK STORE =====
+
+TICK_STORE_DIR = os.getenv("TICK_STORE_DIR", "data/ticks")
+TICK_STORE_FLUSH_INTERVAL = float(os.getenv("TICK_STORE_FLUSH_INTERVAL", "1.0"))
+
+# Fixed-width column files making up one symbol/day segment
+TICK_COLUMNS = {
+    'epoch': np.dtype('<i8'),
+    'quote': np.dtype('<f8'),
+    'digit': np.dtype('i1'),
+}
+
+class TickStore:
+    """Append-only tick recorder with memory-mapped columnar segments.
+    
+    Each symbol/day is a directory holding one fixed-width file per
+    column, so a range read is a `numpy.memmap` slice located with a
+    binary search on the epoch column. Appends only touch in-memory
+    buffers; every TICK_STORE_FLUSH_INTERVAL seconds the loop detaches
+    them and a worker thread writes them out. The thread never sees the
+    live buffers, and only one write runs at a time, so the column files
+    stay row-aligned.
+    """
+    
+    def __init__(self, root: str = TICK_STORE_DIR):
+        self.root = root
+        self.buffers: Dict[str, Tuple[array, array, array]] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.writing: Optional[asyncio.Future] = None
+    
+    def append(self, symbol: str, epoch: int, quote: float, digit: int):
+        buffer = self.buffers.get(symbol)
+        if buffer is None:
+            buffer = self.buffers[symbol] = (array('q'), array('d'), array('b'))
+        buffer[0].append(epoch)
+        buffer[1].append(quote)
+        buffer[2].append(digit)
+    
+    def segment_path(self, symbol: str, day: str) -> str:
+        return os.path.join(self.root, symbol, day)
+    
+    def write(self, pending: Dict[str, Tuple[array, array, array]]):
+        """Write detached buffers to their day segments (blocking)"""
+        for symbol, (epochs, quotes, digits) in pending.items():
+            # Split on UTC day boundaries; ticks arrive in epoch order
+            start = 0
+            while start < len(epochs):
+                day_start = epochs[start] - epochs[start] % 86400
+                end = start
+                while end < len(epochs) and epochs[end] < day_start + 86400:
+                    end += 1
+                
+                path = self.segment_path(symbol, time.strftime('%Y-%m-%d', time.gmtime(day_start)))
+                os.makedirs(path, exist_ok=True)
+                for name, column in (('epoch', epochs), ('quote', quotes), ('digit', digits)):
+                    with open(os.path.join(path, name), 'ab') as f:
+                        f.write(column[start:end].tobytes())
+                start = end
+    
+    async def flush(self):
+        """Detach the buffers on the loop, then write them in a thread"""
+        pending, self.buffers = self.buffers, {}
+        if not pending:
+            return
+        self.writing = asyncio.ensure_future(asyncio.to_thread(self.write, pending))
+        try:
+            await asyncio.shield(self.writing)  # a cancelled caller must not start a second, overlapping write
+        except OSError as e:
+            logger.error(f"Tick store flush failed: {e}")
+    
+    async def run(self):
+        while True:
+            await asyncio.sleep(TICK_STORE_FLUSH_INTERVAL)
+            await self.flush()
+    
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+    
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        if self.writing:
+            await asyncio.gather(self.writing, return_exceptions=True)
+        await self.flush()
+    
+    def days(self, symbol: str) -> List[str]:
+        try:
+            return sorted(os.listdir(os.path.join(self.root, symbol)))
+        except FileNotFoundError:
+            return []
+    
+    def open_segment(self, symbol: str, day: str) -> Dict[str, np.ndarray]:
+        """Memory-map one day's columns (trimmed to a common length)"""
+        path = self.segment_path(symbol, day)
+        sizes = {
+            name: os.path.getsize(os.path.join(path, name)) // dtype.itemsize
+            for name, dtype in TICK_COLUMNS.items()
+        }
+        length = min(sizes.values())
+        if length == 0:
+            return {name: np.empty(0, dtype) for name, dtype in TICK_COLUMNS.items()}
         return {
-            'success': True,
-            'message': 'Connected to Deriv',
-            'user_id': user_id
+            name: np.memmap(os.path.join(path, name), dtype=dtype, mode='r', shape=(length,))
+            for name, dtype in TICK_COLUMNS.items()
         }
-    else:
-        return {'success': False, 'error': 'Failed to connect to Deriv'}
-
-@app.get("/api/v3/account/{user_id}")
-async def get_account_info(user_id: str):
-    """Get user account information"""
-    if user_id not in user_sessions:
-        return {'error': 'User not authenticated'}
     
-    session = user_sessions[user_id]
-    return {
-        'balance': session.balance,
-        'currency': session.currency,
-        'active_contracts': len(session.active_contracts),
-        'total_trades': len(trade_history.get(user_id, []))
-    }
+    def segments(self, symbol: str, start: Optional[int] = None, end: Optional[int] = None):
+        """Zero-copy column slices per day covering [start, end) epochs"""
+        for day in self.days(symbol):
+            day_start = calendar.timegm(time.strptime(day, '%Y-%m-%d'))
+            if end is not None and day_start >= end:
+                break
+            if start is not None and day_start + 86400 <= start:
+                continue
+            
+            columns = self.open_segment(symbol, day)
+            epochs = columns['epoch']
+            lo = int(np.searchsorted(epochs, start)) if start is not None else 0
+            hi = int(np.searchsorted(epochs, end)) if end is not None else len(epochs)
+            if hi > lo:
+                yield {name: column[lo:hi] for name, column in columns.items()}
+    
+    def read(self, symbol: str, start: Optional[int] = None, end: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Columns for [start, end) epochs; a copy only when spanning days"""
+        parts = list(self.segments(symbol, start, end))
+        if len(parts) == 1:
+            return parts[0]
+        return {
+            name: np.concatenate([p[name] for p in parts]) if parts else np.empty(0, dtype)
+            for name, dtype in TICK_COLUMNS.items()
+        }
+    
+    def tail(self, symbol: str, count: int) -> np.ndarray:
+        """Last `count` recorded digits, newest last"""
+        parts = []
+        remaining = count
+        for day in reversed(self.days(symbol)):
+            digits = self.open_segment(symbol, day)['digit']
+            parts.append(digits[max(len(digits) - remaining, 0):])
+            remaining -= len(parts[-1])
+            if remaining <= 0:
+                break
+        if not parts:
+            return np.empty(0, np.int8)
+        return np.concatenate(parts[::-1])
+
+tick_store = TickStore()
+
+# ===== SYMBOL REGISTRY =====
+
+SYMBOL_REGISTRY_SIZE = int(os.getenv("SYMBOL_REGISTRY_SIZE", "500"))
+SYMBOL_IDLE_TTL = float(os.getenv("SYMBOL_IDLE_TTL", "3600"))
+
+SYMBOL_PATTERN = re.compile(r'^[A-Za-z0-9_]{1,32}$')  # R_100, 1HZ100V, stpRNG, frxEURUSD, ...
+
+class SymbolRegistry:
+    """Creates digit_analytics entries on demand and evicts idle ones.
+    
+    A symbol is active while its market data stream is open; analytics
+    are created (warmed from the tick store) when the stream is first
+    requested. Once the stream stops the symbol is idle and is evicted
+    least-recently-used first when more than SYMBOL_REGISTRY_SIZE symbols
+    are held, or after SYMBOL_IDLE_TTL seconds. Active symbols are never
+    evicted.
+    """
+    
+    def __init__(self):
+        self.idle: Dict[str, float] = {}  # symbol -> monotonic time it went idle, oldest first
+    
+    @staticmethod
+    def valid(symbol: str) -> bool:
+        return isinstance(symbol, str) and SYMBOL_PATTERN.fullmatch(symbol) is not None
+    
+    def acquire(self, symbol: str) -> DigitAnalytics:
+        self.idle.pop(symbol, None)
+        analytics = digit_analytics.get(symbol)
+        if analytics is None:
+            # Warm analytics windows from recorded ticks instead of waiting for fresh ones
+            analytics = digit_analytics[symbol] = DigitAnalytics(symbol)
+            analytics.warm(tick_store.tail(symbol, analytics.size))
+            self.evict()
+        return analytics
+    
+    def release(self, symbol: str):
+        if symbol in digit_analytics:
+            self.idle.pop(symbol, None)
+            self.idle[symbol] = time.monotonic()
+        self.evict()
+    
+    def evict(self):
+        expired = time.monotonic() - SYMBOL_IDLE_TTL
+        for symbol, since in list(self.idle.items()):
+            if len(digit_analytics) <= SYMBOL_REGISTRY_SIZE and since > expired:
+                break
+            del self.idle[symbol]
+            digit_analytics.pop(symbol, None)
+            signal_cache.pop(symbol, None)
+            signal_tracker.forget(symbol)
+
+symbol_registry = SymbolRegistry()
+
+# ===== TRADE STORE =====
+
+TRADE_DB_PATH = os.getenv("TRADE_DB_PATH", "data/trades.db")
+TRADE_STORE_FLUSH_INTERVAL = float(os.getenv("TRADE_STORE_FLUSH_INTERVAL", "0.5"))
+
+TRADE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    contract_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    status TEXT,
+    symbol TEXT,
+    contract_type TEXT,
+    buy_price REAL,
+    profit REAL,
+    purchase_time INTEGER,
+    sell_time INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trades_user_day ON trades (user_id, day);
+CREATE INDEX IF NOT EXISTS trades_user_status ON trades (user_id, status);
+CREATE INDEX IF NOT EXISTS trades_user_sell_time ON trades (user_id, sell_time);
+CREATE TABLE IF NOT EXISTS daily_stats (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    trades INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    losses INTEGER NOT NULL,
+    profit REAL NOT NULL,
+    loss REAL NOT NULL,
+    PRIMARY KEY (user_id, day)
+);
+"""
+
+def settled_at(contract: Dict):
+    """Epoch a contract settled at, as recorded in the trade store"""
+    return contract.get('sell_time') or contract.get('date_expiry') or contract.get('purchase_time')
+
+def trade_day(epoch: Optional[float] = None) -> str:
+    """UTC trading day (Deriv's day boundary) of an epoch, today if None"""
+    return time.strftime('%Y-%m-%d', time.gmtime(epoch))
+
+class TradeStore:
+    """Settled trade history in SQLite (WAL mode).
+    
+    record() is O(1): the row is queued and, for trades settled today,
+    the user's aggregate is updated in memory. Only the current UTC day
+    is kept in memory; other days are read from daily_stats. A writer
+    task commits queued rows and aggregate upserts in one transaction
+    per TRADE_STORE_FLUSH_INTERVAL. All SQLite work runs on a single
+    worker thread, off the event loop.
+    """
+    
+    def __init__(self, path: str = TRADE_DB_PATH):
+        self.path = path
+        self.db: Optional[sqlite3.Connection] = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trade-store')
+        self.queue: List[Tuple] = []
+        self.day = ''
+        self.today: Dict[str, Dict] = {}  # user_id -> aggregate for self.day
+        self.total_trades: Counter = Counter()
+        self.task: Optional[asyncio.Task] = None
+    
+    async def call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+    
+    def connect(self) -> sqlite3.Connection:
+        if self.db is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.db = sqlite3.connect(self.path, check_same_thread=False)
+            self.db.row_factory = sqlite3.Row
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            self.db.executescript(TRADE_SCHEMA)
+        return self.db
+    
+    @staticmethod
+    def empty_daily() -> Dict:
+        return {'trades': 0, 'wins': 0, 'losses': 0, 'profit': 0.0, 'loss': 0.0}
+    
+    def load(self):
+        """Load trade totals and today's aggregates"""
+        db = self.connect()
+        for row in db.execute('SELECT user_id, SUM(trades) AS trades FROM daily_stats GROUP BY user_id'):
+            self.total_trades[row['user_id']] = row['trades']
+        self.day = trade_day()
+        for row in db.execute('SELECT * FROM daily_stats WHERE day = ?', (self.day,)):
+            self.today[row['user_id']] = {k: row[k] for k in ('trades', 'wins', 'losses', 'profit', 'loss')}
+    
+    def roll(self):
+        """Drop the previous day's aggregates at the UTC day boundary"""
+        day = trade_day()
+        if day != self.day:
+            self.day = day
+            self.today = {}
+    
+    async def start(self):
+        await self.call(self.load)
+        self.task = asyncio.create_task(self.run())
+    
+    def record(self, user_id: str, contract: Dict):
+        """Queue a settled contract and update the user's daily aggregate"""
+        settled = settled_at(contract)
+        day = trade_day(settled)
+        profit = float(contract.get('profit') or 0)
+        won = contract.get('status') == 'won' or (contract.get('status') != 'lost' and profit > 0)
+        
+        self.queue.append((
+            str(contract.get('contract_id')), user_id, day, contract.get('status'),
+            contract.get('underlying'), contract.get('contract_type'), contract.get('buy_price'),
+            profit, contract.get('purchase_time'), settled, json.dumps(contract)
+        ))
+        
+        self.total_trades[user_id] += 1
+        
+        self.roll()
+        if day != self.day:
+            return  # settled on another day: only its daily_stats row changes
+        daily = self.today.get(user_id)
+        if daily is None:
+            daily = self.today[user_id] = self.empty_daily()
+        daily['trades'] += 1
+        daily['wins' if won else 'losses'] += 1
+        daily['profit'] += profit
+        if profit < 0:
+            daily['loss'] += profit
+    
+    def today_stats(self, user_id: str) -> Dict:
+        """The user's aggregate for the current UTC day"""
+        self.roll()
+        return self.today.get(user_id) or self.empty_daily()
+    
+    async def daily(self, user_id: str, day: Optional[str] = None) -> Dict:
+        """The user's aggregate for `day` (default today)"""
+        if not day or day == trade_day():
+            return dict(self.today_stats(user_id))
+        
+        await self.flush()
+        row = await self.call(lambda: self.connect().execute(
+            'SELECT * FROM daily_stats WHERE user_id = ? AND day = ?', (user_id, day)
+        ).fetchone())
+        if row is None:
+            return self.empty_daily()
+        return {k: row[k] for k in ('trades', 'wins', 'losses', 'profit', 'loss')}
+    
+    def write(self, rows: List[Tuple]):
+        db = self.connect()
+        with db:
+            deltas: Dict[Tuple[str, str], List[float]] = {}
+            for row in rows:
+                # A re-delivered settlement is only stored and counted once
+                if not db.execute('INSERT OR IGNORE INTO trades VALUES (?,?,?,?,?,?,?,?,?,?,?)', row).rowcount:
+                    continue
+                _, user_id, day, status, _, _, _, profit, _, _, _ = row
+                won = status == 'won' or (status != 'lost' and profit > 0)
+                delta = deltas.setdefault((user_id, day), [0, 0, 0, 0.0, 0.0])
+                delta[0] += 1
+                delta[1 if won else 2] += 1
+                delta[3] += profit
+                delta[4] += min(profit, 0)
+            
+            db.executemany(
+                """INSERT INTO daily_stats VALUES (?,?,?,?,?,?,?)
+                   ON CONFLICT (user_id, day) DO UPDATE SET
+                       trades = trades + excluded.trades,
+                       wins = wins + excluded.wins,
+                       losses = losses + excluded.losses,
+                       profit = profit + excluded.profit,
+                       loss = loss + excluded.loss""",
+                [(u, d, *delta) for (u, d), delta in deltas.items()]
+            )
+    
+    async def flush(self):
+        if not self.queue:
+            return
+        rows, self.queue = self.queue, []
+        await self.call(self.write, rows)
+    
+    async def run(self):
+        while True:
+            await asyncio.sleep(TRADE_STORE_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Trade store write failed: {e}")
+    
+    async def history(self, user_id: str, day: Optional[str] = None, status: Optional[str] = None,
+                      limit: int = 100) -> List[Dict]:
+        """Most recent settled trades, newest first"""
+        await self.flush()
+        
+        query = 'SELECT data FROM trades WHERE user_id = ?'
+        args: List = [user_id]
+        if day:
+            query += ' AND day = ?'
+            args.append(day)
+        if status:
+            query += ' AND status = ?'
+            args.append(status)
+        query += ' ORDER BY sell_time DESC LIMIT ?'
+        args.append(limit)
+        
+        rows = await self.call(lambda: self.connect().execute(query, args).fetchall())
+        return [json.loads(row['data']) for row in rows]
+    
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        await self.flush()
+        if self.db is not None:
+            await self.call(self.db.close)
+            self.db = None
+
+trade_store = TradeStore()
+
+# ===== METRICS =====
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+HOT_PATH_BUCKETS_US = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+LOOP_LAG_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+EVENT_LOOP_PROBE_INTERVAL = float(os.getenv("EVENT_LOOP_PROBE_INTERVAL", "0.1"))
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is a bisect and two adds"""
+    
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+    
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+    
+    def prometheus(self, name: str, labels: str = '') -> List[str]:
+        """Sample lines in Prometheus text format; `labels` like 'path="fast"'"""
+        prefix = f'{labels},' if labels else ''
+        lines = [
+            f'{name}_bucket{{{prefix}le="{b}"}} {c}'
+            for b, c in zip(self.buckets, itertools.accumulate(self.counts))
+        ]
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {self.sum}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
+    
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': round(self.sum / self.count, 2) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': {
+                **{f'le_{b}': c for b, c in zip(self.buckets, itertools.accumulate(self.counts))},
+                'le_inf': self.count
+            }
+        }
+
+ticks_ingested: Counter = Counter()  # symbol -> ticks
+analytics_update_us = Histogram(HOT_PATH_BUCKETS_US)
+detect_patterns_us = Histogram(HOT_PATH_BUCKETS_US)
+bot_evaluation_us = Histogram(HOT_PATH_BUCKETS_US)
+deriv_rtt_ms: Dict[str, Histogram] = {}  # request type -> round trip
+event_loop_lag_ms = Histogram(LOOP_LAG_BUCKETS_MS)
+
+class EventLoopMonitor:
+    """Measures how late a periodic sleep wakes up: time the event loop
+    spent busy with other callbacks"""
+    
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+    
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(EVENT_LOOP_PROBE_INTERVAL)
+            lag = time.perf_counter() - started - EVENT_LOOP_PROBE_INTERVAL
+            event_loop_lag_ms.observe(max(lag, 0.0) * 1000)
+    
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+    
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+loop_monitor = EventLoopMonitor()
+
+# ===== CONTRACT BOOK =====
+
+def contract_closed(contract: Dict) -> bool:
+    return bool(contract.get('is_sold')) or contract.get('status') in ('won', 'lost')
+
+class ContractBook:
+    """A user's open contracts keyed by contract_id.
+    
+    Updates are dict lookups; per-symbol and expiry indexes and the
+    aggregate exposure (stake at risk) and unrealized P/L are adjusted by
+    each contract's change, never recomputed over the book.
+    """
+    
+    def __init__(self):
+        self.contracts: Dict[str, Dict] = {}
+        self.by_symbol: Dict[str, Set[str]] = {}
+        self.expiries: List[Tuple[int, str]] = []  # heap of (date_expiry, contract_id); stale entries skipped
+        self.exposure = 0.0
+        self.unrealized = 0.0
+    
+    def __len__(self) -> int:
+        return len(self.contracts)
+    
+    def values(self):
+        return self.contracts.values()
+    
+    def get(self, contract_id) -> Optional[Dict]:
+        return self.contracts.get(str(contract_id))
+    
+    def symbol(self, symbol: str) -> List[Dict]:
+        return [self.contracts[c] for c in self.by_symbol.get(symbol, ())]
+    
+    def open(self, contract: Dict):
+        """Add a bought (or already open) contract"""
+        contract_id = str(contract['contract_id'])
+        if contract_id in self.contracts:
+            self.update(contract)
+            return
+        
+        self.contracts[contract_id] = contract
+        symbol = contract.get('underlying')
+        if symbol:
+            self.by_symbol.setdefault(symbol, set()).add(contract_id)
+        if contract.get('date_expiry'):
+            heapq.heappush(self.expiries, (int(contract['date_expiry']), contract_id))
+        self.exposure += float(contract.get('buy_price') or 0)
+        self.unrealized += float(contract.get('profit') or 0)
+    
+    def update(self, update: Dict) -> Optional[Dict]:
+        """Apply a proposal_open_contract update; the settled contract once it closes"""
+        if update.get('contract_id') is None:
+            return None  # Deriv sends an empty update when no contracts are open
+        contract_id = str(update['contract_id'])
+        contract = self.contracts.get(contract_id)
+        if contract is None:
+            if not contract_closed(update):
+                self.open(update)  # opened elsewhere or before this session
+            return None
+        
+        old_symbol = contract.get('underlying')
+        old_expiry = contract.get('date_expiry')
+        self.exposure -= float(contract.get('buy_price') or 0)
+        self.unrealized -= float(contract.get('profit') or 0)
+        contract.update(update)
+        
+        if contract_closed(contract):
+            self.remove(contract_id, old_symbol)
+            return contract
+        
+        symbol = contract.get('underlying')
+        if symbol != old_symbol:
+            self.unindex(contract_id, old_symbol)
+            if symbol:
+                self.by_symbol.setdefault(symbol, set()).add(contract_id)
+        if contract.get('date_expiry') and contract.get('date_expiry') != old_expiry:
+            heapq.heappush(self.expiries, (int(contract['date_expiry']), contract_id))
+        self.exposure += float(contract.get('buy_price') or 0)
+        self.unrealized += float(contract.get('profit') or 0)
+        return None
+    
+    def remove(self, contract_id: str, symbol: Optional[str]):
+        del self.contracts[contract_id]
+        self.unindex(contract_id, symbol)
+        if not self.contracts:
+            # Contracts are gone; drop float drift and stale expiry entries
+            self.exposure = self.unrealized = 0.0
+            self.expiries.clear()
+    
+    def unindex(self, contract_id: str, symbol: Optional[str]):
+        ids = self.by_symbol.get(symbol)
+        if ids is not None:
+            ids.discard(contract_id)
+            if not ids:
+                del self.by_symbol[symbol]
+    
+    def expiring(self, until: float) -> List[Dict]:
+        """Open contracts expiring at or before `until`, soonest first"""
+        if len(self.expiries) > 2 * len(self.contracts) + 64:
+            # Compact entries of settled or re-dated contracts
+            self.expiries = [e for e in self.expiries if self.current(e)]
+            heapq.heapify(self.expiries)
+        
+        if not self.expiries or self.expiries[0][0] > until:
+            return []
+        return [self.contracts[e[1]] for e in sorted(self.expiries) if e[0] <= until and self.current(e)]
+    
+    def current(self, entry: Tuple[int, str]) -> bool:
+        contract = self.contracts.get(entry[1])
+        return contract is not None and int(contract.get('date_expiry') or 0) == entry[0]
+
+# ===== DERIV API INTEGRATION =====
+
+class DerivAuthError(Exception):
+    """Deriv rejected the API token"""
+
+class DerivConnection:
+    """One Deriv WebSocket kept alive for as long as it is needed.
+    
+    Sends keepalive pings, reconnects with exponential backoff and replays
+    authorization and subscriptions after every reconnect.
+    """
+    
+    def __init__(self, manager: 'DerivConnectionManager', name: str, on_message,
+                 token: Optional[str] = None, on_close=None):
+        self.manager = manager
+        self.name = name
+        self.token = token
+        self.on_message = on_message  # async callable(data)
+        self.on_close = on_close      # callable(), run whenever the socket drops
+        self.subscriptions: List[dict] = []
+        self.ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+    
+    async def start(self, retry: bool = False) -> bool:
+        """Open the first connection; False if it cannot connect or authorize.
+        
+        With `retry`, a failed first attempt (other than a rejected token)
+        keeps reconnecting in the background instead of giving up.
+        """
+        try:
+            await self.open()
+        except Exception as e:
+            logger.error(f"Deriv connection {self.name} failed: {e}")
+            if not retry or isinstance(e, DerivAuthError):
+                self.closed = True
+                self.manager.connections.discard(self)
+                return False
+        
+        self.task = asyncio.create_task(self.run())
+        return self.ws is not None
+    
+    async def open(self):
+        ws = await self.manager.session().ws_connect(DERIV_WS_URL)
+        
+        try:
+            if self.token:
+                await ws.send_json({"authorize": self.token})
+                auth_response = await ws.receive_json(timeout=10.0)
+                if auth_response.get('error'):
+                    raise DerivAuthError(auth_response['error'])
+            
+            for payload in self.subscriptions:
+                await ws.send_json(payload)
+        except BaseException:
+            await ws.close()
+            raise
+        
+        self.ws = ws
+    
+    async def run(self):
+        """Read messages, reconnecting with backoff until closed"""
+        delay = DERIV_RECONNECT_MIN_DELAY
+        
+        try:
+            while not self.closed:
+                if self.ws is None:
+                    try:
+                        await self.open()
+                        logger.info(f"🔄 Deriv connection {self.name} restored")
+                        delay = DERIV_RECONNECT_MIN_DELAY
+                    except DerivAuthError as e:
+                        logger.error(f"Deriv connection {self.name} lost authorization: {e}")
+                        break
+                    except Exception as e:
+                        logger.warning(f"Deriv reconnect {self.name} failed, retrying in {delay:.0f}s: {e}")
+                        await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                        delay = min(delay * 2, DERIV_RECONNECT_MAX_DELAY)
+                        continue
+                
+                keepalive = asyncio.create_task(self.keepalive(self.ws))
+                try:
+                    async for msg in self.ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            await self.on_message(json.loads(msg.data))
+                except Exception as e:
+                    logger.error(f"Deriv connection {self.name} dropped: {e}")
+                finally:
+                    keepalive.cancel()
+                    await self.ws.close()
+                    self.ws = None
+                    if self.on_close:
+                        self.on_close()
+                
+                if not self.closed:
+                    await asyncio.sleep(DERIV_RECONNECT_MIN_DELAY)
+        finally:
+            self.closed = True
+            self.manager.connections.discard(self)
+    
+    async def keepalive(self, ws: aiohttp.ClientWebSocketResponse):
+        """Deriv drops idle sockets after two minutes"""
+        while not ws.closed:
+            await asyncio.sleep(DERIV_PING_INTERVAL)
+            await ws.send_json({"ping": 1})
+    
+    async def send(self, payload: dict):
+        if self.ws is None or self.ws.closed:
+            raise ConnectionError(f'Deriv connection {self.name} is not open')
+        await self.ws.send_json(payload)
+    
+    async def subscribe(self, payload: dict):
+        """Send a subscription now and replay it after every reconnect"""
+        if payload not in self.subscriptions:
+            self.subscriptions.append(payload)
+        if self.ws is not None:
+            await self.send(payload)
+    
+    def stop(self):
+        self.closed = True
+        if self.task:
+            self.task.cancel()
+        self.manager.connections.discard(self)
+    
+    async def close(self):
+        self.stop()
+        if self.task:
+            await asyncio.gather(self.task, return_exceptions=True)
+        elif self.ws is not None:
+            await self.ws.close()
+
+class DerivConnectionManager:
+    """Owns the shared aiohttp session and every live Deriv connection"""
+    
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.connections: Set[DerivConnection] = set()
+    
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+    
+    def open(self, name: str, on_message, token: Optional[str] = None,
+             on_close=None) -> DerivConnection:
+        connection = DerivConnection(self, name, on_message, token=token, on_close=on_close)
+        self.connections.add(connection)
+        return connection
+    
+    async def shutdown(self):
+        """Close every connection and the shared session"""
+        await asyncio.gather(
+            *(connection.close() for connection in list(self.connections)),
+            return_exceptions=True
+        )
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+deriv_manager = DerivConnectionManager()
+
+DERIV_PUBLIC = ''  # connections key of the shared unauthenticated socket; never a user id
+
+class DerivAPI:
+    """Complete Deriv API integration"""
+    
+    def __init__(self):
+        self.connections: Dict[str, DerivConnection] = {}
+        self.req_ids = itertools.count(1)
+        # req_id -> (user_id, future resolved by handle_message)
+        self.pending: Dict[int, Tuple[str, asyncio.Future]] = {}
+        self.public_lock = asyncio.Lock()
+        
+    async def connect_public(self):
+        """Open the shared unauthenticated connection used for pricing"""
+        async with self.public_lock:
+            connection = self.connections.get(DERIV_PUBLIC)
+            if connection is not None and not connection.closed:
+                return
+            
+            connection = deriv_manager.open(
+                "public",
+                on_message=lambda data: self.handle_message(DERIV_PUBLIC, data),
+                on_close=self.public_closed
+            )
+            self.connections[DERIV_PUBLIC] = connection
+            await connection.start(retry=True)
+    
+    def public_closed(self):
+        self.fail_pending(DERIV_PUBLIC, ConnectionError('Deriv connection closed'))
+        proposal_cache.on_disconnect()
+    
+    async def connect(self, user_id: str, api_token: str) -> bool:
+        """Connect to Deriv WebSocket with user token"""
+        await self.disconnect(user_id)
+        
+        connection = deriv_manager.open(
+            f"user:{user_id}",
+            on_message=lambda data: self.handle_message(user_id, data),
+            token=api_token,
+            on_close=lambda: self.user_closed(user_id)
+        )
+        
+        # Balance and open contracts are replayed after every reconnect
+        connection.subscriptions = [
+            {"balance": 1, "subscribe": 1},
+            {"proposal_open_contract": 1, "subscribe": 1},
+        ]
+        
+        if not await connection.start():
+            return False
+        
+        self.connections[user_id] = connection
+        logger.info(f"✅ User {user_id} connected to Deriv")
+        return True
+    
+    async def disconnect(self, user_id: str):
+        """Close a user's Deriv connection, if any"""
+        connection = self.connections.pop(user_id, None)
+        if connection:
+            await connection.close()
+        armed_proposals.disarm(user_id)
+    
+    def user_closed(self, user_id: str):
+        self.fail_pending(user_id, ConnectionError('Deriv connection closed'))
+        armed_proposals.disarm(user_id)
+    
+    async def request(self, user_id: str, payload: dict, timeout: float = 5.0) -> dict:
+        """Send a request tagged with a req_id and wait for its response.
+        
+        Responses are routed back by handle_message, so any number of
+        requests can be in flight on one connection.
+        """
+        connection = self.connections.get(user_id)
+        if connection is None or connection.closed:
+            raise ConnectionError('Not connected to Deriv')
+        
+        req_id = next(self.req_ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[req_id] = (user_id, future)
+        
+        try:
+            sent_at = time.perf_counter()
+            await connection.send({**payload, 'req_id': req_id})
+            response = await asyncio.wait_for(future, timeout=timeout)
+            
+            msg_type = next(iter(payload))  # Deriv calls are named by their first key
+            histogram = deriv_rtt_ms.get(msg_type)
+            if histogram is None:
+                histogram = deriv_rtt_ms[msg_type] = Histogram()
+            histogram.observe((time.perf_counter() - sent_at) * 1000)
+            return response
+        finally:
+            self.pending.pop(req_id, None)
+    
+    def fail_pending(self, user_id: str, error: Exception):
+        """Fail every in-flight request of a user"""
+        for req_id, (owner, future) in list(self.pending.items()):
+            if owner == user_id and not future.done():
+                future.set_exception(error)
+    
+    async def handle_message(self, user_id: str, data: dict):
+        """Handle Deriv WebSocket messages"""
+        msg_type = data.get('msg_type')
+        
+        # Resolve the request waiting on this response, then keep processing
+        # so buys, balances, etc. still update state
+        pending = self.pending.get(data.get('req_id'))
+        if pending and not pending[1].done():
+            pending[1].set_result(data)
+        
+        if msg_type == 'balance':
+            # Update user balance
+            if user_id in user_sessions:
+                balance_data = data.get('balance', {})
+                user_sessions[user_id].balance = balance_data.get('balance', 0)
+                user_sessions[user_id].currency = balance_data.get('currency', 'USD')
+        
+        elif msg_type == 'proposal':
+            # Streamed updates of subscribed proposals
+            if user_id == DERIV_PUBLIC:
+                proposal_cache.on_update(data)
+            else:
+                armed_proposals.on_update(user_id, data)
+        
+        elif msg_type == 'buy':
+            # Contract purchased
+            contract = data.get('buy', {})
+            params = data.get('echo_req', {}).get('parameters', {})
+            if user_id in user_sessions and contract.get('contract_id') is not None:
+                user_sessions[user_id].active_contracts.open({
+                    'underlying': params.get('symbol'),
+                    'contract_type': params.get('contract_type'),
+                    **contract
+                })
+                
+                # The account-wide subscription only covers contracts open
+                # when it was made, so follow each new one explicitly
+                connection = self.connections.get(user_id)
+                if connection:
+                    await connection.send({
+                        "proposal_open_contract": 1,
+                        "contract_id": contract['contract_id'],
+                        "subscribe": 1
+                    })
+        
+        elif msg_type == 'proposal_open_contract':
+            # Contract update; empty when the account has no open contracts
+            contract = data.get('proposal_open_contract') or {}
+            if contract.get('contract_id') is not None:
+                await self.update_contract(user_id, contract)
+    
+    async def buy_contract(self, user_id: str, params: dict) -> dict:
+        """Buy contract on Deriv"""
+        if user_id not in self.connections:
+            return {'error': 'Not connected to Deriv'}
+        
+        try:
+            # Send buy request
+            response = await self.request(user_id, {
+                "buy": 1,
+                "price": params['stake'],
+                "parameters": {
+                    "contract_type": params['contract_type'],
+                    "symbol": params['symbol'],
+                    "duration": params.get('duration', 5),
+                    "duration_unit": params.get('duration_unit', 't'),
+                    "basis": "stake",
+                    "amount": params['stake'],
+                    **({"barrier": params['barrier']} if params.get('barrier') is not None else {})
+                }
+            })
+            
+            if response.get('error'):
+                return {'success': False, 'error': response['error']}
+            
+            return {'success': True, 'contract': response.get('buy') or {}}
+            
+        except asyncio.TimeoutError:
+            logger.error(f"Buy timed out for {user_id}")
+            return {'success': False, 'error': 'Timed out waiting for Deriv'}
+        except Exception as e:
+            logger.error(f"Buy error: {e}")
+            return {'success': False, 'error': str(e)}
+    
+    async def buy_proposal(self, user_id: str, proposal: Dict, params: dict) -> dict:
+        """Buy a pre-armed proposal by id; `params` describe the contract"""
+        if user_id not in self.connections:
+            return {'error': 'Not connected to Deriv'}
+        
+        try:
+            response = await self.request(user_id, {"buy": proposal['proposal_id'], "price": proposal['ask_price']})
+            
+            if response.get('error'):
+                return {'success': False, 'error': response['error']}
+            
+            contract = response.get('buy') or {}
+            
+            # The buy echo carries no parameters, so index the contract here
+            session = user_sessions.get(user_id)
+            if session and contract.get('contract_id') is not None:
+                session.active_contracts.update({
+                    'contract_id': contract['contract_id'],
+                    'underlying': params['symbol'],
+                    'contract_type': params['contract_type']
+                })
+            return {'success': True, 'contract': contract}
+            
+        except asyncio.TimeoutError:
+            logger.error(f"Proposal buy timed out for {user_id}")
+            return {'success': False, 'error': 'Timed out waiting for Deriv'}
+        except Exception as e:
+            logger.error(f"Proposal buy error: {e}")
+            return {'success': False, 'error': str(e)}
+    
+    async def sell_contract(self, user_id: str, contract_id: str) -> dict:
+        """Sell (close) contract early"""
+        if user_id not in self.connections:
+            return {'error': 'Not connected'}
+        
+        try:
+            response = await self.request(user_id, {
+                "sell": contract_id,
+                "price": 0  # Sell at current price
+            })
+            
+            if response.get('error'):
+                return {'success': False, 'error': response['error']}
+            
+            return {'success': True, 'result': response}
+            
+        except asyncio.TimeoutError:
+            return {'success': False, 'error': 'Timed out waiting for Deriv'}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    async def update_contract(self, user_id: str, contract: dict):
+        """Update contract status"""
+        if user_id not in user_sessions:
+            return
+        
+        # Closed contracts leave the book, so a repeated final update is ignored
+        contract = user_sessions[user_id].active_contracts.update(contract)
+        if contract is None:
+            return
+        
+        capital_protector.settled(user_id, contract)
+        trade_store.record(user_id, contract)
+        
+        bot_scheduler.settle_live(contract)
+        
+        # Notify user
+        notify_user(user_id, {
+            'type': 'contract_closed',
+            'contract': contract
+        })
+
+deriv_api = DerivAPI()
+
+# ===== PROPOSAL PRICING =====
+
+PROPOSAL_CACHE_TTL = float(os.getenv("PROPOSAL_CACHE_TTL", "2.0"))
+PROPOSAL_HOT_HITS = int(os.getenv("PROPOSAL_HOT_HITS", "5"))  # lookups within PROPOSAL_HOT_WINDOW
+PROPOSAL_HOT_WINDOW = float(os.getenv("PROPOSAL_HOT_WINDOW", "10"))
+PROPOSAL_HOT_IDLE = float(os.getenv("PROPOSAL_HOT_IDLE", "60"))
+PROPOSAL_MAX_SUBSCRIPTIONS = int(os.getenv("PROPOSAL_MAX_SUBSCRIPTIONS", "50"))
+
+class ProposalError(Exception):
+    """Deriv rejected a proposal"""
+
+class ProposalCache:
+    """Deriv proposal prices, cached per contract combination.
+    
+    A quote is reused for PROPOSAL_CACHE_TTL seconds and concurrent
+    lookups of the same combination share one upstream request. A
+    combination looked up PROPOSAL_HOT_HITS times within
+    PROPOSAL_HOT_WINDOW seconds is subscribed, so Deriv streams fresh
+    prices into the cache until it has been idle for PROPOSAL_HOT_IDLE.
+    """
+    
+    def __init__(self):
+        self.entries: Dict[Tuple, Dict] = {}
+        self.inflight: Dict[Tuple, asyncio.Task] = {}
+        self.by_subscription: Dict[str, Tuple] = {}
+        self.swept = 0.0
+    
+    @staticmethod
+    def key(params: dict, currency: str = 'USD') -> Tuple:
+        barrier = params.get('barrier')
+        return (
+            params['symbol'],
+            params['contract_type'],
+            int(params.get('duration', 5)),
+            params.get('duration_unit', 't'),
+            round(float(params.get('stake', 1.0)), 2),
+            None if barrier is None else str(barrier),
+            currency
+        )
+    
+    @staticmethod
+    def payload(key: Tuple, subscribe: bool = False) -> dict:
+        symbol, contract_type, duration, duration_unit, stake, barrier, currency = key
+        payload = {
+            "proposal": 1,
+            "amount": stake,
+            "basis": "stake",
+            "contract_type": contract_type,
+            "currency": currency,
+            "duration": duration,
+            "duration_unit": duration_unit,
+            "symbol": symbol
+        }
+        if barrier is not None:
+            payload["barrier"] = barrier
+        if subscribe:
+            payload["subscribe"] = 1
+        return payload
+    
+    @staticmethod
+    def quote(proposal: dict) -> Dict:
+        return {
+            'proposal_id': proposal.get('id'),
+            'ask_price': float(proposal.get('ask_price', 0)),
+            'payout': float(proposal.get('payout', 0)),
+            'spot': proposal.get('spot'),
+            'longcode': proposal.get('longcode')
+        }
+    
+    def fresh(self, key: Tuple) -> Optional[Dict]:
+        """Cached entry still valid for `key`, counting the lookup"""
+        now = time.monotonic()
+        if now - self.swept > 1.0:
+            self.sweep(now)
+        
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        
+        entry['used'] = now
+        if now - entry['since'] > PROPOSAL_HOT_WINDOW:
+            entry['since'] = now
+            entry['hits'] = 0
+        entry['hits'] += 1
+        if (entry['subscription'] is None and not entry['subscribing'] and entry['hits'] >= PROPOSAL_HOT_HITS
+                and len(self.by_subscription) < PROPOSAL_MAX_SUBSCRIPTIONS):
+            entry['subscribing'] = True
+            asyncio.create_task(self.subscribe(key))
+        
+        if entry['subscription'] is not None or now - entry['fetched'] < PROPOSAL_CACHE_TTL:
+            return entry
+        return None
+    
+    async def get(self, params: dict, currency: str = 'USD') -> Dict:
+        """Quote for a contract: {'proposal_id', 'ask_price', 'payout', ...}"""
+        key = self.key(params, currency)
+        entry = self.fresh(key)
+        if entry is not None:
+            return {**entry['quote'], 'cached': True}
+        
+        task = self.inflight.get(key)
+        if task is None:
+            task = self.inflight[key] = asyncio.create_task(self.fetch(key))
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return {**await asyncio.shield(task), 'cached': False}
+    
+    def peek(self, params: dict, currency: str = 'USD', prefetch: bool = False) -> Optional[Dict]:
+        """Cached quote without waiting; optionally fetch it in the background"""
+        key = self.key(params, currency)
+        entry = self.fresh(key)
+        if entry is not None:
+            return entry['quote']
+        if prefetch and key not in self.inflight:
+            task = self.inflight[key] = asyncio.create_task(self.fetch(key))
+            task.add_done_callback(lambda t: (self.inflight.pop(key, None), t.cancelled() or t.exception()))
+        return None
+    
+    async def fetch(self, key: Tuple, subscribe: bool = False) -> Dict:
+        await deriv_api.connect_public()
+        response = await deriv_api.request(DERIV_PUBLIC, self.payload(key, subscribe))
+        if response.get('error'):
+            raise ProposalError(response['error'].get('message', 'Proposal rejected'))
+        
+        quote = self.quote(response.get('proposal', {}))
+        now = time.monotonic()
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = {
+                'quote': quote, 'fetched': now, 'used': now, 'since': now, 'hits': 0,
+                'subscription': None, 'subscribing': False
+            }
+        entry['quote'] = quote
+        entry['fetched'] = now
+        
+        subscription = response.get('subscription', {}).get('id')
+        if subscription:
+            entry['subscription'] = subscription
+            self.by_subscription[subscription] = key
+        return quote
+    
+    async def subscribe(self, key: Tuple):
+        try:
+            await self.fetch(key, subscribe=True)
+        except Exception as e:
+            logger.warning(f"Proposal subscription failed for {key}: {e}")
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry['subscribing'] = False
+    
+    def on_update(self, data: dict):
+        key = self.by_subscription.get(data.get('subscription', {}).get('id'))
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        if data.get('error'):
+            # e.g. market closed: fall back to plain cached lookups
+            self.by_subscription.pop(entry['subscription'], None)
+            entry['subscription'] = None
+            entry['fetched'] = 0.0
+            return
+        entry['quote'] = self.quote(data.get('proposal', {}))
+        entry['fetched'] = time.monotonic()
+    
+    def sweep(self, now: float):
+        """Forget idle subscriptions and entries"""
+        self.swept = now
+        for key, entry in list(self.entries.items()):
+            if now - entry['used'] < PROPOSAL_HOT_IDLE:
+                continue
+            del self.entries[key]
+            subscription = entry['subscription']
+            if subscription is not None:
+                self.by_subscription.pop(subscription, None)
+                connection = deriv_api.connections.get(DERIV_PUBLIC)
+                if connection is not None and connection.ws is not None:
+                    asyncio.create_task(connection.send({"forget": subscription}))
+    
+    def on_disconnect(self):
+        """Subscriptions die with the socket; quotes must be fetched again"""
+        self.by_subscription.clear()
+        for entry in self.entries.values():
+            entry['subscription'] = None
+            entry['fetched'] = 0.0
+
+proposal_cache = ProposalCache()
+
+FAST_BUY_MAX_ARMED = int(os.getenv("FAST_BUY_MAX_ARMED", "8"))  # armed combinations per user
+FAST_BUY_IDLE = float(os.getenv("FAST_BUY_IDLE", "120"))
+
+class ArmedProposals:
+    """Live proposal subscriptions on users' own connections, so bots with
+    `fast_buy` can buy by proposal id without Deriv pricing the order.
+    
+    A combination is armed after its first order and re-armed after every
+    buy, since a proposal id can only be bought once; the least recently
+    used combinations beyond FAST_BUY_MAX_ARMED, or idle for
+    FAST_BUY_IDLE, are forgotten.
+    """
+    
+    def __init__(self):
+        self.armed: Dict[str, Dict[Tuple, Dict]] = {}  # user_id -> key -> entry, least recently used first
+        self.by_subscription: Dict[str, Tuple[str, Tuple]] = {}
+    
+    def take(self, user_id: str, key: Tuple) -> Optional[Dict]:
+        """Current proposal for key, consumed; None if not armed yet"""
+        entry = self.armed.get(user_id, {}).get(key)
+        if entry is None or entry['proposal_id'] is None:
+            return None
+        proposal = {'proposal_id': entry['proposal_id'], 'ask_price': entry['ask_price']}
+        entry['proposal_id'] = None
+        return proposal
+    
+    def arm(self, user_id: str, key: Tuple):
+        """(Re-)subscribe to key's proposal in the background"""
+        armed = self.armed.setdefault(user_id, {})
+        entry = armed.pop(key, None)
+        if entry is None:
+            entry = {'proposal_id': None, 'ask_price': 0.0, 'subscription': None, 'arming': False}
+        entry['used'] = time.monotonic()
+        armed[key] = entry
+        
+        now = entry['used']
+        for old_key in list(armed):
+            if len(armed) <= FAST_BUY_MAX_ARMED and now - armed[old_key]['used'] < FAST_BUY_IDLE:
+                break
+            self.forget(user_id, armed.pop(old_key))
+        
+        if not entry['arming']:
+            entry['arming'] = True
+            asyncio.create_task(self.subscribe(user_id, key, entry))
+    
+    async def subscribe(self, user_id: str, key: Tuple, entry: Dict):
+        self.forget(user_id, entry)  # the previous stream ends once its proposal is bought
+        try:
+            response = await deriv_api.request(user_id, ProposalCache.payload(key, subscribe=True))
+            if response.get('error'):
+                raise ProposalError(response['error'].get('message', 'Proposal rejected'))
+            
+            quote = ProposalCache.quote(response.get('proposal', {}))
+            entry['proposal_id'] = quote['proposal_id']
+            entry['ask_price'] = quote['ask_price']
+            subscription = response.get('subscription', {}).get('id')
+            if subscription and self.armed.get(user_id, {}).get(key) is entry:
+                entry['subscription'] = subscription
+                self.by_subscription[subscription] = (user_id, key)
+        except Exception as e:
+            logger.warning(f"Arming proposal {key} for {user_id} failed: {e}")
+        entry['arming'] = False
+    
+    def on_update(self, user_id: str, data: dict):
+        target = self.by_subscription.get(data.get('subscription', {}).get('id'))
+        if target is None or target[0] != user_id:
+            return
+        entry = self.armed.get(user_id, {}).get(target[1])
+        if entry is None:
+            return
+        if data.get('error'):
+            self.forget(user_id, entry)
+            return
+        quote = ProposalCache.quote(data.get('proposal', {}))
+        entry['proposal_id'] = quote['proposal_id']
+        entry['ask_price'] = quote['ask_price']
+    
+    def forget(self, user_id: str, entry: Dict):
+        subscription = entry['subscription']
+        entry['subscription'] = None
+        entry['proposal_id'] = None
+        if subscription is None:
+            return
+        self.by_subscription.pop(subscription, None)
+        connection = deriv_api.connections.get(user_id)
+        if connection is not None and connection.ws is not None:
+            asyncio.create_task(connection.send({"forget": subscription}))
+    
+    def disarm(self, user_id: str):
+        """Drop a user's proposals; their subscriptions died with the socket"""
+        for entry in self.armed.pop(user_id, {}).values():
+            if entry['subscription'] is not None:
+                self.by_subscription.pop(entry['subscription'], None)
+
+armed_proposals = ArmedProposals()
+
+# Signal (order planned) to buy acknowledged, by buy path
+buy_latency: Dict[str, Histogram] = {path: Histogram() for path in ('standard', 'fast', 'fallback')}
+
+# ===== CLIENT CONNECTIONS =====
+
+WS_FLUSH_INTERVAL = float(os.getenv("WS_FLUSH_INTERVAL_MS", "50")) / 1000
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "drop")  # drop | disconnect
+
+# json: orjson text frames; msgpack: binary msgpack frames;
+# binary: ticks as packed TICK_STRUCT frames, everything else as json
+WS_ENCODINGS = ('json', 'binary') + (('msgpack',) if msgpack else ())
+
+TICK_FRAME = 0x01
+TICK_STRUCT = struct.Struct('<qdB')  # epoch, quote, pip_size
+
+def pack_ticks(messages: List[dict]) -> bytes:
+    """Binary tick frame: u8 TICK_FRAME, u16 count, then per tick
+    u8 symbol length, symbol (ascii), i64 epoch, f64 quote, u8 pip_size
+    (all little-endian)"""
+    parts = [struct.pack('<BH', TICK_FRAME, len(messages))]
+    for message in messages:
+        tick = message['data']
+        symbol = tick['symbol'].encode()
+        parts.append(bytes((len(symbol),)))
+        parts.append(symbol)
+        parts.append(TICK_STRUCT.pack(int(tick.get('epoch', 0)), float(tick['quote']), int(tick.get('pip_size') or 0)))
+    return b''.join(parts)
+
+class ClientConnection:
+    """Browser WebSocket behind a bounded, coalescing send queue.
+    
+    Producers never await the socket: a tick replaces any unsent tick for
+    the same symbol, other messages are queued up to WS_SEND_QUEUE_SIZE,
+    and a sender task flushes everything pending as one frame per
+    WS_FLUSH_INTERVAL. A full queue drops the oldest message or
+    disconnects the client (WS_SLOW_CLIENT_POLICY); a send that blocks for
+    WS_SEND_TIMEOUT always disconnects.
+    """
+    
+    def __init__(self, websocket: WebSocket, user_id: str, encoding: str = 'json'):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.encoding = encoding
+        self.ticks: Dict[str, dict] = {}  # latest unsent tick per symbol
+        self.channels: Dict[str, Dict] = {}  # subscribed channel id -> last pushed value
+        self.updates: Dict[str, dict] = {}  # unsent changes per channel id
+        self.queue: deque = deque()
+        self.wakeup = asyncio.Event()
+        self.dropped = 0
+        self.closing = False
+        self.task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        self.task = asyncio.create_task(self.sender())
+    
+    def send_tick(self, symbol: str, message: dict):
+        if self.closing:
+            return
+        if symbol in self.ticks:
+            self.dropped += 1
+        self.ticks[symbol] = message
+        self.wakeup.set()
+    
+    def send_update(self, channel_id: str, changes: dict):
+        """Queue changed channel fields, merged into any unsent update"""
+        if self.closing:
+            return
+        pending = self.updates.get(channel_id)
+        if pending is None:
+            self.updates[channel_id] = changes
+        else:
+            self.dropped += 1
+            pending.update(changes)
+        self.wakeup.set()
+    
+    def send(self, message: dict):
+        if self.closing:
+            return
+        if len(self.queue) >= WS_SEND_QUEUE_SIZE:
+            if WS_SLOW_CLIENT_POLICY == 'disconnect':
+                logger.warning(f"Disconnecting slow client {self.user_id}: send queue full")
+                self.close()
+                return
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(message)
+        self.wakeup.set()
+    
+    def close(self):
+        self.closing = True
+        self.wakeup.set()
+    
+    async def sender(self):
+        try:
+            while True:
+                await self.wakeup.wait()
+                if WS_FLUSH_INTERVAL > 0 and not self.closing:
+                    await asyncio.sleep(WS_FLUSH_INTERVAL)  # let a batch build up
+                self.wakeup.clear()
+                if self.closing:  # checked after clear() so a close during the sleep is not lost
+                    break
+                
+                messages = list(self.queue)
+                ticks = list(self.ticks.values())
+                if self.encoding != 'binary':
+                    messages.extend(ticks)
+                messages.extend(
+                    {'type': 'channel_update', 'id': channel_id, 'changes': changes}
+                    for channel_id, changes in self.updates.items()
+                )
+                self.queue.clear()
+                self.ticks.clear()
+                self.updates.clear()
+                if messages:
+                    frame = messages[0] if len(messages) == 1 else {'type': 'batch', 'messages': messages}
+                    await self.write(frame)
+                if ticks and self.encoding == 'binary':
+                    await asyncio.wait_for(self.websocket.send_bytes(pack_ticks(ticks)), timeout=WS_SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Disconnecting slow client {self.user_id}: send timed out")
+        except Exception as e:
+            logger.info(f"Client {self.user_id} send failed: {e}")
+        
+        self.closing = True
+        disconnect_client(self)
+        try:
+            await self.websocket.close(code=1013)  # try again later
+        except Exception:
+            pass
+    
+    async def write(self, frame: dict):
+        if self.encoding == 'msgpack':
+            send = self.websocket.send_bytes(msgpack.packb(frame, use_bin_type=True))
+        else:
+            send = self.websocket.send_text(orjson.dumps(frame, option=orjson.OPT_NON_STR_KEYS).decode())
+        await asyncio.wait_for(send, timeout=WS_SEND_TIMEOUT)
+
+def notify_user(user_id: str, message: dict):
+    """Queue a message to every open socket of a user"""
+    for client in client_connections.get(user_id, ()):
+        client.send(message)
+
+def disconnect_client(client: ClientConnection):
+    """Forget a client everywhere it is registered"""
+    clients = client_connections.get(client.user_id)
+    if clients is not None:
+        clients.discard(client)
+        if not clients:
+            del client_connections[client.user_id]
+    market_hub.unsubscribe_all(client)
+    channel_hub.unsubscribe_all(client)
+
+# ===== MARKET DATA HUB =====
+
+class MarketDataHub:
+    """Process-wide market data: one public Deriv tick stream per symbol,
+    analytics updated once per tick and fanned out to every subscribed client"""
+    
+    def __init__(self):
+        self.streams: Dict[str, DerivConnection] = {}
+        self.subscribers: Dict[str, Set[ClientConnection]] = {}
+        self.retained: Counter = Counter()  # server-side users of a stream, e.g. bots
+    
+    async def subscribe(self, symbol: str, client: ClientConnection):
+        """Add client to symbol fan-out, starting the upstream stream if needed"""
+        self.subscribers.setdefault(symbol, set()).add(client)
+        await self.ensure_stream(symbol)
+    
+    def unsubscribe(self, symbol: str, client: ClientConnection):
+        """Remove client from symbol fan-out, stopping the stream when unused"""
+        clients = self.subscribers.get(symbol)
+        if clients is None:
+            return
+        
+        clients.discard(client)
+        if not clients:
+            del self.subscribers[symbol]
+            self.release_stream(symbol)
+    
+    async def retain(self, symbol: str):
+        """Keep a symbol streaming without a client attached"""
+        self.retained[symbol] += 1
+        await self.ensure_stream(symbol)
+    
+    def release(self, symbol: str):
+        self.retained[symbol] -= 1
+        if self.retained[symbol] <= 0:
+            del self.retained[symbol]
+        self.release_stream(symbol)
+    
+    async def ensure_stream(self, symbol: str):
+        symbol_registry.acquire(symbol)
+        if symbol in self.streams:
+            return
+        
+        stream = deriv_manager.open(f"ticks:{symbol}", on_message=self.handle_message)
+        stream.subscriptions = [{"ticks": symbol, "subscribe": 1}]
+        self.streams[symbol] = stream
+        
+        # Keeps retrying in the background while subscribers are waiting
+        await stream.start(retry=True)
+        logger.info(f"📡 Market data stream started for {symbol}")
+    
+    def release_stream(self, symbol: str):
+        if symbol in self.subscribers or symbol in self.retained:
+            return
+        
+        stream = self.streams.pop(symbol, None)
+        if stream:
+            stream.stop()
+            logger.info(f"📴 Market data stream stopped for {symbol}")
+        symbol_registry.release(symbol)
+    
+    def unsubscribe_all(self, client: ClientConnection):
+        """Remove client from every symbol it subscribed to"""
+        for symbol in [s for s, clients in self.subscribers.items() if client in clients]:
+            self.unsubscribe(symbol, client)
+    
+    async def handle_message(self, data: dict):
+        if data.get('error'):
+            logger.error(f"Tick stream error: {data['error']}")
+        elif data.get('msg_type') == 'tick':
+            await self.on_tick(data.get('tick', {}))
+    
+    async def on_tick(self, tick_data: dict):
+        """Ingest a tick once, then broadcast it to subscribers"""
+        symbol = tick_data.get('symbol')
+        quote = tick_data.get('quote')
+        
+        if not symbol or quote is None:
+            return
+        
+        digit = last_digit(quote, tick_data.get('pip_size'))
+        tick_store.append(symbol, int(tick_data.get('epoch', time.time())), quote, digit)
+        ticks_ingested[symbol] += 1
+        
+        analytics = digit_analytics.get(symbol)
+        if analytics is not None:
+            started = time.perf_counter_ns()
+            analytics.add(digit, detect=False)
+            updated = time.perf_counter_ns()
+            analytics.detect_patterns()
+            analytics_update_us.observe((updated - started) / 1000)
+            detect_patterns_us.observe((time.perf_counter_ns() - updated) / 1000)
+        
+        bot_scheduler.on_tick(symbol)
+        if analytics is not None:
+            signal_tracker.on_tick(analytics)
+        channel_hub.on_tick(symbol)
+        
+        message = {'type': 'tick', 'data': tick_data}
+        for client in self.subscribers.get(symbol, ()):
+            client.send_tick(symbol, message)
+
+market_hub = MarketDataHub()
+
+# ===== PUSH CHANNELS =====
+
+# channel -> (parameter, type, default); `...` marks a required parameter,
+# and the first parameter is the symbol or bot the channel is fed by
+CHANNELS = {
+    'digits': (('symbol', str, ...), ('window', str, None)),
+    'heatmap': (('symbol', str, ...),),
+    'probability': (
+        ('symbol', str, ...), ('contract_type', str, ...), ('window', int, 100),
+        ('barrier', int, None), ('model', str, 'frequency'), ('order', int, None)
+    ),
+    'smart_signal': (('symbol', str, ...), ('window', int, None)),
+    'bot_stats': (('bot_id', str, ...),),
+}
+
+class ChannelHub:
+    """Subscribable analytics and bot channels pushed over client sockets.
+    
+    A subscriber gets the full value once, then only the top-level fields
+    that changed. Symbol channels are re-evaluated on each tick through the
+    signal cache, so a channel costs one computation per tick however many
+    clients follow it; bot channels are re-evaluated when the bot logs.
+    """
+    
+    def __init__(self):
+        self.subscribers: Dict[str, Set[ClientConnection]] = {}  # channel id -> clients
+        self.keys: Dict[str, Tuple] = {}  # channel id -> (channel, *params)
+        self.by_source: Dict[str, Set[str]] = {}  # symbol or bot_id -> channel ids
+    
+    @staticmethod
+    def parse(message: dict) -> Tuple:
+        """(channel, *params) from a subscribe message; raises ValueError"""
+        channel = message.get('channel')
+        if channel not in CHANNELS:
+            raise ValueError(f'Unknown channel: {channel}')
+        
+        key = [channel]
+        for name, kind, default in CHANNELS[channel]:
+            value = message.get(name, default)
+            if value is ...:
+                raise ValueError(f'{channel} requires {name}')
+            try:
+                key.append(None if value is None else kind(value))
+            except (TypeError, ValueError):
+                raise ValueError(f'Invalid {name}: {value}')
+        return tuple(key)
+    
+    def value(self, key: Tuple) -> Optional[Dict]:
+        channel, source, *params = key
+        if channel == 'bot_stats':
+            bot = active_bots.get(source)
+            return compute_bot_stats(bot) if bot else None
+        
+        analytics = digit_analytics.get(source)
+        if analytics is None:
+            return None
+        compute = {
+            'digits': compute_digits,
+            'heatmap': compute_heatmap,
+            'probability': compute_probability,
+            'smart_signal': compute_smart_signal,
+        }[channel]
+        return cached_signal(analytics, (channel, *params), lambda: compute(analytics, *params))
+    
+    async def subscribe(self, client: ClientConnection, key: Tuple) -> str:
+        channel, source = key[:2]
+        channel_id = ':'.join('' if p is None else str(p) for p in key)
+        
+        if channel_id not in self.subscribers:
+            if channel == 'bot_stats' and source not in active_bots:
+                raise ValueError(f'Bot not found: {source}')
+            if channel != 'bot_stats' and not symbol_registry.valid(source):
+                raise ValueError(f'Invalid symbol: {source}')
+            
+            self.subscribers[channel_id] = set()
+            self.keys[channel_id] = key
+            self.by_source.setdefault(source, set()).add(channel_id)
+            if channel != 'bot_stats':
+                await market_hub.retain(source)
+        
+        value = self.value(key)
+        if value is None:
+            # Bot deleted meanwhile
+            self.unsubscribe(client, channel_id)
+            raise ValueError(f'{channel}: {source} not found')
+        
+        self.subscribers[channel_id].add(client)
+        client.channels[channel_id] = value
+        client.send({'type': 'channel', 'id': channel_id, 'channel': key[0], 'data': value})
+        return channel_id
+    
+    def unsubscribe(self, client: ClientConnection, channel_id: str):
+        client.channels.pop(channel_id, None)
+        client.updates.pop(channel_id, None)
+        clients = self.subscribers.get(channel_id)
+        if clients is None:
+            return
+        
+        clients.discard(client)
+        if not clients:
+            del self.subscribers[channel_id]
+            channel, source = self.keys.pop(channel_id)[:2]
+            ids = self.by_source[source]
+            ids.discard(channel_id)
+            if not ids:
+                del self.by_source[source]
+            if channel != 'bot_stats':
+                market_hub.release(source)
+    
+    def unsubscribe_all(self, client: ClientConnection):
+        for channel_id in list(client.channels):
+            self.unsubscribe(client, channel_id)
+    
+    def publish(self, source: str):
+        """Push changed fields of every channel fed by a symbol or bot"""
+        for channel_id in self.by_source.get(source, ()):
+            value = self.value(self.keys[channel_id])
+            if value is None:
+                continue
+            for client in self.subscribers[channel_id]:
+                last = client.channels[channel_id]
+                changes = {k: v for k, v in value.items() if last.get(k) != v}
+                if changes:
+                    client.channels[channel_id] = value
+                    client.send_update(channel_id, changes)
+    
+    def on_tick(self, symbol: str):
+        if symbol in self.by_source:
+            self.publish(symbol)
+    
+    def on_bot(self, bot: TradingBot):
+        if bot.bot_id in self.by_source:
+            self.publish(bot.bot_id)
+
+channel_hub = ChannelHub()
+
+# ===== MAIN ENDPOINTS =====
+
+@app.get("/")
+async def root():
+    return {
+        "name": "ROSTOVA 3.0 - THE ULTIMATE",
+        "version": "3.0.0",
+        "status": "operational",
+        "features": [
+            "Real Deriv API Integration",
+            "Live Balance & Contracts",
+            "Full Trade Panel",
+            "Analytics Engine (Digit Frequency, Heatmaps)",
+            "DBot-Level Automation",
+            "Strategy Builder",
+            "Smart Signals",
+            "Risk Management",
+            "Capital Protector",
+            "Multi-Timeframe Analysis",
+            "Pattern Detection",
+            "Bot Performance Tracking",
+            "Session Analytics",
+            "Early Sell",
+            "Probability Engine"
+        ]
+    }
+
+# ===== AUTHENTICATION =====
+
+@app.post("/api/v3/auth/deriv")
+async def authenticate_deriv(auth_data: dict):
+    """Authenticate user with Deriv API token"""
+    api_token = auth_data.get('token')
+    user_id = auth_data.get('user_id', 'demo_user')
+    
+    if not api_token:
+        return {'success': False, 'error': 'API token required'}
+    
+    # Connect to Deriv
+    success = await deriv_api.connect(user_id, api_token)
+    
+    if success:
+        # Create session
+        user_sessions[user_id] = UserSession(
+            user_id=user_id,
+            deriv_token=api_token,
+            balance=0,
+            currency='USD',
+            active_contracts=ContractBook(),
+            last_activity=datetime.now()
+        )
+        await capital_protector.load(user_id)
+        
+        return {
+            'success': True,
+            'message': 'Connected to Deriv',
+            'user_id': user_id
+        }
+    else:
+        return {'success': False, 'error': 'Failed to connect to Deriv'}
+
+@app.get("/api/v3/account/{user_id}")
+async def get_account_info(user_id: str):
+    """Get user account information"""
+    if user_id not in user_sessions:
+        return {'error': 'User not authenticated'}
+    
+    session = user_sessions[user_id]
+    return {
+        'balance': session.balance,
+        'currency': session.currency,
+        'active_contracts': len(session.active_contracts),
+        'total_trades': trade_store.total_trades[user_id]
+    }
+
+# ===== ANALYTICS ENGINE =====
+
+@app.get("/api/v3/symbols")
+async def get_symbols():
+    """Symbols with analytics in memory"""
+    return {
+        'active': sorted(market_hub.streams),
+        'idle': list(symbol_registry.idle),
+        'capacity': SYMBOL_REGISTRY_SIZE
+    }
+
+@app.get("/api/v3/analytics/{symbol}/digits")
+async def get_digit_analytics(symbol: str, window: Optional[str] = None):
+    """Get digit frequency and analytics.
+    
+    `window` selects a rolling window (e.g. 20, 100, 1000, 10000 ticks) or
+    `decayed` for exponentially-weighted counts; all-time counts otherwise.
+    """
+    if symbol not in digit_analytics:
+        return {'error': 'Symbol not found'}
+    
+    analytics = digit_analytics[symbol]
+    return cached_signal(analytics, ('digits', window), lambda: compute_digits(analytics, window))
+
+def compute_digits(analytics: DigitAnalytics, window: Optional[str]) -> Dict:
+    if window is None:
+        # Copies, so cached results are not mutated by later ticks
+        stats = {
+            'sample_size': analytics.total,
+            'digit_frequency': dict(analytics.digit_frequency),
+            'even_odd_ratio': dict(analytics.even_odd_ratio),
+            'over_under_5': dict(analytics.over_under_5),
+        }
+    elif window == 'decayed':
+        stats = analytics.decayed.stats()
+    elif window.isdigit() and analytics.window(int(window)):
+        stats = analytics.window(int(window)).stats()
+    else:
+        return {
+            'error': f'Unknown window: {window}',
+            'windows': list(analytics.windows) + ['decayed']
+        }
+    
+    total_ticks = stats['sample_size']
+    
+    # Calculate percentages
+    digit_percentages = {
+        digit: (count / total_ticks * 100) if total_ticks > 0 else 0
+        for digit, count in stats['digit_frequency'].items()
+    }
+    
+    return {
+        'symbol': analytics.symbol,
+        'window': window or 'all',
+        'digit_frequency': stats['digit_frequency'],
+        'digit_percentages': digit_percentages,
+        'even_odd_ratio': stats['even_odd_ratio'],
+        'over_under_5': stats['over_under_5'],
+        'total_ticks': total_ticks,
+        'patterns': list(analytics.patterns),
+        'last_20_digits': analytics.recent(20)
+    }
+
+@app.get("/api/v3/analytics/{symbol}/heatmap")
+async def get_heatmap(symbol: str):
+    """Get over/under heatmap data"""
+    if symbol not in digit_analytics:
+        return {'error': 'Symbol not found'}
+    
+    analytics = digit_analytics[symbol]
+    return cached_signal(analytics, ('heatmap',), lambda: compute_heatmap(analytics))
+
+def compute_heatmap(analytics: DigitAnalytics) -> Dict:
+    ticks = analytics.recent(100)
+    
+    # Generate heatmap data
+    heatmap = []
+    for i in range(0, len(ticks) - 9, 10):
+        row = ticks[i:i+10]
+        heatmap.append({
+            'row': i // 10,
+            'digits': row,
+            'over_count': sum(1 for d in row if d > 5),
+            'under_count': sum(1 for d in row if d <= 5)
+        })
+    
+    return {
+        'symbol': analytics.symbol,
+        'heatmap': heatmap[-10:]  # Last 10 rows
+    }
+
+@app.get("/api/v3/analytics/{symbol}/probability")
+async def get_probability(symbol: str, contract_type: str, window: int = 100, barrier: Optional[int] = None,
+                          model: str = 'frequency', order: Optional[int] = None):
+    """Calculate probability for contract type based on historical data.
+    
+    Both models settle OVER/UNDER/MATCH/DIFF against `barrier` like Deriv
+    does (OVER/UNDER default to 5); `model=markov` conditions on the last
+    digits through the transition model (`order` caps the context length).
+    """
+    if symbol not in digit_analytics:
+        return {'error': 'Symbol not found'}
+    
+    analytics = digit_analytics[symbol]
+    return cached_signal(
+        analytics, ('probability', contract_type, window, barrier, model, order),
+        lambda: compute_probability(analytics, contract_type, window, barrier, model, order)
+    )
+
+def compute_probability(analytics: DigitAnalytics, contract_type: str, window: int, barrier: Optional[int] = None,
+                        model: str = 'frequency', order: Optional[int] = None) -> Dict:
+    if model == 'markov':
+        return compute_markov_probability(analytics, contract_type, barrier, order)
+    if model != 'frequency':
+        return {'error': f'Unknown model: {model}'}
+    barrier, error = contract_barrier(contract_type, barrier)
+    if error:
+        return {'error': error}
+    
+    stats = analytics.window(window)
+    if stats is None:
+        return {'error': f'Unknown window: {window}'}
+    
+    sample_size = stats.count
+    
+    if sample_size < 10:
+        return {'probability': 0.5, 'confidence': 'low'}
+    
+    # Settled like the markov path and Deriv: OVER/UNDER are strict
+    wins = sum(c for d, c in enumerate(stats.digits) if digit_contract_wins(contract_type, barrier, d))
+    probability = wins / sample_size
+    
+    # Determine confidence
+    if sample_size >= 100:
+        confidence = 'high'
+    elif sample_size >= 50:
+        confidence = 'medium'
+    else:
+        confidence = 'low'
+    
+    return {
+        'symbol': analytics.symbol,
+        'contract_type': contract_type,
+        'barrier': barrier,
+        'probability': round(probability, 3),
+        'confidence': confidence,
+        'sample_size': sample_size
+    }
+
+MARKOV_CONTRACT_TYPES = ('DIGITEVEN', 'DIGITODD', 'DIGITOVER', 'DIGITUNDER', 'DIGITMATCH', 'DIGITDIFF')
+
+def contract_barrier(contract_type: str, barrier: Optional[int]) -> Tuple[Optional[int], Optional[str]]:
+    """(barrier the contract settles against, error): none for EVEN/ODD,
+    5 for OVER/UNDER when not given, required for MATCH/DIFF"""
+    if contract_type not in MARKOV_CONTRACT_TYPES:
+        return None, f'Unsupported contract type: {contract_type}'
+    if contract_type in ('DIGITEVEN', 'DIGITODD'):
+        return None, None
+    if barrier is None:
+        if contract_type in ('DIGITMATCH', 'DIGITDIFF'):
+            return None, f'{contract_type} requires a barrier'
+        return 5, None
+    if not 0 <= barrier <= 9:
+        return None, f'Invalid barrier: {barrier}'
+    return barrier, None
+
+def compute_markov_probability(analytics: DigitAnalytics, contract_type: str, barrier: Optional[int],
+                               order: Optional[int]) -> Dict:
+    barrier, error = contract_barrier(contract_type, barrier)
+    if error:
+        return {'error': error}
+    
+    used, sample_size, next_digit = analytics.transitions.next_digit(analytics.count, order)
+    probability = sum(p for d, p in enumerate(next_digit) if digit_contract_wins(contract_type, barrier, d))
+    
+    if used and sample_size >= 100:
+        confidence = 'high'
+    elif used and sample_size >= 50:
+        confidence = 'medium'
+    else:
+        confidence = 'low'
+    
+    return {
+        'symbol': analytics.symbol,
+        'contract_type': contract_type,
+        'barrier': barrier,
+        'model': 'markov',
+        'order': used,
+        'probability': round(probability, 3),
+        'confidence': confidence,
+        'sample_size': sample_size,
+        'next_digit': [round(p, 3) for p in next_digit]
+    }
+
+# ===== TRADE EXECUTION =====
+
+@app.post("/api/v3/trade/buy")
+async def buy_contract(trade_params: dict):
+    """Execute trade on Deriv"""
+    user_id = trade_params.get('user_id', 'demo_user')
+    
+    if user_id not in user_sessions:
+        return {'success': False, 'error': 'Not authenticated'}
+    
+    try:
+        stake = float(trade_params.get('stake'))
+    except (TypeError, ValueError):
+        stake = math.nan
+    if not (math.isfinite(stake) and stake > 0):
+        return {'success': False, 'error': f"Invalid stake: {trade_params.get('stake')}"}
+    
+    reason = capital_protector.reserve(user_id, stake)
+    if reason:
+        return {'success': False, 'error': f'Capital Protector: {reason}'}
+    
+    result = await deriv_api.buy_contract(user_id, {**trade_params, 'stake': stake})
+    if result.get('success'):
+        contract = result['contract']
+        capital_protector.opened(user_id, contract.get('contract_id'), float(contract.get('buy_price', stake)), stake)
+    else:
+        capital_protector.release(user_id, stake)
+    return result
+
+@app.post("/api/v3/trade/sell")
+async def sell_contract(sell_params: dict):
+    """Close contract early"""
+    user_id = sell_params.get('user_id', 'demo_user')
+    contract_id = sell_params.get('contract_id')
+    
+    if not contract_id:
+        return {'success': False, 'error': 'Contract ID required'}
+    
+    result = await deriv_api.sell_contract(user_id, contract_id)
+    return result
+
+@app.get("/api/v3/trade/history/{user_id}")
+async def get_trade_history(user_id: str, day: Optional[str] = None, status: Optional[str] = None,
+                            limit: int = 100):
+    """Get user's settled trades (newest first) and the day's aggregate"""
+    return {
+        'trades': await trade_store.history(user_id, day, status, max(1, min(limit, 1000))),
+        'daily': await trade_store.daily(user_id, day)
+    }
+
+@app.get("/api/v3/trade/active/{user_id}")
+async def get_active_contracts(user_id: str, symbol: Optional[str] = None, expiring_within: Optional[float] = None):
+    """Get user's active contracts, optionally for one symbol or expiring within N seconds"""
+    if user_id not in user_sessions:
+        return {'contracts': []}
+    
+    book = user_sessions[user_id].active_contracts
+    if expiring_within is not None:
+        contracts = book.expiring(time.time() + expiring_within)
+        if symbol:
+            contracts = [c for c in contracts if c.get('underlying') == symbol]
+    elif symbol:
+        contracts = book.symbol(symbol)
+    else:
+        contracts = list(book.values())
+    
+    return {
+        'contracts': contracts,
+        'exposure': round(book.exposure, 2),
+        'unrealized_profit': round(book.unrealized, 2)
+    }
+
+@app.post("/api/v3/trade/proposal")
+async def get_proposal(proposal_params: dict):
+    """Get payout estimate before buying"""
+    if not proposal_params.get('symbol') or not proposal_params.get('contract_type'):
+        return {'success': False, 'error': 'symbol and contract_type required'}
+    
+    session = user_sessions.get(proposal_params.get('user_id', 'demo_user'))
+    currency = session.currency if session else 'USD'
+    
+    try:
+        quote = await proposal_cache.get(proposal_params, currency)
+    except ProposalError as e:
+        return {'success': False, 'error': str(e)}
+    except (TypeError, ValueError):
+        return {'success': False, 'error': 'Invalid duration or stake'}
+    except (asyncio.TimeoutError, ConnectionError):
+        return {'success': False, 'error': 'Deriv pricing unavailable'}
+    
+    stake = quote['ask_price']
+    payout = quote['payout']
+    
+    return {
+        'success': True,
+        'stake': stake,
+        'payout': round(payout, 2),
+        'profit': round(payout - stake, 2),
+        'return_percent': round((payout - stake) / stake * 100, 2) if stake else 0,
+        'proposal_id': quote['proposal_id'],
+        'longcode': quote['longcode'],
+        'spot': quote['spot'],
+        'cached': quote['cached']
+    }
+
+# ===== BOT AUTOMATION =====
+
+DEFAULT_BOT_CONFIG = {
+    'max_trades': 100,
+    'stop_loss': -50,
+    'take_profit': 100,
+    'stake': 1.0,
+    'martingale_multiplier': 2.0
+}
+
+# Payout factor giving the usual 95% profit on 50/50 digit contracts
+DIGIT_PAYOUT_FACTOR = 0.975
+
+def new_bot_stats() -> Dict:
+    return {
+        'trades': 0,
+        'wins': 0,
+        'losses': 0,
+        'profit': 0
+    }
+
+def digit_contract_wins(contract_type: str, barrier: int, digit: int) -> bool:
+    """Settle a digit contract against its exit digit"""
+    if contract_type == 'DIGITEVEN':
+        return digit % 2 == 0
+    if contract_type == 'DIGITODD':
+        return digit % 2 == 1
+    if contract_type == 'DIGITOVER':
+        return digit > barrier
+    if contract_type == 'DIGITUNDER':
+        return digit < barrier
+    if contract_type == 'DIGITMATCH':
+        return digit == barrier
+    if contract_type == 'DIGITDIFF':
+        return digit != barrier
+    raise ValueError(f'Unsupported contract type: {contract_type}')
+
+def digit_win_probability(contract_type: str, barrier: int) -> float:
+    if contract_type in ('DIGITEVEN', 'DIGITODD'):
+        return 0.5
+    if contract_type == 'DIGITOVER':
+        return (9 - barrier) / 10
+    if contract_type == 'DIGITUNDER':
+        return barrier / 10
+    if contract_type == 'DIGITMATCH':
+        return 0.1
+    if contract_type == 'DIGITDIFF':
+        return 0.9
+    raise ValueError(f'Unsupported contract type: {contract_type}')
+
+def digit_payout(contract_type: str, barrier: int) -> float:
+    """Profit per unit stake on a winning contract"""
+    return DIGIT_PAYOUT_FACTOR / digit_win_probability(contract_type, barrier) - 1
+
+def record_bot_trade(stats: Dict, stake: float, won: bool, payout: float,
+                     profit: Optional[float] = None) -> float:
+    """Apply a settled trade to bot stats and return its profit.
+    
+    `profit` overrides the payout-based figure when the broker reports it.
+    """
+    if profit is None:
+        profit = stake * payout if won else -stake
+    
+    stats['trades'] += 1
+    if won:
+        stats['wins'] += 1
+    else:
+        stats['losses'] += 1
+    stats['profit'] += profit
+    return profit
+
+def bot_stop_reason(stats: Dict, config: Dict) -> Optional[str]:
+    """Why the bot must stop before its next trade, if it must"""
+    if stats['trades'] >= config['max_trades']:
+        return 'MAX_TRADES'
+    if stats['profit'] <= config['stop_loss']:
+        return 'STOP_LOSS_HIT'
+    if stats['profit'] >= config['take_profit']:
+        return 'TAKE_PROFIT_HIT'
+    return None
+
+@app.post("/api/v3/bot/create")
+async def create_bot(bot_config: dict):
+    """Create trading bot with strategy"""
+    user_id = bot_config.get('user_id', 'demo_user')
+    bot_id = f"bot_{datetime.now().timestamp()}"
+    
+    try:
+        compile_strategy(bot_config.get('strategy', {}))
+    except StrategyError as e:
+        return {'success': False, 'error': f'Invalid strategy: {e}'}
+    
+    bot = TradingBot(
+        bot_id=bot_id,
+        user_id=user_id,
+        name=bot_config.get('name', 'My Bot'),
+        strategy=bot_config.get('strategy', {}),
+        status='STOPPED',
+        stats=new_bot_stats(),
+        config={**DEFAULT_BOT_CONFIG, **bot_config.get('config', {})}
+    )
+    
+    active_bots[bot_id] = bot
+    bot_logs[bot_id] = []
+    
+    return {'success': True, 'bot': asdict(bot)}
+
+@app.post("/api/v3/bot/{bot_id}/start")
+async def start_bot(bot_id: str):
+    """Start bot trading"""
+    if bot_id not in active_bots:
+        return {'success': False, 'error': 'Bot not found'}
+    
+    bot = active_bots[bot_id]
+    if not symbol_registry.valid(bot_symbol(bot)):
+        return {'success': False, 'error': f'Invalid symbol: {bot_symbol(bot)}'}
+    
+    if not await bot_scheduler.start(bot):
+        return {'success': False, 'error': 'Bot already running'}
+    
+    return {'success': True, 'message': 'Bot started'}
+
+@app.post("/api/v3/bot/{bot_id}/stop")
+async def stop_bot(bot_id: str):
+    """Stop bot trading"""
+    if bot_id not in active_bots:
+        return {'success': False, 'error': 'Bot not found'}
+    
+    active_bots[bot_id].status = 'STOPPED'
+    bot_scheduler.stop(bot_id)
+    return {'success': True, 'message': 'Bot stopped'}
+
+@app.get("/api/v3/bot/{bot_id}/stats")
+async def get_bot_stats(bot_id: str):
+    """Get bot performance stats"""
+    if bot_id not in active_bots:
+        return {'error': 'Bot not found'}
+    
+    return compute_bot_stats(active_bots[bot_id])
+
+def compute_bot_stats(bot: TradingBot) -> Dict:
+    return {
+        'bot_id': bot.bot_id,
+        'name': bot.name,
+        'status': bot.status,
+        'stats': dict(bot.stats)
+    }
+
+@app.get("/api/v3/bot/latency")
+async def get_buy_latency():
+    """Signal to buy-acknowledgement latency (ms) of live bot orders by buy path"""
+    return {path: histogram.snapshot() for path, histogram in buy_latency.items()}
+
+@app.get("/api/v3/bot/{bot_id}/logs")
+async def get_bot_logs(bot_id: str):
+    """Get bot execution logs"""
+    if bot_id not in bot_logs:
+        return {'logs': []}
+    
+    return {'logs': bot_logs[bot_id][-100:]}  # Last 100 logs
+
+# ===== STRATEGY BUILDER =====
+
+DIGIT_CONTRACT_TYPES = ('DIGITEVEN', 'DIGITODD', 'DIGITOVER', 'DIGITUNDER')
+BARRIER_CONTRACT_TYPES = ('DIGITOVER', 'DIGITUNDER', 'DIGITMATCH', 'DIGITDIFF')
+
+STRATEGY_OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+class StrategyError(ValueError):
+    """Strategy definition failed validation"""
+
+class CompiledStrategy:
+    """A validated strategy reduced to one planning closure.
+    
+    `plan(config, loss_streak, analytics)` returns the next order or None;
+    it is shared by live bots and the backtester so both run the same
+    strategy code.
+    """
+    
+    __slots__ = ('spec', 'plan', 'uses_analytics')
+    
+    def __init__(self, spec: Dict, plan, uses_analytics: bool):
+        self.spec = spec
+        self.plan = plan
+        self.uses_analytics = uses_analytics
+
+def _window_stat(name: str, window: int, digit: Optional[int]):
+    """Percentage reader over one rolling window"""
+    def pct(part, w):
+        return part * 100 / w.count if w.count else 0.0
+    
+    readers = {
+        'even_pct': lambda w: pct(w.even, w),
+        'odd_pct': lambda w: pct(w.count - w.even, w),
+        'over_pct': lambda w: pct(w.over, w),
+        'under_pct': lambda w: pct(w.count - w.over, w),
+        'digit_pct': lambda w: pct(w.digits[digit], w),
+        'sample_size': lambda w: w.count,
+    }
+    read = readers[name]
+    return lambda analytics: read(analytics.windows[window])
+
+def _positive(value, name: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 < value < math.inf:
+        raise StrategyError(f'{name} must be a positive number')
+    return float(value)
+
+def _count(value, name: str) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise StrategyError(f'{name} must be a non-negative integer')
+    return value
+
+def _compile_condition(condition: Dict):
+    if not isinstance(condition, dict):
+        raise StrategyError('Each condition must be an object')
+    stat = condition.get('stat')
+    op_name = condition.get('op', '>=')
+    op = STRATEGY_OPERATORS.get(op_name) if isinstance(op_name, str) else None
+    if op is None:
+        raise StrategyError(f"Unknown operator: {condition.get('op')}")
+    
+    if stat == 'pattern':
+        # Presence of a detected pattern, e.g. {"stat": "pattern", "pattern": "streak"}
+        kind = condition.get('pattern')
+        if kind not in ('streak', 'alternating'):
+            raise StrategyError(f'Unknown pattern: {kind}')
+        return lambda a: any(p['type'] == kind for p in a.patterns)
+    
+    value = condition.get('value')
+    if not isinstance(value, (int, float)):
+        raise StrategyError(f'Condition on {stat} needs a numeric value')
+    
+    if stat in ('streak', 'alternation', 'last_digit'):
+        attr = {'streak': 'streak', 'alternation': 'alternation', 'last_digit': 'last'}[stat]
+        getter = operator.attrgetter(attr)
+        return lambda a: op(getter(a), value)
+    
+    if stat in ('even_pct', 'odd_pct', 'over_pct', 'under_pct', 'digit_pct', 'sample_size'):
+        window = condition.get('window', 100)
+        if window not in ANALYTICS_WINDOWS:
+            raise StrategyError(f'Unknown window {window}, expected one of {list(ANALYTICS_WINDOWS)}')
+        digit = condition.get('digit')
+        if stat == 'digit_pct' and digit not in range(10):
+            raise StrategyError('digit_pct needs a digit between 0 and 9')
+        read = _window_stat(stat, window, digit)
+        return lambda a: op(read(a), value)
+    
+    raise StrategyError(f'Unknown stat: {stat}')
+
+def _compile_stake(stake):
+    """Stake sizing closure: (config, loss_streak) -> stake"""
+    if stake is None:
+        stake = {'mode': 'fixed'}
+    if not isinstance(stake, dict):
+        amount = _positive(stake, 'Stake')
+        return lambda config, losses: amount
+    
+    mode = stake.get('mode', 'fixed')
+    amount = stake.get('amount')
+    if amount is not None:
+        amount = _positive(amount, 'Stake amount')
+    
+    if mode == 'fixed':
+        return lambda config, losses: amount if amount is not None else config['stake']
+    
+    if mode == 'martingale':
+        multiplier = _positive(stake.get('multiplier', 2.0), 'Martingale multiplier')
+        max_steps = _count(stake.get('max_steps', 5), 'max_steps')
+        
+        def martingale(config, losses):
+            base = amount if amount is not None else config['stake']
+            return base * multiplier ** min(losses, max_steps)
+        return martingale
+    
+    raise StrategyError(f'Unknown stake mode: {mode}')
+
+def _compile_action(action: Dict):
+    if not isinstance(action, dict):
+        raise StrategyError('Rule action (then) must be an object')
+    contract_type = action.get('contract_type')
+    if contract_type not in DIGIT_CONTRACT_TYPES:
+        raise StrategyError(f'Unsupported contract type: {contract_type}')
+    
+    barrier = action.get('barrier', 5)
+    if contract_type == 'DIGITOVER' and barrier not in range(0, 9):
+        raise StrategyError('DIGITOVER barrier must be 0-8')
+    if contract_type == 'DIGITUNDER' and barrier not in range(1, 10):
+        raise StrategyError('DIGITUNDER barrier must be 1-9')
+    
+    duration = action.get('duration', 5)
+    if duration not in range(1, 11):
+        raise StrategyError('Duration must be 1-10 ticks')
+    
+    payout = action.get('payout')
+    template = {
+        'contract_type': contract_type,
+        'barrier': barrier,
+        'duration': duration,
+        'payout': digit_payout(contract_type, barrier) if payout is None else _positive(payout, 'Payout')
+    }
+    stake = _compile_stake(action.get('stake'))
+    return lambda config, losses: {**template, 'stake': stake(config, losses)}
+
+def compile_strategy(strategy: Dict) -> CompiledStrategy:
+    """Validate a strategy definition once and compile it.
+    
+    Rule strategies look like::
+    
+        {"type": "rules", "symbol": "R_100", "min_ticks": 20, "rules": [
+            {"when": [{"stat": "even_pct", "window": 20, "op": ">=", "value": 75},
+                      {"stat": "streak", "op": ">=", "value": 3}],
+             "then": {"contract_type": "DIGITODD", "duration": 1,
+                      "stake": {"mode": "martingale", "multiplier": 2}}}]}
+    
+    The first rule whose conditions all hold places its action.
+    """
+    if not isinstance(strategy, dict):
+        raise StrategyError('Strategy must be an object')
+    if not isinstance(strategy.get('symbol', ''), str):
+        raise StrategyError('Strategy symbol must be a string')
+    kind = strategy.get('type')
+    
+    if not kind:
+        return CompiledStrategy(strategy, lambda config, losses, analytics: None, False)
+    
+    # Simple martingale example
+    if kind == 'martingale':
+        action = _compile_action({
+            'contract_type': strategy.get('contract_type', 'DIGITEVEN'),
+            'barrier': strategy.get('barrier', 5),
+            'duration': strategy.get('duration', 5),
+            'payout': strategy.get('payout'),
+        })
+        
+        def martingale(config, losses, analytics):
+            order = action(config, 0)
+            # Raise stake after loss
+            if losses:
+                order['stake'] *= config.get('martingale_multiplier', 2.0)
+            return order
+        return CompiledStrategy(strategy, martingale, False)
+    
+    if kind == 'rules':
+        rules = strategy.get('rules')
+        if not rules or not isinstance(rules, list):
+            raise StrategyError('Rule strategy needs a non-empty rules list')
+        
+        compiled = []
+        for rule in rules:
+            if not isinstance(rule, dict):
+                raise StrategyError('Each rule must be an object')
+            when = rule.get('when', [])
+            if not isinstance(when, list):
+                raise StrategyError('Rule conditions (when) must be a list')
+            conditions = tuple(_compile_condition(c) for c in when)
+            compiled.append((conditions, _compile_action(rule.get('then', {}))))
+        compiled = tuple(compiled)
+        min_ticks = _count(strategy.get('min_ticks', 20), 'min_ticks')
+        
+        def evaluate(config, losses, analytics):
+            if analytics is None or analytics.count < min_ticks:
+                return None
+            for conditions, action in compiled:
+                for condition in conditions:
+                    if not condition(analytics):
+                        break
+                else:
+                    return action(config, losses)
+            return None
+        return CompiledStrategy(strategy, evaluate, True)
+    
+    raise StrategyError(f'Unknown strategy type: {kind}')
+
+def bot_symbol(bot: TradingBot) -> str:
+    return bot.strategy.get('symbol', 'R_100')
+
+def bot_log(bot: TradingBot, entry: Dict):
+    bot_logs[bot.bot_id].append({'time': datetime.now().isoformat(), **entry})
+    channel_hub.on_bot(bot)
+
+class BotScheduler:
+    """Runs bots on tick events of their symbol.
+    
+    Every running bot owns exactly one task, woken by an event the market
+    hub sets on each tick of the bot's symbol. Ticks that arrive while a
+    bot is still busy coalesce into one wake-up, so per-tick work is at
+    most one O(1) strategy evaluation per bot and a slow bot skips ticks
+    instead of queueing them.
+    
+    Bots trade on paper by default, settling each contract against the
+    live exit tick; with config `mode: live` they buy through Deriv and
+    settle when the contract closes.
+    """
+    
+    def __init__(self):
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.wakeups: Dict[str, asyncio.Event] = {}
+        self.by_symbol: Dict[str, Set[str]] = {}
+        self.strategies: Dict[str, CompiledStrategy] = {}
+        self.loss_streaks: Dict[str, int] = {}
+        self.open_trades: Dict[str, Dict] = {}   # bot_id -> contract awaiting settlement
+        self.live_contracts: Dict[str, str] = {}  # Deriv contract_id -> bot_id
+    
+    def is_running(self, bot_id: str) -> bool:
+        task = self.tasks.get(bot_id)
+        return task is not None and not task.done()
+    
+    async def start(self, bot: TradingBot) -> bool:
+        """Start the bot's loop; False if it is already running"""
+        if self.is_running(bot.bot_id):
+            return False
+        
+        symbol = bot_symbol(bot)
+        self.strategies[bot.bot_id] = compile_strategy(bot.strategy)
+        
+        # Resume the losing streak from the bot's own trade log
+        losses = 0
+        for entry in reversed(bot_logs[bot.bot_id]):
+            if 'result' in entry:
+                if entry['result'] != 'LOSS':
+                    break
+                losses += 1
+        self.loss_streaks[bot.bot_id] = losses
+        
+        bot.status = 'RUNNING'
+        self.wakeups[bot.bot_id] = asyncio.Event()
+        self.by_symbol.setdefault(symbol, set()).add(bot.bot_id)
+        self.tasks[bot.bot_id] = asyncio.create_task(self.run(bot))
+        await market_hub.retain(symbol)
+        channel_hub.on_bot(bot)
+        return True
+    
+    def stop(self, bot_id: str):
+        task = self.tasks.get(bot_id)
+        if task:
+            task.cancel()
+    
+    def on_tick(self, symbol: str):
+        for bot_id in self.by_symbol.get(symbol, ()):
+            self.wakeups[bot_id].set()
+    
+    async def run(self, bot: TradingBot):
+        """Bot execution loop"""
+        symbol = bot_symbol(bot)
+        wakeup = self.wakeups[bot.bot_id]
+        
+        try:
+            while bot.status == 'RUNNING':
+                await wakeup.wait()
+                wakeup.clear()
+                
+                analytics = digit_analytics.get(symbol)
+                if analytics is None:
+                    continue
+                
+                if bot.bot_id in self.open_trades and not self.settle_paper(bot, analytics):
+                    continue  # contract still open
+                
+                # Check stop conditions
+                reason = bot_stop_reason(bot.stats, bot.config)
+                if reason:
+                    bot.status = 'STOPPED'
+                    if reason != 'MAX_TRADES':
+                        bot_log(bot, {'event': reason, 'profit': bot.stats['profit']})
+                    break
+                
+                # Execute strategy
+                await execute_bot_strategy(bot, analytics)
+        
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Bot error: {e}")
+            bot.status = 'ERROR'
+        
+        finally:
+            self.tasks.pop(bot.bot_id, None)
+            self.wakeups.pop(bot.bot_id, None)
+            self.strategies.pop(bot.bot_id, None)
+            self.loss_streaks.pop(bot.bot_id, None)
+            self.open_trades.pop(bot.bot_id, None)
+            bots = self.by_symbol.get(symbol)
+            if bots is not None:
+                bots.discard(bot.bot_id)
+                if not bots:
+                    del self.by_symbol[symbol]
+            market_hub.release(symbol)
+            channel_hub.on_bot(bot)
+    
+    def settle_paper(self, bot: TradingBot, analytics: DigitAnalytics) -> bool:
+        """Settle the bot's paper contract once its exit tick has arrived"""
+        trade = self.open_trades[bot.bot_id]
+        if trade.get('contract_id'):
+            return False  # live contract, settled by settle_live
+        if analytics.total < trade['exit_seq']:
+            return False
+        
+        del self.open_trades[bot.bot_id]
+        digit = analytics.digit_at(trade['exit_seq'])
+        if digit is None:
+            bot_log(bot, {'event': 'TRADE_VOID', 'reason': 'Exit tick no longer available'})
+            return True
+        
+        won = digit_contract_wins(trade['contract_type'], trade['barrier'], digit)
+        profit = record_bot_trade(bot.stats, trade['stake'], won, trade['payout'])
+        self.loss_streaks[bot.bot_id] = 0 if won else self.loss_streaks[bot.bot_id] + 1
+        bot_log(bot, {
+            'action': 'TRADE',
+            'contract_type': trade['contract_type'],
+            'stake': trade['stake'],
+            'exit_digit': digit,
+            'result': 'WIN' if won else 'LOSS',
+            'profit': profit
+        })
+        return True
+    
+    def settle_live(self, contract: Dict):
+        """Apply a closed Deriv contract to the bot that bought it"""
+        bot_id = self.live_contracts.pop(str(contract.get('contract_id')), None)
+        bot = active_bots.get(bot_id)
+        if bot is None:
+            return
+        
+        trade = self.open_trades.pop(bot_id, None) or {}
+        profit = float(contract.get('profit', 0))
+        won = contract.get('status') == 'won' or profit > 0
+        record_bot_trade(bot.stats, trade.get('stake', contract.get('buy_price', 0)), won, 0, profit=profit)
+        if bot_id in self.loss_streaks:
+            self.loss_streaks[bot_id] = 0 if won else self.loss_streaks[bot_id] + 1
+        bot_log(bot, {
+            'action': 'TRADE',
+            'contract_id': contract.get('contract_id'),
+            'contract_type': trade.get('contract_type', contract.get('contract_type')),
+            'stake': trade.get('stake', contract.get('buy_price')),
+            'result': 'WIN' if won else 'LOSS',
+            'profit': profit
+        })
+        
+        wakeup = self.wakeups.get(bot_id)
+        if wakeup:
+            wakeup.set()
+
+bot_scheduler = BotScheduler()
+
+async def execute_bot_strategy(bot: TradingBot, analytics: DigitAnalytics):
+    """Execute bot's trading strategy"""
+    strategy = bot_scheduler.strategies[bot.bot_id]
+    started = time.perf_counter_ns()
+    order = strategy.plan(bot.config, bot_scheduler.loss_streaks[bot.bot_id], analytics)
+    bot_evaluation_us.observe((time.perf_counter_ns() - started) / 1000)
+    if order is None:
+        return
+    
+    if bot.config.get('mode') != 'live':
+        # Paper trade at Deriv's quoted payout once priced (fetched in the
+        # background for signed-in users), the model payout until then
+        session = user_sessions.get(bot.user_id)
+        quote = proposal_cache.peek({
+            'symbol': bot_symbol(bot),
+            'contract_type': order['contract_type'],
+            'duration': order['duration'],
+            'stake': order['stake'],
+            **({'barrier': order['barrier']} if order['contract_type'] in BARRIER_CONTRACT_TYPES else {})
+        }, session.currency if session else 'USD', prefetch=session is not None)
+        if quote and quote['ask_price']:
+            order['payout'] = quote['payout'] / quote['ask_price'] - 1
+        
+        # Settled against the tick `duration` ticks from now
+        bot_scheduler.open_trades[bot.bot_id] = {**order, 'exit_seq': analytics.total + order['duration']}
+        return
+    
+    signal_at = time.perf_counter()
+    reason = capital_protector.reserve(bot.user_id, order['stake'])
+    if reason:
+        bot.status = 'STOPPED'
+        bot_log(bot, {'event': 'CAPITAL_PROTECTOR', 'reason': reason})
+        return
+    
+    # Hold the slot before awaiting so the bot never double-buys
+    bot_scheduler.open_trades[bot.bot_id] = order
+    buy_params = {
+        'symbol': bot_symbol(bot),
+        'contract_type': order['contract_type'],
+        'duration': order['duration'],
+        'duration_unit': 't',
+        'stake': order['stake']
+    }
+    if order['contract_type'] in BARRIER_CONTRACT_TYPES:
+        buy_params['barrier'] = order['barrier']
+    
+    path = 'standard'
+    if bot.config.get('fast_buy'):
+        session = user_sessions.get(bot.user_id)
+        key = ProposalCache.key(buy_params, session.currency if session else 'USD')
+        proposal = armed_proposals.take(bot.user_id, key)
+        armed_proposals.arm(bot.user_id, key)
+        if proposal:
+            path = 'fast'
+            result = await deriv_api.buy_proposal(bot.user_id, proposal, buy_params)
+            if not result.get('success'):
+                # Stale or repriced proposal: buy with full parameters
+                path = 'fallback'
+    if path != 'fast':
+        result = await deriv_api.buy_contract(bot.user_id, buy_params)
+    
+    if not result.get('success'):
+        capital_protector.release(bot.user_id, order['stake'])
+        bot_scheduler.open_trades.pop(bot.bot_id, None)
+        bot_log(bot, {'event': 'BUY_FAILED', 'error': result.get('error')})
+        return
+    
+    capital_protector.opened(bot.user_id, result['contract'].get('contract_id'),
+                             float(result['contract'].get('buy_price', order['stake'])), order['stake'])
+    buy_latency[path].observe((time.perf_counter() - signal_at) * 1000)
+    
+    contract_id = str(result['contract']['contract_id'])
+    order['contract_id'] = contract_id
+    bot_scheduler.live_contracts[contract_id] = bot.bot_id
+
+# ===== BACKTESTING =====
+
+def digits_from_quotes(quotes: List, pip_size: Optional[int] = None) -> np.ndarray:
+    """Last digits of recorded quotes.
+    
+    Quotes given as strings keep trailing zeros, so their last character
+    is the digit; numeric quotes need the symbol's pip size to be exact.
+    """
+    digits = np.empty(len(quotes), dtype=np.int8)
+    for i, quote in enumerate(quotes):
+        digits[i] = int(quote[-1]) if isinstance(quote, str) else last_digit(quote, pip_size)
+    return digits
+
+def load_tick_file(path: str) -> np.ndarray:
+    """Digits from a recorded tick file.
+    
+    `.npy` files hold digits directly; text files hold one tick per line,
+    either `quote` or `epoch,quote`, with an optional header row.
+    `store:SYMBOL` reads everything the tick store has for a symbol.
+    """
+    if path.startswith('store:'):
+        return np.asarray(tick_store.read(path[len('store:'):])['digit'])
+    if path.endswith('.npy'):
+        return np.load(path).astype(np.int8, copy=False)
+    
+    quotes = []
+    with open(path) as f:
+        for line in f:
+            quote = line.rstrip().rsplit(',', 1)[-1]
+            if quote and quote[-1].isdigit():
+                quotes.append(quote)
+    return digits_from_quotes(quotes)
+
+class Backtester:
+    """Replays a tick series through a bot strategy.
+    
+    Every contract is settled against the actual digit of its exit tick,
+    so the result is the `stats` a live bot would have ended with, plus
+    the equity curve after each trade and the maximum drawdown.
+    """
+    
+    def __init__(self, strategy: Dict, config: Dict, symbol: str = 'R_100'):
+        self.strategy = compile_strategy(strategy)
+        self.config = {**DEFAULT_BOT_CONFIG, **config}
+        self.symbol = symbol
+    
+    @property
+    def vectorized(self) -> bool:
+        """Martingale never looks at analytics, so it can run on whole arrays"""
+        return self.strategy.spec.get('type') == 'martingale'
+    
+    def run(self, digits) -> Dict:
+        digits = np.asarray(digits, dtype=np.int8)
+        started = time.perf_counter()
+        
+        if self.vectorized:
+            stats, equity, stop_reason = self.run_vectorized(digits)
+        else:
+            stats, equity, stop_reason = self.run_sequential(digits)
+        
+        equity = np.asarray(equity, dtype=np.float64)
+        curve = np.concatenate(([0.0], equity))
+        drawdown = float((np.maximum.accumulate(curve) - curve).max())
+        
+        stats['profit'] = round(float(stats['profit']), 2)
+        return {
+            'symbol': self.symbol,
+            'ticks': int(len(digits)),
+            'stats': stats,
+            'win_rate': round(stats['wins'] / stats['trades'], 4) if stats['trades'] else 0,
+            'max_drawdown': round(drawdown, 2),
+            'equity_curve': equity.round(2).tolist(),
+            'stop_reason': stop_reason,
+            'engine': 'vectorized' if self.vectorized else 'sequential',
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+        }
+    
+    def run_sequential(self, digits: np.ndarray):
+        """Feed every tick through analytics and the live strategy code"""
+        analytics = DigitAnalytics(self.symbol)
+        stats = new_bot_stats()
+        equity = []
+        losses = 0
+        stop_reason = None
+        order = None
+        exit_at = 0
+        
+        for i, digit in enumerate(digits.tolist()):
+            analytics.add(digit)
+            
+            if order is not None:
+                if i < exit_at:
+                    continue
+                won = digit_contract_wins(order['contract_type'], order['barrier'], digit)
+                record_bot_trade(stats, order['stake'], won, order['payout'])
+                equity.append(stats['profit'])
+                losses = 0 if won else losses + 1
+                order = None
+            
+            stop_reason = bot_stop_reason(stats, self.config)
+            if stop_reason:
+                break
+            
+            order = self.strategy.plan(self.config, losses, analytics)
+            if order is not None:
+                exit_at = i + order['duration']
+        
+        return stats, equity, stop_reason
+    
+    def run_vectorized(self, digits: np.ndarray):
+        """Back-to-back martingale trades evaluated with NumPy.
+        
+        Matches run_sequential: the first contract is bought after the
+        first tick and each next one on the exit tick of the previous.
+        """
+        stats = new_bot_stats()
+        stop_reason = bot_stop_reason(stats, self.config)
+        if stop_reason:
+            return stats, [], stop_reason
+        
+        order = self.strategy.plan(self.config, 0, None)
+        contract_type, barrier = order['contract_type'], order['barrier']
+        duration, payout = order['duration'], order['payout']
+        
+        exits = digits[duration::duration][:max(int(self.config['max_trades']), 0)]
+        if contract_type == 'DIGITEVEN':
+            wins = exits % 2 == 0
+        elif contract_type == 'DIGITODD':
+            wins = exits % 2 == 1
+        elif contract_type == 'DIGITOVER':
+            wins = exits > barrier
+        else:
+            wins = exits < barrier
+        
+        base = self.config['stake']
+        raised = self.strategy.plan(self.config, 1, None)['stake']
+        stakes = np.full(len(wins), base, dtype=np.float64)
+        stakes[1:][~wins[:-1]] = raised
+        equity = np.cumsum(np.where(wins, stakes * payout, -stakes))
+        
+        # Stop checks run after every settlement, before the next buy
+        stopped = np.flatnonzero(
+            (equity <= self.config['stop_loss']) | (equity >= self.config['take_profit'])
+        )
+        count = int(stopped[0]) + 1 if len(stopped) else len(wins)
+        
+        equity = equity[:count]
+        win_count = int(wins[:count].sum())
+        stats.update(
+            trades=count,
+            wins=win_count,
+            losses=count - win_count,
+            profit=float(equity[-1]) if count else 0
+        )
+        return stats, equity, bot_stop_reason(stats, self.config)
+
+def request_digits(params: dict, symbol: str) -> Optional[np.ndarray]:
+    """Ticks submitted with a request, a recorded epoch range, else the
+    symbol's recent live ticks; ValueError on malformed submitted ticks"""
+    if params.get('digits') is not None:
+        digits = np.asarray(params['digits'])
+        if digits.size and (digits.ndim != 1 or digits.dtype.kind not in 'iu' or digits.min() < 0 or digits.max() > 9):
+            raise ValueError('digits must be a list of integers between 0 and 9')
+        return digits.astype(np.int8)
+    if params.get('quotes') is not None:
+        return digits_from_quotes(params['quotes'], params.get('pip_size'))
+    if params.get('start') is not None or params.get('end') is not None:
+        return tick_store.read(symbol, params.get('start'), params.get('end'))['digit']
+    if symbol in digit_analytics:
+        return np.asarray(digit_analytics[symbol].recent(), dtype=np.int8)
+    return None
+
+@app.post("/api/v3/bot/backtest")
+async def backtest_bot(backtest_params: dict):
+    """Backtest a strategy on submitted ticks or the symbol's recent live ticks"""
+    bot = active_bots.get(backtest_params.get('bot_id'))
+    strategy = bot.strategy if bot else backtest_params.get('strategy', {})
+    config = bot.config if bot else backtest_params.get('config', {})
+    if not isinstance(strategy, dict) or not isinstance(config, dict):
+        return {'success': False, 'error': 'Invalid strategy: strategy and config must be objects'}
+    symbol = backtest_params.get('symbol') or strategy.get('symbol', 'R_100')
+    if not symbol_registry.valid(symbol):
+        return {'success': False, 'error': f'Invalid symbol: {symbol}'}
+    
+    try:
+        digits = request_digits(backtest_params, symbol)
+    except (TypeError, ValueError) as e:
+        return {'success': False, 'error': f'Invalid ticks: {e}'}
+    if digits is None:
+        return {'success': False, 'error': 'No ticks to backtest'}
+    
+    try:
+        result = await asyncio.to_thread(Backtester(strategy, config, symbol).run, digits)
+    except (KeyError, ValueError) as e:
+        return {'success': False, 'error': f'Invalid strategy: {e}'}
+    
+    # Keep the response small for long replays
+    curve = result['equity_curve']
+    if len(curve) > 1000:
+        step = -(-len(curve) // 1000)
+        result['equity_curve'] = curve[step - 1::step]
+    
+    return {'success': True, 'backtest': result}
+
+# ===== STRATEGY OPTIMIZER =====
+
+# Limits for /api/v3/bot/optimize; the CLI is not limited
+OPTIMIZE_MAX_CANDIDATES = int(os.getenv("OPTIMIZE_MAX_CANDIDATES", "5000"))
+OPTIMIZE_MAX_WORKERS = int(os.getenv("OPTIMIZE_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+OPTIMIZE_PARAMS = ('stake', 'stop_loss', 'take_profit', 'max_trades', 'martingale_multiplier')
+OPTIMIZE_RANKINGS = {
+    'profit': lambda r: (-r['stats']['profit'], r['max_drawdown'], -r['win_rate']),
+    'drawdown': lambda r: (r['max_drawdown'], -r['stats']['profit'], -r['win_rate']),
+    'win_rate': lambda r: (-r['win_rate'], -r['stats']['profit'], r['max_drawdown']),
+}
+
+# Tick data attached from shared memory in each sweep worker process
+_sweep_memory: Optional[shared_memory.SharedMemory] = None
+_sweep_digits: Optional[np.ndarray] = None
+
+def sweep_candidates(space: Dict[str, list], mode: str = 'grid', samples: int = 100,
+                     seed: Optional[int] = None, limit: Optional[int] = None) -> List[Dict]:
+    """Parameter sets to evaluate.
+    
+    `space` maps config keys to candidate values. Grid mode takes every
+    combination; random mode draws `samples` sets, where a value may also
+    be `{"min": a, "max": b}` for a uniform range. More than `limit`
+    candidates is a ValueError, raised before any are built.
+    """
+    unknown = set(space) - set(OPTIMIZE_PARAMS)
+    if unknown:
+        raise ValueError(f"Cannot optimize {', '.join(sorted(unknown))}")
+    
+    keys = list(space)
+    if mode == 'grid':
+        for key in keys:
+            if not isinstance(space[key], list):
+                raise ValueError(f'Grid search needs a list of values for {key}')
+        size = math.prod(len(space[k]) for k in keys)
+        if limit is not None and size > limit:
+            raise ValueError(f'Grid has {size} combinations, the limit is {limit}')
+        return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    
+    if mode == 'random':
+        if limit is not None and samples > limit:
+            raise ValueError(f'{samples} samples requested, the limit is {limit}')
+        rng = random.Random(seed)
+        
+        def draw(spec):
+            if isinstance(spec, dict):
+                return round(rng.uniform(spec['min'], spec['max']), 4)
+            return rng.choice(spec)
+        
+        return [{key: draw(space[key]) for key in keys} for _ in range(samples)]
+    
+    raise ValueError(f'Unknown search mode: {mode}')
+
+def _sweep_worker_init(memory_name: str, length: int):
+    global _sweep_memory, _sweep_digits
+    # Attach untracked: the parent created the segment and alone unlinks
+    # it, so no resource tracker may clean it up when a worker exits
+    try:
+        _sweep_memory = shared_memory.SharedMemory(name=memory_name, track=False)  # Python 3.13+
+    except TypeError:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            _sweep_memory = shared_memory.SharedMemory(name=memory_name)
+        finally:
+            resource_tracker.register = register
+    _sweep_digits = np.ndarray((length,), dtype=np.int8, buffer=_sweep_memory.buf)
+    # Pool workers leave through os._exit, so atexit hooks never run there
+    util.Finalize(None, _sweep_worker_exit, exitpriority=0)
 
-# ===== ANALYTICS ENGINE =====
+def _sweep_worker_exit():
+    global _sweep_digits
+    _sweep_digits = None  # the array holds an export of the buffer
+    _sweep_memory.close()
 
-@app.get("/api/v3/analytics/{symbol}/digits")
-async def get_digit_analytics(symbol: str):
-    """Get digit frequency and analytics"""
-    if symbol not in digit_analytics:
-        return {'error': 'Symbol not found'}
-    
-    analytics = digit_analytics[symbol]
-    total_ticks = sum(analytics.digit_frequency.values())
+def _sweep_worker(job: Tuple[Dict, Dict, str]) -> Dict:
+    strategy, config, symbol = job
+    result = Backtester(strategy, config, symbol).run(_sweep_digits)
+    del result['equity_curve']
+    result['config'] = config
+    return result
+
+def optimize_strategy(strategy: Dict, base_config: Dict, digits, space: Dict[str, list],
+                      mode: str = 'grid', samples: int = 100, seed: Optional[int] = None,
+                      rank_by: str = 'profit', top: int = 20, workers: Optional[int] = None,
+                      symbol: str = 'R_100', max_candidates: Optional[int] = None) -> Dict:
+    """Backtest every candidate config across all cores.
     
-    # Calculate percentages
-    digit_percentages = {
-        digit: (count / total_ticks * 100) if total_ticks > 0 else 0
-        for digit, count in analytics.digit_frequency.items()
-    }
+    The tick data is written once into shared memory and mapped by each
+    worker instead of being pickled into every task.
+    """
+    if rank_by not in OPTIMIZE_RANKINGS:
+        raise ValueError(f'Unknown ranking: {rank_by}')
     
-    return {
-        'symbol': symbol,
-        'digit_frequency': analytics.digit_frequency,
-        'digit_percentages': digit_percentages,
-        'even_odd_ratio': analytics.even_odd_ratio,
-        'over_under_5': analytics.over_under_5,
-        'total_ticks': total_ticks,
-        'patterns': analytics.patterns,
-        'last_20_digits': analytics.last_100_ticks[-20:]
-    }
-
-@app.get("/api/v3/analytics/{symbol}/heatmap")
-async def get_heatmap(symbol: str):
-    """Get over/under heatmap data"""
-    if symbol not in digit_analytics:
-        return {'error': 'Symbol not found'}
+    candidates = sweep_candidates(space, mode, samples, seed, limit=max_candidates)
+    base_config = {**DEFAULT_BOT_CONFIG, **base_config}
+    jobs = [(strategy, {**base_config, **candidate}, symbol) for candidate in candidates]
+    if not jobs:
+        raise ValueError('Empty search space')
     
-    analytics = digit_analytics[symbol]
-    ticks = analytics.last_100_ticks
+    digits = np.asarray(digits, dtype=np.int8)
+    started = time.perf_counter()
     
-    # Generate heatmap data
-    heatmap = []
-    for i in range(0, len(ticks) - 9, 10):
-        row = ticks[i:i+10]
-        heatmap.append({
-            'row': i // 10,
-            'digits': row,
-            'over_count': sum(1 for d in row if d > 5),
-            'under_count': sum(1 for d in row if d <= 5)
-        })
+    memory = shared_memory.SharedMemory(create=True, size=max(len(digits), 1))
+    try:
+        np.ndarray(digits.shape, dtype=np.int8, buffer=memory.buf)[:] = digits
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_sweep_worker_init,
+            initargs=(memory.name, len(digits))
+        ) as pool:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            results = list(pool.map(_sweep_worker, jobs, chunksize=chunksize))
+    finally:
+        memory.close()
+        memory.unlink()
     
+    results.sort(key=OPTIMIZE_RANKINGS[rank_by])
     return {
-        'symbol': symbol,
-        'heatmap': heatmap[-10:]  # Last 10 rows
+        'evaluated': len(results),
+        'ticks': int(len(digits)),
+        'mode': mode,
+        'rank_by': rank_by,
+        'workers': workers,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+        'results': results[:top]
     }
 
-@app.get("/api/v3/analytics/{symbol}/probability")
-async def get_probability(symbol: str, contract_type: str):
-    """Calculate probability for contract type based on historical data"""
-    if symbol not in digit_analytics:
-        return {'error': 'Symbol not found'}
-    
-    analytics = digit_analytics[symbol]
-    ticks = analytics.last_100_ticks
+optimize_slot = asyncio.Semaphore(1)
+
+@app.post("/api/v3/bot/optimize")
+async def optimize_bot(optimize_params: dict):
+    """Grid/random search over bot config on submitted or recent live ticks"""
+    bot = active_bots.get(optimize_params.get('bot_id'))
+    strategy = bot.strategy if bot else optimize_params.get('strategy', {})
+    config = bot.config if bot else optimize_params.get('config', {})
+    if not isinstance(strategy, dict) or not isinstance(config, dict):
+        return {'success': False, 'error': 'Invalid strategy: strategy and config must be objects'}
+    symbol = optimize_params.get('symbol') or strategy.get('symbol', 'R_100')
+    if not symbol_registry.valid(symbol):
+        return {'success': False, 'error': f'Invalid symbol: {symbol}'}
     
-    if len(ticks) < 10:
-        return {'probability': 0.5, 'confidence': 'low'}
+    try:
+        digits = request_digits(optimize_params, symbol)
+    except (TypeError, ValueError) as e:
+        return {'success': False, 'error': f'Invalid ticks: {e}'}
+    if digits is None:
+        return {'success': False, 'error': 'No ticks to optimize on'}
     
-    # Calculate based on contract type
-    if contract_type == 'DIGITOVER':
-        over_count = sum(1 for d in ticks if d > 5)
-        probability = over_count / len(ticks)
-    elif contract_type == 'DIGITUNDER':
-        under_count = sum(1 for d in ticks if d <= 5)
-        probability = under_count / len(ticks)
-    elif contract_type == 'DIGITEVEN':
-        even_count = sum(1 for d in ticks if d % 2 == 0)
-        probability = even_count / len(ticks)
-    elif contract_type == 'DIGITODD':
-        odd_count = sum(1 for d in ticks if d % 2 != 0)
-        probability = odd_count / len(ticks)
-    else:
-        probability = 0.5
+    try:
+        # One sweep at a time: each already uses OPTIMIZE_MAX_WORKERS processes
+        async with optimize_slot:
+            result = await asyncio.to_thread(
+                optimize_strategy, strategy, config, digits,
+                optimize_params.get('space', {}),
+                mode=optimize_params.get('mode', 'grid'),
+                samples=int(optimize_params.get('samples', 100)),
+                seed=optimize_params.get('seed'),
+                rank_by=optimize_params.get('rank_by', 'profit'),
+                top=int(optimize_params.get('top', 20)),
+                workers=OPTIMIZE_MAX_WORKERS,
+                symbol=symbol,
+                max_candidates=OPTIMIZE_MAX_CANDIDATES
+            )
+    except (KeyError, TypeError, ValueError) as e:
+        return {'success': False, 'error': str(e)}
     
-    # Determine confidence
-    if len(ticks) >= 100:
-        confidence = 'high'
-    elif len(ticks) >= 50:
-        confidence = 'medium'
+    return {'success': True, 'optimization': result}
+
+# ===== SMART SIGNALS =====
+
+SIGNAL_ALPHA = float(os.getenv("SIGNAL_ALPHA", "0.01"))  # family-wise, Bonferroni-corrected
+SIGNAL_MIN_SAMPLE = int(os.getenv("SIGNAL_MIN_SAMPLE", "20"))
+
+# erfc Chebyshev fit (Numerical Recipes erfcc), highest power first;
+# fractional error below 1.2e-7 everywhere, so small p-values stay exact
+ERFC_COEFFICIENTS = (0.17087277, -0.82215223, 1.48851587, -1.13520398, 0.27886807,
+                     -0.18628806, 0.09678418, 0.37409196, 1.00002368, -1.26551223)
+
+def normal_p_value(z: np.ndarray) -> np.ndarray:
+    """Two-sided p-value of standard normal z scores, for the whole array at once"""
+    x = np.abs(np.atleast_1d(np.asarray(z, dtype=np.float64))) / math.sqrt(2)
+    t = 1.0 / (1.0 + 0.5 * x)
+    return np.minimum(t * np.exp(np.polyval(ERFC_COEFFICIENTS, t) - x * x), 1.0)
+
+def chi2_p_value(x: float, df: int) -> float:
+    """Survival function of the chi-square distribution (closed form)"""
+    if x <= 0:
+        return 1.0
+    half = x / 2
+    if df % 2 == 0:
+        term = total = math.exp(-half)
+        for i in range(1, df // 2):
+            term *= half / i
+            total += term
     else:
-        confidence = 'low'
-    
-    return {
-        'symbol': symbol,
-        'contract_type': contract_type,
-        'probability': round(probability, 3),
-        'confidence': confidence,
-        'sample_size': len(ticks)
-    }
+        total = math.erfc(math.sqrt(half))
+        term = math.sqrt(2 * x / math.pi) * math.exp(-half)
+        for i in range(1, (df + 1) // 2):
+            total += term
+            term *= x / (2 * i + 1)
+    return min(1.0, total)
 
-# ===== TRADE EXECUTION =====
+def cohens_h(p: np.ndarray, p0: float) -> np.ndarray:
+    return 2 * np.arcsin(np.sqrt(p)) - 2 * np.arcsin(math.sqrt(p0))
 
-@app.post("/api/v3/trade/buy")
-async def buy_contract(trade_params: dict):
-    """Execute trade on Deriv"""
-    user_id = trade_params.get('user_id', 'demo_user')
+def score_signals(analytics: DigitAnalytics, windows: List[int]) -> List[Dict]:
+    """Significance tests over each rolling window with enough ticks.
     
-    if user_id not in user_sessions:
-        return {'success': False, 'error': 'Not authenticated'}
+    Per window: binomial z tests on even and over-5 counts, a chi-square
+    test of digit uniformity and a Wald-Wolfowitz runs test on parity.
+    p-values are Bonferroni-adjusted across every test run. Effect sizes
+    are Cohen's h (binomial), Cramer's V (chi-square) and z/sqrt(n) (runs).
+    """
+    stats = [s for s in (analytics.window(w) for w in windows) if s and s.count >= SIGNAL_MIN_SAMPLE]
+    if not stats:
+        return []
     
-    result = await deriv_api.buy_contract(user_id, trade_params)
-    return result
-
-@app.post("/api/v3/trade/sell")
-async def sell_contract(sell_params: dict):
-    """Close contract early"""
-    user_id = sell_params.get('user_id', 'demo_user')
-    contract_id = sell_params.get('contract_id')
+    n = np.array([s.count for s in stats], dtype=np.float64)
+    digits = np.array([s.digits for s in stats], dtype=np.float64)
+    even = digits[:, 0::2].sum(axis=1)
+    over = digits[:, 6:].sum(axis=1)
     
-    if not contract_id:
-        return {'success': False, 'error': 'Contract ID required'}
+    z_even = (even - n * 0.5) / np.sqrt(n * 0.25)
+    z_over = (over - n * 0.4) / np.sqrt(n * 0.24)
+    chi2 = ((digits - n[:, None] / 10) ** 2 / (n[:, None] / 10)).sum(axis=1)
     
-    result = await deriv_api.sell_contract(user_id, contract_id)
-    return result
-
-@app.get("/api/v3/trade/active/{user_id}")
-async def get_active_contracts(user_id: str):
-    """Get user's active contracts"""
-    if user_id not in user_sessions:
-        return {'contracts': []}
+    # Parity runs in each window, from one pass over the largest
+    recent = np.asarray(analytics.recent(int(n.max())), dtype=np.int8)
+    parity = recent & 1
+    changes = np.cumsum((parity[1:] != parity[:-1])[::-1])
+    runs = 1 + changes[n.astype(np.int64) - 2]
+    odd = n - even
+    runs_mean = 2 * even * odd / n + 1
+    runs_var = (runs_mean - 1) * (runs_mean - 2) / (n - 1)
+    z_runs = np.where(runs_var > 0, (runs - runs_mean) / np.sqrt(np.maximum(runs_var, 1e-12)), 0.0)
     
-    return {'contracts': user_sessions[user_id].active_contracts}
-
-@app.post("/api/v3/trade/proposal")
-async def get_proposal(proposal_params: dict):
-    """Get payout estimate before buying"""
-    # This would integrate with Deriv's proposal API
-    # For now, simulate
-    stake = proposal_params.get('stake', 1.0)
-    payout = stake * 1.95
+    p_even = normal_p_value(z_even)
+    p_over = normal_p_value(z_over)
+    p_chi2 = np.array([chi2_p_value(x, 9) for x in chi2])
+    p_runs = normal_p_value(z_runs)
+    tests = 4 * len(stats)
     
-    return {
-        'stake': stake,
-        'payout': round(payout, 2),
-        'profit': round(payout - stake, 2),
-        'return_percent': 95
-    }
+    last = analytics.last
+    scores = []
+    for i, s in enumerate(stats):
+        window = s.size
+        scores.append({
+            'test': 'even_odd', 'window': window, 'sample_size': int(n[i]), 'z': float(z_even[i]),
+            'p_value': float(min(1.0, p_even[i] * tests)),
+            'effect_size': float(cohens_h(even[i] / n[i], 0.5)),
+            'type': 'DIGITEVEN' if z_even[i] > 0 else 'DIGITODD', 'barrier': None,
+            'reason': f"{'Even' if z_even[i] > 0 else 'Odd'} bias over {window} ticks"
+        })
+        scores.append({
+            'test': 'over_under', 'window': window, 'sample_size': int(n[i]), 'z': float(z_over[i]),
+            'p_value': float(min(1.0, p_over[i] * tests)),
+            'effect_size': float(cohens_h(over[i] / n[i], 0.4)),
+            'type': 'DIGITOVER' if z_over[i] > 0 else 'DIGITUNDER', 'barrier': 5 if z_over[i] > 0 else 6,
+            'reason': f"{'Over' if z_over[i] > 0 else 'Under'} 5 bias over {window} ticks"
+        })
+        rarest = int(np.argmin(digits[i]))
+        scores.append({
+            'test': 'digit_uniformity', 'window': window, 'sample_size': int(n[i]), 'chi2': float(chi2[i]),
+            'p_value': float(min(1.0, p_chi2[i] * tests)),
+            'effect_size': float(math.sqrt(chi2[i] / (n[i] * 9))),
+            'type': 'DIGITDIFF', 'barrier': rarest,
+            'reason': f"Digit {rarest} under-represented over {window} ticks"
+        })
+        # Too many runs: parity alternates; too few: parity clusters
+        alternating = z_runs[i] > 0
+        parity_next = (last + alternating) % 2
+        scores.append({
+            'test': 'parity_runs', 'window': window, 'sample_size': int(n[i]), 'z': float(z_runs[i]),
+            'p_value': float(min(1.0, p_runs[i] * tests)),
+            'effect_size': float(z_runs[i] / math.sqrt(n[i])),
+            'type': 'DIGITODD' if parity_next else 'DIGITEVEN', 'barrier': None,
+            'reason': f"Parity {'alternation' if alternating else 'clustering'} over {window} ticks"
+        })
+    return scores
 
-# ===== BOT AUTOMATION =====
+SIGNAL_TRACK_TICKS = int(os.getenv("SIGNAL_TRACK_TICKS", "5"))  # settle against the Nth following tick
+SIGNAL_TRACK_WINDOW = int(os.getenv("SIGNAL_TRACK_WINDOW", "500"))  # outcomes per rolling hit rate
+SIGNAL_DISABLE_MIN_SAMPLES = int(os.getenv("SIGNAL_DISABLE_MIN_SAMPLES", "100"))
+SIGNAL_DISABLE_MIN_EDGE = float(os.getenv("SIGNAL_DISABLE_MIN_EDGE", "0.0"))
+SIGNAL_AUTO_DISABLE = os.getenv("SIGNAL_AUTO_DISABLE", "true").lower() == "true"
 
-@app.post("/api/v3/bot/create")
-async def create_bot(bot_config: dict):
-    """Create trading bot with strategy"""
-    user_id = bot_config.get('user_id', 'demo_user')
-    bot_id = f"bot_{datetime.now().timestamp()}"
-    
-    bot = TradingBot(
-        bot_id=bot_id,
-        user_id=user_id,
-        name=bot_config.get('name', 'My Bot'),
-        strategy=bot_config.get('strategy', {}),
-        status='STOPPED',
-        stats={
-            'trades': 0,
-            'wins': 0,
-            'losses': 0,
-            'profit': 0
-        },
-        config=bot_config.get('config', {
-            'max_trades': 100,
-            'stop_loss': -50,
-            'take_profit': 100,
-            'stake': 1.0
-        })
-    )
+class HitRate:
+    """Rolling hit rate of one signal kind on one symbol"""
     
-    active_bots[bot_id] = bot
-    bot_logs[bot_id] = []
+    __slots__ = ('hits', 'expected', 'head', 'count', 'total', 'wins', 'expected_sum', 'disabled')
     
-    return {'success': True, 'bot': asdict(bot)}
-
-@app.post("/api/v3/bot/{bot_id}/start")
-async def start_bot(bot_id: str, background_tasks: BackgroundTasks):
-    """Start bot trading"""
-    if bot_id not in active_bots:
-        return {'success': False, 'error': 'Bot not found'}
+    def __init__(self, size: int = SIGNAL_TRACK_WINDOW):
+        self.hits = bytearray(size)
+        self.expected = array('d', bytes(8 * size))  # fair-odds win probability per outcome
+        self.head = 0
+        self.count = 0
+        self.total = 0  # all-time outcomes
+        self.wins = 0
+        self.expected_sum = 0.0
+        self.disabled = False
     
-    bot = active_bots[bot_id]
-    bot.status = 'RUNNING'
+    def add(self, won: bool, expected: float):
+        head = self.head
+        size = len(self.hits)
+        if self.count == size:
+            self.wins -= self.hits[head]
+            self.expected_sum -= self.expected[head]
+        else:
+            self.count += 1
+        self.hits[head] = won
+        self.expected[head] = expected
+        self.wins += won
+        self.expected_sum += expected
+        self.head = head + 1 if head + 1 < size else 0
+        self.total += 1
+        
+        if SIGNAL_AUTO_DISABLE and self.count >= SIGNAL_DISABLE_MIN_SAMPLES:
+            self.disabled = self.edge < SIGNAL_DISABLE_MIN_EDGE
     
-    # Start bot in background
-    background_tasks.add_task(run_bot, bot_id)
+    @property
+    def hit_rate(self) -> float:
+        return self.wins / self.count if self.count else 0.0
     
-    return {'success': True, 'message': 'Bot started'}
+    @property
+    def edge(self) -> float:
+        """Hit rate above what fair odds would give the same contracts"""
+        return (self.wins - self.expected_sum) / self.count if self.count else 0.0
 
-@app.post("/api/v3/bot/{bot_id}/stop")
-async def stop_bot(bot_id: str):
-    """Stop bot trading"""
-    if bot_id not in active_bots:
-        return {'success': False, 'error': 'Bot not found'}
+class SignalTracker:
+    """Settles every emitted signal against the tick SIGNAL_TRACK_TICKS
+    after it, like a digit contract of that duration.
     
-    active_bots[bot_id].status = 'STOPPED'
-    return {'success': True, 'message': 'Bot stopped'}
-
-@app.get("/api/v3/bot/{bot_id}/stats")
-async def get_bot_stats(bot_id: str):
-    """Get bot performance stats"""
-    if bot_id not in active_bots:
-        return {'error': 'Bot not found'}
+    Pending signals sit in a per-symbol FIFO ordered by exit tick, so
+    settling is O(1) per signal; outcomes feed a HitRate per
+    (kind, symbol). Kinds whose edge falls below SIGNAL_DISABLE_MIN_EDGE
+    are disabled but still tracked, and re-enable if they recover.
+    """
     
-    bot = active_bots[bot_id]
-    return {
-        'bot_id': bot_id,
-        'name': bot.name,
-        'status': bot.status,
-        'stats': bot.stats
-    }
-
-@app.get("/api/v3/bot/{bot_id}/logs")
-async def get_bot_logs(bot_id: str):
-    """Get bot execution logs"""
-    if bot_id not in bot_logs:
-        return {'logs': []}
+    def __init__(self):
+        self.pending: Dict[str, deque] = {}  # symbol -> (exit_seq, kind, contract_type, barrier)
+        self.rates: Dict[Tuple[str, str], HitRate] = {}
+        self.logged: Dict[Tuple, int] = {}  # (symbol, kind, contract_type, barrier) -> seq
     
-    return {'logs': bot_logs[bot_id][-100:]}  # Last 100 logs
-
-async def run_bot(bot_id: str):
-    """Bot execution loop"""
-    bot = active_bots[bot_id]
+    def log(self, analytics: DigitAnalytics, kind: str, contract_type: str, barrier: Optional[int]):
+        """Record a prediction made at the current tick (once per tick)"""
+        key = (analytics.symbol, kind, contract_type, barrier)
+        seq = analytics.total
+        if self.logged.get(key) == seq:
+            return
+        self.logged[key] = seq
+        self.pending.setdefault(analytics.symbol, deque()).append(
+            (seq + SIGNAL_TRACK_TICKS, kind, contract_type, barrier)
+        )
     
-    while bot.status == 'RUNNING':
-        try:
-            # Check stop conditions
-            if bot.stats['trades'] >= bot.config['max_trades']:
-                bot.status = 'STOPPED'
-                break
-            
-            if bot.stats['profit'] <= bot.config['stop_loss']:
-                bot.status = 'STOPPED'
-                bot_logs[bot_id].append({
-                    'time': datetime.now().isoformat(),
-                    'event': 'STOP_LOSS_HIT',
-                    'profit': bot.stats['profit']
-                })
-                break
-            
-            if bot.stats['profit'] >= bot.config['take_profit']:
-                bot.status = 'STOPPED'
-                bot_logs[bot_id].append({
-                    'time': datetime.now().isoformat(),
-                    'event': 'TAKE_PROFIT_HIT',
-                    'profit': bot.stats['profit']
-                })
-                break
-            
-            # Execute strategy
-            await execute_bot_strategy(bot)
-            
-            await asyncio.sleep(10)  # Wait between trades
-            
-        except Exception as e:
-            logger.error(f"Bot error: {e}")
-            bot.status = 'ERROR'
-            break
-
-async def execute_bot_strategy(bot: TradingBot):
-    """Execute bot's trading strategy"""
-    strategy = bot.strategy
+    def enabled(self, kind: str, symbol: str) -> bool:
+        rate = self.rates.get((kind, symbol))
+        return rate is None or not rate.disabled
     
-    # Simple martingale example
-    if strategy.get('type') == 'martingale':
-        stake = bot.config['stake']
-        
-        # Double stake after loss
-        if bot.stats['trades'] > 0:
-            last_result = bot_logs[bot.bot_id][-1].get('result')
-            if last_result == 'LOSS':
-                stake *= 2
-        
-        # Execute trade
-        result = random.choice(['WIN', 'LOSS'])
-        profit = stake * (0.95 if result == 'WIN' else -1.0)
-        
-        bot.stats['trades'] += 1
-        if result == 'WIN':
-            bot.stats['wins'] += 1
-        else:
-            bot.stats['losses'] += 1
-        bot.stats['profit'] += profit
+    def on_tick(self, analytics: DigitAnalytics):
+        symbol = analytics.symbol
+        pending = self.pending.get(symbol)
+        while pending and pending[0][0] <= analytics.total:
+            exit_seq, kind, contract_type, barrier = pending.popleft()
+            digit = analytics.digit_at(exit_seq)
+            if digit is None:
+                continue
+            rate = self.rates.get((kind, symbol))
+            if rate is None:
+                rate = self.rates[(kind, symbol)] = HitRate()
+            rate.add(
+                digit_contract_wins(contract_type, barrier, digit),
+                digit_win_probability(contract_type, 5 if barrier is None else barrier)
+            )
         
-        bot_logs[bot.bot_id].append({
-            'time': datetime.now().isoformat(),
-            'action': 'TRADE',
-            'stake': stake,
-            'result': result,
-            'profit': profit
-        })
+        for pattern in analytics.patterns:
+            if pattern['type'] == 'streak':
+                over = pattern['digit'] > 5
+                self.log(analytics, 'pattern_streak', 'DIGITUNDER' if over else 'DIGITOVER', 6 if over else 5)
+            elif pattern['type'] == 'alternating':
+                self.log(analytics, 'pattern_alternating', 'DIGITEVEN' if analytics.last % 2 else 'DIGITODD', None)
+    
+    def forget(self, symbol: str):
+        self.pending.pop(symbol, None)
+        for key in [k for k in self.logged if k[0] == symbol]:
+            del self.logged[key]
+    
+    def leaderboard(self, symbol: Optional[str] = None) -> List[Dict]:
+        rows = [
+            {
+                'kind': kind,
+                'symbol': sym,
+                'outcomes': rate.count,
+                'total_outcomes': rate.total,
+                'hit_rate': round(rate.hit_rate, 4),
+                'expected_hit_rate': round(rate.expected_sum / rate.count, 4) if rate.count else 0.0,
+                'edge': round(rate.edge, 4),
+                'disabled': rate.disabled
+            }
+            for (kind, sym), rate in self.rates.items() if symbol is None or sym == symbol
+        ]
+        rows.sort(key=lambda r: r['edge'], reverse=True)
+        return rows
 
-# ===== SMART SIGNALS =====
+signal_tracker = SignalTracker()
+
+@app.get("/api/v3/signals/leaderboard")
+async def get_signal_leaderboard(symbol: Optional[str] = None):
+    """Realized hit rate of each signal kind, best edge first"""
+    return {
+        'settle_after_ticks': SIGNAL_TRACK_TICKS,
+        'window': SIGNAL_TRACK_WINDOW,
+        'leaderboard': signal_tracker.leaderboard(symbol)
+    }
 
 @app.get("/api/v3/signals/{symbol}/smart")
-async def get_smart_signal(symbol: str):
-    """Generate smart trading signal with confidence"""
-    analytics = digit_analytics.get(symbol)
+async def get_smart_signal(symbol: str, window: Optional[int] = None):
+    """Generate a trading signal from significance tests.
     
-    if not analytics or len(analytics.last_100_ticks) < 10:
+    Tests run over every rolling window (or just `window`); the signal is
+    the most significant test with adjusted p-value below SIGNAL_ALPHA.
+    """
+    analytics = digit_analytics.get(symbol)
+    if analytics is None:
         return {
             'symbol': symbol,
             'signal': 'WAIT',
             'confidence': 0,
             'reason': 'Insufficient data'
         }
+    return cached_signal(analytics, ('smart_signal', window), lambda: compute_smart_signal(analytics, window))
+
+def compute_smart_signal(analytics: DigitAnalytics, window: Optional[int]) -> Dict:
+    symbol = analytics.symbol
+    scores = score_signals(analytics, list(analytics.windows) if window is None else [window])
     
-    # Analyze patterns
-    ticks = analytics.last_100_ticks
-    
-    # Check for strong patterns
-    signals = []
-    
-    # Even/Odd bias
-    even_count = sum(1 for d in ticks[-20:] if d % 2 == 0)
-    if even_count >= 15:
-        signals.append({
-            'type': 'DIGITODD',
-            'confidence': 0.75,
-            'reason': 'Strong even bias, expect odd'
-        })
-    elif even_count <= 5:
-        signals.append({
-            'type': 'DIGITEVEN',
-            'confidence': 0.75,
-            'reason': 'Strong odd bias, expect even'
-        })
-    
-    # Over/Under bias
-    over_count = sum(1 for d in ticks[-20:] if d > 5)
-    if over_count >= 15:
-        signals.append({
-            'type': 'DIGITUNDER',
-            'confidence': 0.70,
-            'reason': 'Strong over bias, expect under'
-        })
-    elif over_count <= 5:
-        signals.append({
-            'type': 'DIGITOVER',
-            'confidence': 0.70,
-            'reason': 'Strong under bias, expect over'
-        })
-    
-    # Check recent patterns
-    if analytics.patterns:
-        pattern = analytics.patterns[-1]
-        if pattern['type'] == 'streak':
-            opposite_type = 'DIGITUNDER' if pattern['digit'] > 5 else 'DIGITOVER'
-            signals.append({
-                'type': opposite_type,
-                'confidence': pattern['confidence'],
-                'reason': f"Streak of {pattern['digit']} detected"
-            })
+    if not scores:
+        return {
+            'symbol': symbol,
+            'signal': 'WAIT',
+            'confidence': 0,
+            'reason': 'Insufficient data'
+        }
     
-    # Return best signal
-    if signals:
-        best_signal = max(signals, key=lambda x: x['confidence'])
+    # A significant deviation from fair odds is evidence the bias persists,
+    # so signals follow it rather than betting on a reversal
+    significant = [s for s in scores if s['p_value'] < SIGNAL_ALPHA]
+    for score in significant:
+        signal_tracker.log(analytics, score['test'], score['type'], score['barrier'])
+    significant = [s for s in significant if signal_tracker.enabled(s['test'], symbol)]
+    if significant:
+        best = min(significant, key=lambda s: (s['p_value'], -abs(s['effect_size'])))
         return {
             'symbol': symbol,
-            'signal': best_signal['type'],
-            'confidence': best_signal['confidence'],
-            'reason': best_signal['reason'],
+            'signal': best['type'],
+            'barrier': best['barrier'],
+            'confidence': round(1 - best['p_value'], 4),
+            'p_value': best['p_value'],
+            'effect_size': round(best['effect_size'], 4),
+            'test': best['test'],
+            'window': best['window'],
+            'sample_size': best['sample_size'],
+            'reason': best['reason'],
             'duration': 5,
-            'stake_recommendation': 1.0
+            'stake_recommendation': 1.0,
+            'tests': scores
         }
     
+    best = min(scores, key=lambda s: s['p_value'])
     return {
         'symbol': symbol,
         'signal': 'WAIT',
         'confidence': 0.5,
-        'reason': 'No strong pattern detected'
+        'p_value': best['p_value'],
+        'reason': 'No statistically significant pattern',
+        'tests': scores
+    }
+
+@app.get("/api/v3/signals/cache/stats")
+async def get_signal_cache_stats():
+    """Signal cache hit/miss counters"""
+    hits = signal_cache_stats['hits']
+    misses = signal_cache_stats['misses']
+    
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0,
+        'symbols': len(signal_cache)
     }
 
 # ===== RISK MANAGEMENT =====
 
-@app.get("/api/v3/risk/capital-protector/{user_id}")
-async def check_capital_protector(user_id: str):
-    """Capital Protector: Check if trading should be stopped"""
-    if user_id not in trade_history:
-        return {'active': False, 'trades': 0}
+CAPITAL_PROTECTOR_MAX_CONSECUTIVE_LOSSES = int(os.getenv("CAPITAL_PROTECTOR_MAX_CONSECUTIVE_LOSSES", "5"))
+CAPITAL_PROTECTOR_DAILY_LOSS_LIMIT = float(os.getenv("CAPITAL_PROTECTOR_DAILY_LOSS_LIMIT", "100"))
+CAPITAL_PROTECTOR_MAX_EXPOSURE = float(os.getenv("CAPITAL_PROTECTOR_MAX_EXPOSURE", "0"))  # 0 = no limit
+
+class RiskState:
+    """Running risk counters of one user for the current UTC day"""
     
-    history = trade_history[user_id]
-    recent = history[-10:]  # Last 10 trades
+    __slots__ = ('day', 'day_end', 'consecutive_losses', 'daily_pnl', 'daily_loss', 'exposure', 'open')
     
-    # Count consecutive losses
-    consecutive_losses = 0
-    for trade in reversed(recent):
-        if trade.get('status') == 'lost':
-            consecutive_losses += 1
-        else:
-            break
+    def __init__(self):
+        self.day = ''
+        self.day_end = 0.0
+        self.consecutive_losses = 0
+        self.daily_pnl = 0.0
+        self.daily_loss = 0.0
+        self.exposure = 0.0
+        self.open: Dict[str, float] = {}  # contract_id -> stake at risk
+
+class CapitalProtector:
+    """Pre-trade risk gate.
+    
+    Counters are updated as contracts are bought and settled, so check()
+    is a few comparisons and never touches the trade history. Daily P/L
+    and the loss streak reset at the UTC day boundary, so a streak block
+    lasts until midnight UTC at most; open exposure carries over.
+    """
+    
+    def __init__(self):
+        self.states: Dict[str, RiskState] = {}
+    
+    def state(self, user_id: str) -> RiskState:
+        state = self.states.get(user_id)
+        if state is None:
+            if user_id not in user_sessions:
+                return RiskState()  # defaults; only signed-in users are tracked
+            state = self.states[user_id] = RiskState()
+        
+        if time.time() >= state.day_end:
+            # Day rollover: start from the store's aggregate for the new day
+            state.day = trade_day()
+            state.day_end = calendar.timegm(time.strptime(state.day, '%Y-%m-%d')) + 86400
+            daily = trade_store.today_stats(user_id)
+            state.daily_pnl = daily['profit']
+            state.daily_loss = daily['loss']
+            state.consecutive_losses = 0
+        return state
+    
+    async def load(self, user_id: str):
+        """Resume the user's losing streak from today's trades"""
+        state = self.state(user_id)
+        state.consecutive_losses = 0
+        for trade in await trade_store.history(user_id, state.day, limit=CAPITAL_PROTECTOR_MAX_CONSECUTIVE_LOSSES):
+            if trade.get('status') != 'lost':
+                break
+            state.consecutive_losses += 1
+    
+    def check(self, user_id: str, stake: float = 0.0) -> Optional[str]:
+        """Reason the trade must be blocked, or None"""
+        state = self.state(user_id)
+        if state.consecutive_losses >= CAPITAL_PROTECTOR_MAX_CONSECUTIVE_LOSSES:
+            return f'{state.consecutive_losses} consecutive losses detected'
+        if state.daily_loss < -CAPITAL_PROTECTOR_DAILY_LOSS_LIMIT:
+            return f'Daily loss limit exceeded: ${abs(state.daily_loss)}'
+        if CAPITAL_PROTECTOR_MAX_EXPOSURE and state.exposure + stake > CAPITAL_PROTECTOR_MAX_EXPOSURE:
+            return f'Exposure limit exceeded: ${state.exposure + stake}'
+        return None
     
-    # Calculate total loss today
-    today = datetime.now().date()
-    today_trades = [t for t in history if datetime.fromisoformat(t.get('purchase_time', '2024-01-01')).date() == today]
-    total_loss = sum(t.get('profit', 0) for t in today_trades if t.get('profit', 0) < 0)
+    def reserve(self, user_id: str, stake: float) -> Optional[str]:
+        """check() and, if the trade may go ahead, hold its stake as exposure
+        until opened() or release(), so concurrent buys see each other"""
+        reason = self.check(user_id, stake)
+        if reason is None:
+            self.state(user_id).exposure += stake
+        return reason
     
-    should_stop = False
-    reason = None
+    def release(self, user_id: str, stake: float):
+        """Return a reserved stake whose buy failed"""
+        self.state(user_id).exposure -= stake
     
-    if consecutive_losses >= 5:
-        should_stop = True
-        reason = f'{consecutive_losses} consecutive losses detected'
+    def opened(self, user_id: str, contract_id, stake: float, reserved: float):
+        """Swap the reservation for the bought contract's stake; nothing is
+        held if the contract already settled before the buy ack was handled"""
+        state = self.state(user_id)
+        state.exposure -= reserved
+        session = user_sessions.get(user_id)
+        if session and session.active_contracts.get(contract_id) is not None:
+            state.open[str(contract_id)] = stake
+            state.exposure += stake
     
-    if total_loss < -100:
-        should_stop = True
-        reason = f'Daily loss limit exceeded: ${abs(total_loss)}'
+    def settled(self, user_id: str, contract: Dict):
+        """Apply a settled contract; call before trade_store.record() so a
+        rollover here does not reload an aggregate that already holds it"""
+        state = self.state(user_id)
+        stake = state.open.pop(str(contract.get('contract_id')), None)
+        if stake is not None:
+            state.exposure -= stake
+        if trade_day(settled_at(contract)) != state.day:
+            return  # settled before today's rollover
+        
+        profit = float(contract.get('profit') or 0)
+        won = contract.get('status') == 'won' or (contract.get('status') != 'lost' and profit > 0)
+        state.consecutive_losses = 0 if won else state.consecutive_losses + 1
+        state.daily_pnl += profit
+        if profit < 0:
+            state.daily_loss += profit
+
+capital_protector = CapitalProtector()
+
+@app.get("/api/v3/risk/capital-protector/{user_id}")
+async def check_capital_protector(user_id: str):
+    """Capital Protector: Check if trading should be stopped"""
+    reason = capital_protector.check(user_id)
+    state = capital_protector.state(user_id)
     
     return {
-        'active': should_stop,
-        'consecutive_losses': consecutive_losses,
-        'total_loss_today': total_loss,
+        'active': reason is not None,
+        'consecutive_losses': state.consecutive_losses,
+        'total_loss_today': state.daily_loss,
+        'pnl_today': state.daily_pnl,
+        'exposure': state.exposure,
         'reason': reason
     }
 
@@ -864,15 +4030,74 @@ async def get_risk_meter(user_id: str, stake: float = 1.0):
         'risk_level': risk_level
     }
 
+# ===== MONITORING =====
+
+def metric_family(name: str, kind: str, description: str) -> List[str]:
+    return [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+
+def render_metrics() -> str:
+    lines = metric_family('rostova_ticks_ingested_total', 'counter', 'Ticks ingested per symbol')
+    lines += [f'rostova_ticks_ingested_total{{symbol="{s}"}} {n}' for s, n in ticks_ingested.items()]
+    
+    for name, histogram, description in (
+        ('rostova_analytics_update_microseconds', analytics_update_us, 'Digit analytics update per tick'),
+        ('rostova_detect_patterns_microseconds', detect_patterns_us, 'Pattern detection per tick'),
+        ('rostova_bot_evaluation_microseconds', bot_evaluation_us, 'Bot strategy evaluation'),
+        ('rostova_event_loop_lag_milliseconds', event_loop_lag_ms, 'Event loop scheduling delay'),
+    ):
+        lines += metric_family(name, 'histogram', description)
+        lines += histogram.prometheus(name)
+    
+    lines += metric_family('rostova_deriv_request_milliseconds', 'histogram', 'Deriv request round trip by type')
+    for msg_type, histogram in deriv_rtt_ms.items():
+        lines += histogram.prometheus('rostova_deriv_request_milliseconds', f'type="{msg_type}"')
+    
+    lines += metric_family('rostova_bot_buy_latency_milliseconds', 'histogram', 'Bot signal to buy acknowledgement')
+    for path, histogram in buy_latency.items():
+        lines += histogram.prometheus('rostova_bot_buy_latency_milliseconds', f'path="{path}"')
+    
+    clients = [c for user_clients in client_connections.values() for c in user_clients]
+    depths = [len(c.queue) + len(c.ticks) + len(c.updates) for c in clients]
+    lines += metric_family('rostova_ws_clients', 'gauge', 'Open client WebSockets')
+    lines.append(f'rostova_ws_clients {len(clients)}')
+    lines += metric_family('rostova_ws_send_queue_depth', 'gauge', 'Unsent messages per client socket')
+    lines.append(f'rostova_ws_send_queue_depth{{stat="max"}} {max(depths, default=0)}')
+    lines.append(f'rostova_ws_send_queue_depth{{stat="total"}} {sum(depths)}')
+    lines += metric_family('rostova_ws_dropped_messages', 'gauge', 'Messages coalesced or dropped on open sockets')
+    lines.append(f'rostova_ws_dropped_messages {sum(c.dropped for c in clients)}')
+    
+    lines += metric_family('rostova_signal_cache_requests_total', 'counter', 'Signal cache lookups')
+    lines += [f'rostova_signal_cache_requests_total{{result="{r}"}} {signal_cache_stats[r]}' for r in ('hits', 'misses')]
+    
+    lines += metric_family('rostova_symbols', 'gauge', 'Symbols with analytics in memory')
+    lines.append(f'rostova_symbols {len(digit_analytics)}')
+    lines += metric_family('rostova_bots_running', 'gauge', 'Running bots')
+    lines.append(f'rostova_bots_running {len(bot_scheduler.tasks)}')
+    return '\n'.join(lines) + '\n'
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition"""
+    return PlainTextResponse(render_metrics(), media_type='text/plain; version=0.0.4')
+
 # ===== WEBSOCKET =====
 
 @app.websocket("/ws/v3/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    """Enhanced WebSocket with Deriv integration"""
+async def websocket_endpoint(websocket: WebSocket, user_id: str, encoding: str = 'json'):
+    """Enhanced WebSocket with Deriv integration.
+    
+    `encoding` selects the server-to-client wire format (see WS_ENCODINGS);
+    client messages are always JSON.
+    """
+    if encoding not in WS_ENCODINGS:
+        await websocket.close(code=1003)  # unsupported data
+        return
+    
     await websocket.accept()
     
-    if user_id in user_sessions:
-        user_sessions[user_id].websocket = websocket
+    client = ClientConnection(websocket, user_id, encoding)
+    client_connections.setdefault(user_id, set()).add(client)
+    client.start()
     
     logger.info(f"User {user_id} WebSocket connected")
     
@@ -882,17 +4107,79 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
             action = data.get('action')
             
             if action == 'ping':
-                await websocket.send_json({'type': 'pong'})
+                client.send({'type': 'pong'})
             
             elif action == 'subscribe_ticks':
                 symbol = data.get('symbol')
-                # Subscribe handled by Deriv connection
+                if symbol_registry.valid(symbol):
+                    await market_hub.subscribe(symbol, client)
+                else:
+                    client.send({'type': 'error', 'action': 'subscribe_ticks', 'error': f'Invalid symbol: {symbol}'})
+            
+            elif action == 'unsubscribe_ticks':
+                symbol = data.get('symbol')
+                if symbol:
+                    market_hub.unsubscribe(symbol, client)
+            
+            elif action == 'subscribe':
+                # The first 'channel' message carrying the id acknowledges it
+                try:
+                    await channel_hub.subscribe(client, channel_hub.parse(data))
+                except ValueError as e:
+                    client.send({'type': 'error', 'action': 'subscribe', 'error': str(e)})
+            
+            elif action == 'unsubscribe':
+                channel_id = data.get('id')
+                if channel_id in client.channels:
+                    channel_hub.unsubscribe(client, channel_id)
+                    client.send({'type': 'unsubscribed', 'id': channel_id})
     
     except WebSocketDisconnect:
         logger.info(f"User {user_id} WebSocket disconnected")
-        if user_id in user_sessions:
-            user_sessions[user_id].websocket = None
+    
+    finally:
+        client.close()
+        disconnect_client(client)
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="ROSTOVA 3.0 API server and strategy tools")
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('serve', help='Run the API server (default)')
+    backtest_cmd = commands.add_parser('backtest', help='Backtest a strategy on a tick file')
+    optimize_cmd = commands.add_parser('optimize', help='Search bot config space on a tick file')
+    
+    for command in (backtest_cmd, optimize_cmd):
+        command.add_argument('ticks', help='Tick file (.npy digits or text quotes) or store:SYMBOL')
+        command.add_argument('--strategy', type=json.loads, default={'type': 'martingale'})
+        command.add_argument('--config', type=json.loads, default={})
+        command.add_argument('--symbol', default='R_100')
+    
+    optimize_cmd.add_argument('--space', type=json.loads, required=True,
+                              help='e.g. \'{"stake": [1, 2], "martingale_multiplier": [1.5, 2]}\'')
+    optimize_cmd.add_argument('--mode', choices=['grid', 'random'], default='grid')
+    optimize_cmd.add_argument('--samples', type=int, default=100)
+    optimize_cmd.add_argument('--seed', type=int)
+    optimize_cmd.add_argument('--rank-by', choices=list(OPTIMIZE_RANKINGS), default='profit')
+    optimize_cmd.add_argument('--top', type=int, default=20)
+    optimize_cmd.add_argument('--workers', type=int)
+    
+    args = parser.parse_args()
+    
+    if args.command == 'backtest':
+        result = Backtester(args.strategy, args.config, args.symbol).run(load_tick_file(args.ticks))
+        del result['equity_curve']
+        print(json.dumps(result, indent=2))
+    
+    elif args.command == 'optimize':
+        result = optimize_strategy(
+            args.strategy, args.config, load_tick_file(args.ticks), args.space,
+            mode=args.mode, samples=args.samples, seed=args.seed, rank_by=args.rank_by,
+            top=args.top, workers=args.workers, symbol=args.symbol
+        )
+        print(json.dumps(result, indent=2))
+    
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8000)